@@ -0,0 +1,40 @@
+// Loads each lazy figure section (components/lazy.py) once it scrolls into view.
+// Clicking the section's hidden trigger fires its Dash callback.
+(function () {
+    var LOAD_MARGIN = '300px 0px';
+
+    function load(trigger) {
+        if (!trigger.dataset.lazyLoaded) {
+            trigger.dataset.lazyLoaded = 'true';
+            trigger.click();
+        }
+    }
+
+    var observer = null;
+    if ('IntersectionObserver' in window) {
+        observer = new IntersectionObserver(function (entries) {
+            entries.forEach(function (entry) {
+                if (entry.isIntersecting) {
+                    observer.unobserve(entry.target);
+                    load(entry.target);
+                }
+            });
+        }, { rootMargin: LOAD_MARGIN });
+    }
+
+    function watch() {
+        document.querySelectorAll('.lazy-trigger:not([data-lazy-watched])').forEach(function (trigger) {
+            trigger.dataset.lazyWatched = 'true';
+            if (observer) {
+                observer.observe(trigger);
+            } else {
+                // No IntersectionObserver: load every section right away
+                load(trigger);
+            }
+        });
+    }
+
+    // Page content is swapped in by Dash, so look for new placeholders on every DOM change
+    new MutationObserver(watch).observe(document.documentElement, { childList: true, subtree: true });
+    watch();
+})();
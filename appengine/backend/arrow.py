@@ -0,0 +1,58 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# ------------ COMPACT ARROW RESULTS ------------
+# Raw row sets (samples, map points) are streamed as Arrow record batches and
+# narrowed batch by batch before they are assembled: float64 -> float32,
+# strings -> dictionary-encoded categoricals, booleans stay bit-packed. Only the
+# final pandas conversion materializes the frame, and it reuses Arrow buffers
+# where the types allow it.
+
+# Results smaller than this keep plain string columns; categoricals only pay off on big frames
+DICTIONARY_MIN_ROWS = int(os.environ.get("DICTIONARY_MIN_ROWS", 10000))
+
+
+def compact_batch(batch):
+    """
+    Narrow the column types of one record batch.
+    """
+    columns = []
+    fields = []
+    for field, column in zip(batch.schema, batch.columns):
+        if pa.types.is_float64(field.type):
+            column = pc.cast(column, pa.float32())
+        elif pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            column = pc.dictionary_encode(column)
+        columns.append(column)
+        fields.append(pa.field(field.name, column.type, nullable=field.nullable))
+    return pa.RecordBatch.from_arrays(columns, schema=pa.schema(fields))
+
+
+def _decode_dictionaries(table):
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, pc.cast(table.column(i), field.type.value_type))
+    return table
+
+
+def batches_to_pandas(batches):
+    """
+    Assemble compacted record batches into a pandas DataFrame.
+    Nullable booleans become pandas' masked boolean dtype instead of Python objects.
+    An empty result arrives as one zero-row batch, so its columns still exist.
+    """
+    batches = [compact_batch(b) for b in batches]
+
+    # Batches encode their own dictionaries; unify them so the categories line up
+    table = pa.Table.from_batches(batches).unify_dictionaries()
+    if table.num_rows < DICTIONARY_MIN_ROWS:
+        table = _decode_dictionaries(table)
+
+    return table.to_pandas(
+        types_mapper={pa.bool_(): pd.BooleanDtype()}.get,
+        split_blocks=True,
+        self_destruct=True,
+    )
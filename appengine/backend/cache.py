@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+from backend.engine import QueryBackend
+
+# ------------ QUERY RESULT CACHE SETTINGS ------------
+# Results are keyed by normalized SQL plus the dataset version, so a table
+# refresh invalidates every entry without any explicit purge.
+
+CACHE_DIR = os.environ.get("QUERY_CACHE_DIR")
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'traffic-analysis', 'query-cache') if CACHE_DIR is None else CACHE_DIR
+CACHE_TTL_SECONDS = int(os.environ.get("QUERY_CACHE_TTL", 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 128))
+CACHE_MEMORY_BYTES = int(os.environ.get("QUERY_CACHE_MEMORY_MB", 256)) * 1024 * 1024
+CACHE_DISK_BYTES = int(os.environ.get("QUERY_CACHE_DISK_MB", 1024)) * 1024 * 1024
+
+# How long a looked-up dataset version is trusted before asking the engine again
+VERSION_CHECK_SECONDS = int(os.environ.get("DATASET_VERSION_CHECK", 300))
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace so formatting differences do not produce separate entries.
+    """
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def cache_key(sql, version):
+    return hashlib.sha256(f"{version}\n{normalize_sql(sql)}".encode("utf-8")).hexdigest()
+
+
+class QueryCache:
+    """
+    Two-tier cache of query results.
+
+    The first tier is a bounded in-process LRU (entry count and approximate bytes).
+    The second tier is a directory of Arrow Feather files that survives restarts
+    and is trimmed oldest-first once it exceeds its size budget. Both tiers expire
+    entries after the TTL.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, ttl=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES,
+                 max_memory_bytes=CACHE_MEMORY_BYTES, max_disk_bytes=CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()  # key -> (stored_at, nbytes, DataFrame)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    # ---- public API ----
+
+    def get(self, key):
+        df = self._get_memory(key)
+        if df is not None:
+            self._count('memory_hits')
+            return df
+
+        df = self._get_disk(key)
+        if df is not None:
+            self._count('disk_hits')
+            self._put_memory(key, df)
+            return df
+
+        self._count('misses')
+        return None
+
+    def put(self, key, df):
+        self._put_memory(key, df)
+        self._put_disk(key, df)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': round((lookups - self.counters['misses']) / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._memory_bytes,
+            }
+
+    # ---- in-memory LRU tier ----
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, nbytes, df = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                self._memory_bytes -= nbytes
+                self.counters['expired'] += 1
+                return None
+            self._entries.move_to_end(key)
+            return df
+
+    def _put_memory(self, key, df):
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if nbytes > self.max_memory_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (time.time(), nbytes, df)
+            self._memory_bytes += nbytes
+
+            while len(self._entries) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_bytes, _) = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted_bytes
+                self.counters['evictions'] += 1
+
+    # ---- on-disk Feather tier ----
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.feather")
+
+    def _get_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                self._count('expired')
+                return None
+            from pyarrow import feather
+            return feather.read_feather(path)
+        except (OSError, ValueError):
+            return None
+
+    def _put_disk(self, key, df):
+        if not self.cache_dir:
+            return
+        from pyarrow import feather
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            feather.write_feather(df.reset_index(drop=True), tmp_path)
+            os.replace(tmp_path, path)
+        except Exception:
+            # Some result types (e.g. nested records) cannot be written as Feather;
+            # those entries simply stay memory-only
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._trim_disk()
+
+    def _trim_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".feather"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count('evictions')
+
+
+class CachedBackend(QueryBackend):
+    """
+    Wraps another backend and serves repeated queries from a QueryCache.
+    """
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.name = backend.name
+        self.cache = QueryCache() if cache is None else cache
+        self._version = None
+        self._version_checked_at = 0.0
+        self._version_lock = threading.Lock()
+        self._columns = {}
+
+    def dataset_version(self):
+        with self._version_lock:
+            if self._version is None or time.time() - self._version_checked_at > VERSION_CHECK_SECONDS:
+                try:
+                    self._version = self.backend.dataset_version()
+                except Exception:
+                    # Keep serving the last known version if the metadata lookup fails
+                    self._version = self._version or 'unknown'
+                self._version_checked_at = time.time()
+            return self._version
+
+    def query(self, sql, compact=False):
+        key = cache_key(sql, f"{self.dataset_version()}:{'compact' if compact else 'full'}")
+        df = self.cache.get(key)
+        if df is None:
+            df = self.backend.query(sql, compact=compact)
+            self.cache.put(key, df)
+        return df.copy()
+
+    def columns(self):
+        # The schema only changes together with the dataset version
+        version = self.dataset_version()
+        if version not in self._columns:
+            self._columns = {version: self.backend.columns()}
+        return self._columns[version]
+
+    def cached(self, name, compute):
+        """
+        Memoize a DataFrame derived from the table outside of query(), e.g. a
+        statistic accumulated from query_batches(), under `name` for the
+        current dataset version. The index is not kept.
+        """
+        key = cache_key(name, f"{self.dataset_version()}:derived")
+        df = self.cache.get(key)
+        if df is None:
+            df = compute().reset_index(drop=True)
+            self.cache.put(key, df)
+        return df.copy()
+
+    def query_batches(self, sql):
+        # Streams are consumed by offline jobs and are not cached
+        return self.backend.query_batches(sql)
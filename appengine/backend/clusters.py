@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from backend.spatial import SpatialIndex, merge_cells, cell_to_lnglat, lnglat_to_cell
+
+# ------------ RISK ZONE CLUSTERS ------------
+# Server-side clustering for the risk map, in the spirit of supercluster: risk
+# zones (spatial index cells at ZONE_LEVEL) are merged into one cluster per
+# coarser quadtree cell, level by level, with a count-weighted centroid. The
+# map asks for the clusters inside its viewport at the current zoom, so the
+# number of markers sent to the browser stays bounded at every zoom.
+
+ZONE_LEVEL = int(os.environ.get("RISK_ZONE_LEVEL", 12))
+MIN_ZONE_ACCIDENTS = int(os.environ.get("RISK_ZONE_MIN_ACCIDENTS", 100))
+
+# A cluster covers 1/2**CLUSTER_DETAIL of a map tile side (32px on a 256px tile)
+CLUSTER_DETAIL = 3
+MAX_MARKERS = int(os.environ.get("RISK_MAP_MAX_MARKERS", 1000))
+
+
+class ZoneClusters:
+    """
+    Cluster hierarchy over the risk zones of a spatial index, from ZONE_LEVEL
+    (each zone on its own) up to level 0 (a single cluster).
+    """
+
+    def __init__(self, index, zone_level=ZONE_LEVEL, min_accidents=MIN_ZONE_ACCIDENTS):
+        self.zone_level = min(zone_level, index.max_level)
+        self.version = index.version
+
+        keys, counts = index.levels[self.zone_level]
+        total = counts.sum(axis=1)
+        # Filter out zones with very few accidents to reduce noise
+        keep = total >= min_accidents
+        cx, cy, counts, total = keys[keep] & 0xffffffff, keys[keep] >> 32, counts[keep], total[keep]
+
+        # Values summed when zones merge: zone count, total, severe and the
+        # count-weighted lat/lng sums that give each cluster's centroid
+        lat, lng = cell_to_lnglat(cx + 0.5, cy + 0.5, self.zone_level)
+        values = np.column_stack([
+            np.ones(len(total)), total, counts[:, 2:].sum(axis=1), lat * total, lng * total
+        ]).astype(np.float64)
+
+        levels = {}
+        for level in range(self.zone_level, -1, -1):
+            levels[level] = (cx, cy, values)
+            cx, cy, values = merge_cells(cx >> 1, cy >> 1, values)
+        self.tree = SpatialIndex(levels, version=self.version)
+
+    def level_for_zoom(self, zoom):
+        return int(min(max(np.floor(zoom), 0) + CLUSTER_DETAIL, self.zone_level))
+
+    def query(self, lat_min, lat_max, lng_min, lng_max, zoom, limit=MAX_MARKERS):
+        """
+        Clusters inside a bounding box at map tile zoom `zoom`, largest first and
+        capped at `limit`, with centroid, zone count and accident counts.
+        """
+        level = self.level_for_zoom(zoom)
+        x0, y0 = lnglat_to_cell(lat_max, lng_min, level)
+        x1, y1 = lnglat_to_cell(lat_min, lng_max, level)
+        _, _, values = self.tree.cells(level, int(np.floor(x0)), int(np.floor(x1)), int(np.floor(y0)), int(np.floor(y1)))
+
+        if len(values) > limit:
+            values = values[np.argpartition(-values[:, 1], limit)[:limit]]
+        values = values[np.argsort(-values[:, 1], kind="stable")]
+
+        zones, total, severe, lat_sum, lng_sum = values.T
+        return pd.DataFrame({
+            "Lat": lat_sum / total,
+            "Lng": lng_sum / total,
+            "zones": zones.astype(np.int64),
+            "total_accidents": total.astype(np.int64),
+            "severe_accidents": severe.astype(np.int64),
+        })
@@ -0,0 +1,168 @@
+import os
+import json
+
+import pandas as pd
+
+from backend.engine import TABLE_REF, ARTIFACT_DIR, get_backend, is_stale
+from backend.derived import HIGHWAY_COLUMN_SQL, highway_expression
+
+# ------------ ROLLUP CUBE OF ACCIDENT COUNTS ------------
+# Most findings charts are group-by counts over a handful of low-cardinality
+# dimensions. An offline job counts the whole table once per cuboid (a group
+# of dimensions) and stores the result as Parquet; at request time any
+# group-by over a subset of one cuboid's dimensions is answered in memory.
+#
+# Build it from the appengine/ directory with:
+#   python -m backend.cube
+
+CUBE_PATH = os.environ.get("ROLLUP_CUBE_PATH")
+CUBE_PATH = os.path.join(ARTIFACT_DIR, 'rollup_cube.parquet') if CUBE_PATH is None else CUBE_PATH
+
+ROAD_FEATURES = [
+    "Amenity", "Bump", "Crossing", "Junction",
+    "No_Exit", "Railway", "Roundabout", "Station", "Stop",
+    "Traffic_Calming", "Traffic_Signal", "Turning_Loop"
+]
+
+# Dimension name -> SQL expression used when building the cube
+DIMENSIONS = {
+    "Severity": "Severity",
+    "State": "State",
+    "Weather_Condition": "Weather_Condition",
+    "Year": "EXTRACT(YEAR FROM Start_Time)",
+    "Month": "EXTRACT(MONTH FROM Start_Time)",
+    "Day": "EXTRACT(DAY FROM Start_Time)",
+    "Hour": "EXTRACT(HOUR FROM Start_Time)",
+    # Missing road flags count as absent, as in the road feature builders
+    **{feature: f"IFNULL({feature}, FALSE)" for feature in ROAD_FEATURES},
+    # Stored flag from backend/derived.py (the regex is used if it has not been added yet)
+    "highway": HIGHWAY_COLUMN_SQL,
+}
+BOOLEAN_DIMENSIONS = ROAD_FEATURES + ["highway"]
+
+# Cuboids, from smallest to largest; a request is served by the first one covering it
+CUBOIDS = {
+    "location_weather": ["Severity", "State", "Weather_Condition"],
+    "road": ["Severity"] + ROAD_FEATURES + ["highway"],
+    "time": ["Year", "Month", "Day", "Hour", "Severity"],
+}
+
+
+def build_cube(backend=None, path=CUBE_PATH):
+    """
+    Count the full table once per cuboid and write the stacked result to Parquet.
+    NULL dimension values are kept so every cuboid sums to the full row count.
+    """
+    backend = get_backend() if backend is None else backend
+    expressions = {**DIMENSIONS, "highway": highway_expression(backend)}
+
+    parts = []
+    for name, dims in CUBOIDS.items():
+        # Grouped by position: an alias such as Amenity would bind to the raw column in DuckDB
+        query = f"""
+            SELECT {", ".join(f"{expressions[d]} AS {d}" for d in dims)}, COUNT(*) AS Count
+            FROM {TABLE_REF}
+            GROUP BY {", ".join(str(i) for i in range(1, len(dims) + 1))}
+        """
+        part = backend.query(query)
+        part["cuboid"] = name
+        parts.append(part)
+
+    cube = pd.concat(parts, ignore_index=True)
+    # Store every dimension with a nullable type so the stacked cuboids line up
+    for d in DIMENSIONS:
+        if d not in cube:
+            continue
+        if d in BOOLEAN_DIMENSIONS:
+            cube[d] = cube[d].astype("boolean")
+        elif d in ("State", "Weather_Condition"):
+            cube[d] = cube[d].astype("string")
+        else:
+            cube[d] = cube[d].astype("Int16")
+    cube["Count"] = cube["Count"].astype("int64")
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    metadata = {b"rollup_cube": json.dumps({"version": backend.dataset_version(), "cuboids": CUBOIDS}).encode()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    pq.write_table(table, path)
+    return path
+
+
+class RollupCube:
+    """
+    In-memory view of the rollup cube that answers grouped counts by slicing.
+    """
+
+    def __init__(self, cube, version=None, cuboids=CUBOIDS):
+        self.version = version
+        # Dimensions of the cuboids in this file, which may predate changes to CUBOIDS
+        self.dimensions = cuboids
+        self.cuboids = {name: cube[cube["cuboid"] == name].drop(columns="cuboid") for name in cuboids}
+
+    @classmethod
+    def load(cls, path=CUBE_PATH):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        info = json.loads((table.schema.metadata or {}).get(b"rollup_cube", b"{}"))
+        return cls(table.to_pandas(), version=info.get("version"), cuboids=info.get("cuboids", CUBOIDS))
+
+    def covering_cuboid(self, dims):
+        for name, cuboid_dims in self.dimensions.items():
+            if set(dims) <= set(cuboid_dims):
+                return name
+        return None
+
+    def count_by(self, dimensions, where=None, top_n=None, min_count=None, sample_percent=None):
+        """
+        Same contract as QueryBackend.count_by. Returns None when the request
+        cannot be answered from the cube (filters, sampling or uncovered dimensions).
+        """
+        if where or sample_percent:
+            return None
+        dims = [d if isinstance(d, str) else d[0] for d in dimensions]
+        name = self.covering_cuboid(dims)
+        if name is None:
+            return None
+
+        cuboid = self.cuboids[name].dropna(subset=dims)
+        df = cuboid.groupby(dims, observed=True)["Count"].sum().reset_index()
+
+        if min_count is not None:
+            df = df[df["Count"] > min_count]
+        if top_n:
+            df = df.sort_values("Count", ascending=False, kind="stable").head(top_n)
+        else:
+            df = df.sort_values(dims)
+
+        # Hand back plain numpy dtypes, as the engines do for non-null columns
+        for d in dims:
+            if d in BOOLEAN_DIMENSIONS:
+                df[d] = df[d].astype(bool)
+            elif d in ("State", "Weather_Condition"):
+                df[d] = df[d].astype(object)
+            else:
+                df[d] = df[d].astype("int64")
+        return df.reset_index(drop=True)
+
+
+def load_cube(path=CUBE_PATH, dataset_version=None):
+    """
+    Load the rollup cube if the offline job has produced one, otherwise return None.
+    With `dataset_version`, a cube counted from another version of the table is not loaded.
+    """
+    if not os.path.exists(path):
+        return None
+    cube = RollupCube.load(path)
+    if is_stale(path, cube.version, dataset_version, "backend.cube"):
+        return None
+    return cube
+
+
+if __name__ == '__main__':
+    print(f"Rollup cube written to {build_cube()}")
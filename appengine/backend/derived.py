@@ -0,0 +1,107 @@
+import os
+
+from backend.engine import PROJECT_ID, DATASET, TABLE, TABLE_REF, get_backend
+from backend.text import match_patterns
+
+# ------------ DERIVED COLUMNS ------------
+# Features extracted from free text are computed once per record and stored
+# next to the raw columns, so queries and models read a packed boolean column
+# instead of running a regex over Description on every request.
+#
+#   highway - Description mentions an interstate, US route or highway
+#
+# Add or backfill them from the appengine/ directory with:
+#   python -m backend.derived
+# On BigQuery this adds a BOOL column and fills rows where it is still NULL;
+# on local Parquet each partition file without a complete column is rewritten.
+
+# Columns added by these jobs; they exist in the table but not in the Kaggle CSV
+DERIVED_COLUMNS = ["highway"]
+
+HIGHWAY_PATTERN = r'\b(?:I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
+
+# Same test in SQL, for tables that do not have the stored column yet
+HIGHWAY_REGEX_SQL = f"IFNULL(REGEXP_CONTAINS(Description, r'(?i){HIGHWAY_PATTERN}'), FALSE)"
+HIGHWAY_COLUMN_SQL = "IFNULL(highway, FALSE)"
+
+
+def highway_flags(descriptions):
+    """
+    Highway flag for each description (pandas Series, list or Arrow array);
+    missing descriptions are not highways. Returns a numpy bool array.
+    """
+    # Evaluated once per distinct description (backend/text.py)
+    return match_patterns(descriptions, {"highway": HIGHWAY_PATTERN})["highway"]
+
+
+def highway_expression(backend):
+    """
+    SQL expression for the highway flag: the stored column when the table has
+    it, otherwise the regex over Description.
+    """
+    return HIGHWAY_COLUMN_SQL if "highway" in backend.columns() else HIGHWAY_REGEX_SQL
+
+
+def add_highway_bigquery(backend):
+    """
+    Add the highway column to the BigQuery table and fill it for every row
+    that does not have it yet.
+    """
+    table = f"{PROJECT_ID}.{DATASET}.{TABLE}"
+    backend.client.query(f"ALTER TABLE `{table}` ADD COLUMN IF NOT EXISTS highway BOOL").result()
+    job = backend.client.query(f"""
+        UPDATE {TABLE_REF}
+        SET highway = {HIGHWAY_REGEX_SQL}
+        WHERE highway IS NULL
+    """)
+    job.result()
+    return job.num_dml_affected_rows or 0
+
+
+def add_highway_local(backend):
+    """
+    Rewrite every local Parquet partition whose highway column is missing or
+    incomplete, keeping flags that were already stored.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    updated = 0
+    for path in backend.files():
+        table = pq.read_table(path)
+        existing = table.column("highway") if "highway" in table.column_names else None
+        if existing is not None and existing.null_count == 0:
+            continue
+
+        flags = pa.array(highway_flags(table.column("Description")), type=pa.bool_())
+        if existing is None:
+            table = table.append_column("highway", flags)
+        else:
+            merged = pc.if_else(pc.is_null(existing), flags, existing)
+            table = table.set_column(table.column_names.index("highway"), "highway", merged)
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        updated += table.num_rows if existing is None else existing.null_count
+    return updated
+
+
+DERIVED_JOBS = {
+    "bigquery": add_highway_bigquery,
+    "local": add_highway_local,
+}
+
+
+def add_derived_columns(backend=None):
+    """
+    Add or backfill the derived columns for the selected engine. Returns the
+    number of rows that were flagged.
+    """
+    backend = get_backend() if backend is None else backend
+    return DERIVED_JOBS[backend.name](backend)
+
+
+if __name__ == '__main__':
+    print(f"Flagged {add_derived_columns():,} rows")
@@ -0,0 +1,244 @@
+import os
+import re
+import glob
+import logging
+
+# ------------ QUERY ENGINE SELECTION ------------
+# QUERY_ENGINE picks where analysis.py queries run:
+#   "bigquery" (default) - the hosted US Accidents table
+#   "local"              - partitioned Parquet files under LOCAL_DATA_DIR,
+#                          queried in-process with DuckDB
+
+PROJECT_ID = os.environ.get("PROJECT_ID")
+DATASET = os.environ.get("DATASET_ID")
+TABLE = os.environ.get("TABLE_ID")
+QUERY_ENGINE = os.environ.get("QUERY_ENGINE")
+LOCAL_DATA_DIR = os.environ.get("LOCAL_DATA_DIR")
+
+PROJECT_ID = 'cs163-final-project' if PROJECT_ID is None else PROJECT_ID
+DATASET = 'us_accident_data' if DATASET is None else DATASET
+TABLE = 'us_accidents' if TABLE is None else TABLE
+QUERY_ENGINE = 'bigquery' if QUERY_ENGINE is None else QUERY_ENGINE.lower()
+LOCAL_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'parquet') if LOCAL_DATA_DIR is None else LOCAL_DATA_DIR
+
+TABLE_REF = f"`{PROJECT_ID}.{DATASET}.{TABLE}`"
+
+# Precomputed artifacts (rollup cube, indexes, models) built by the offline jobs
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR")
+ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), '..', 'artifacts') if ARTIFACT_DIR is None else ARTIFACT_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBackend:
+    """
+    Common interface for the engines behind analysis.py.
+    Every backend takes BigQuery Standard SQL and returns a pandas DataFrame.
+
+    query(sql, compact=True) is meant for raw row sets: the result is streamed
+    as Arrow record batches and narrowed to float32, dictionary-encoded strings
+    and packed booleans (see backend.arrow). Aggregates should keep the default
+    full-precision path.
+    """
+    name = None
+
+    def query(self, sql, compact=False):
+        if compact:
+            from backend.arrow import batches_to_pandas
+            return batches_to_pandas(self.query_batches(sql))
+        return self._query(sql)
+
+    def _query(self, sql):
+        raise NotImplementedError
+
+    def query_batches(self, sql):
+        """
+        Yield the result of `sql` as pyarrow RecordBatches. At least one batch
+        is yielded (a zero-row one for an empty result) so the schema is known.
+        """
+        raise NotImplementedError
+
+    def dataset_version(self):
+        """
+        Identifier that changes whenever the underlying table changes.
+        DATASET_VERSION overrides it, e.g. to pin a release or force a refresh.
+        """
+        return os.environ.get("DATASET_VERSION") or self._table_version()
+
+    def _table_version(self):
+        raise NotImplementedError
+
+    def columns(self):
+        """
+        Column names of the accidents table.
+        """
+        raise NotImplementedError
+
+    def count_by(self, dimensions, where=None, top_n=None, min_count=None, sample_percent=None):
+        """
+        Count rows per group inside the engine so only the aggregated groups are transferred.
+
+        dimensions is a list of column names or (alias, SQL expression) pairs, e.g.
+        ["Severity", ("Hour", "EXTRACT(HOUR FROM Start_Time)")]. Rows where any
+        dimension is NULL are skipped. With top_n the largest groups are returned,
+        otherwise groups are ordered by their dimension values.
+        """
+        dims = [(d, d) if isinstance(d, str) else d for d in dimensions]
+        # Group and order by position: DuckDB binds an alias that repeats a column name
+        # (IFNULL(Amenity, FALSE) AS Amenity) to the raw column, not the expression
+        positions = ", ".join(str(i) for i in range(1, len(dims) + 1))
+
+        filters = [f"{expr} IS NOT NULL" for _, expr in dims]
+        if where:
+            filters.append(f"({where})")
+
+        sample = f" TABLESAMPLE SYSTEM ({sample_percent} PERCENT)" if sample_percent else ""
+        having = f"\n            HAVING COUNT(*) > {int(min_count)}" if min_count is not None else ""
+        order = "Count DESC" if top_n else positions
+        limit = f"\n            LIMIT {int(top_n)}" if top_n else ""
+
+        sql = f"""
+            SELECT {", ".join(f"{expr} AS {alias}" for alias, expr in dims)}, COUNT(*) AS Count
+            FROM {TABLE_REF}{sample}
+            WHERE {" AND ".join(filters)}
+            GROUP BY {positions}{having}
+            ORDER BY {order}{limit}
+        """
+        return self.query(sql)
+
+
+def _empty_batch(schema):
+    import pyarrow as pa
+
+    yield pa.RecordBatch.from_pylist([], schema=schema)
+
+
+class BigQueryBackend(QueryBackend):
+    """
+    Runs queries against the hosted BigQuery table.
+    """
+    name = 'bigquery'
+
+    def __init__(self, project_id=PROJECT_ID):
+        # Imported here so the local engine works without Google credentials
+        from google.cloud import bigquery
+        self.client = bigquery.Client(project=project_id)
+        self._bqstorage = None
+
+    @property
+    def bqstorage(self):
+        # Storage Read API client, shared by all queries; streams results as Arrow
+        if self._bqstorage is None:
+            from google.cloud import bigquery_storage
+            self._bqstorage = bigquery_storage.BigQueryReadClient()
+        return self._bqstorage
+
+    def _query(self, sql):
+        return self.client.query(sql).to_dataframe(bqstorage_client=self.bqstorage)
+
+    def query_batches(self, sql):
+        rows = self.client.query(sql).result()
+        if rows.total_rows == 0:
+            yield from _empty_batch(rows.to_arrow().schema)
+            return
+        yield from rows.to_arrow_iterable(bqstorage_client=self.bqstorage)
+
+    def _table_version(self):
+        table = self.client.get_table(f"{PROJECT_ID}.{DATASET}.{TABLE}")
+        return f"{table.modified.isoformat()}-{table.num_rows}"
+
+    def columns(self):
+        return [field.name for field in self.client.get_table(f"{PROJECT_ID}.{DATASET}.{TABLE}").schema]
+
+
+class LocalParquetBackend(QueryBackend):
+    """
+    Runs the same queries in-process with DuckDB over partitioned Parquet files.
+
+    The files are expected under LOCAL_DATA_DIR/<TABLE_ID>/ (for example
+    State=CA/part-0.parquet, as written by `bq extract --destination_format=PARQUET`
+    or any Hive-partitioned writer) and use the BigQuery column names.
+    """
+    name = 'local'
+
+    def __init__(self, data_dir=LOCAL_DATA_DIR, table=TABLE):
+        import duckdb
+
+        self.data_dir = os.path.abspath(data_dir)
+        self.table = table
+        self.con = duckdb.connect(database=':memory:')
+
+        self.pattern = os.path.join(self.data_dir, table, '**', '*.parquet')
+        if not self.files():
+            raise FileNotFoundError(f"No Parquet files found for table '{table}' under {self.data_dir}")
+
+        self.con.execute(
+            f"CREATE VIEW {table} AS "
+            f"SELECT * FROM read_parquet('{self.pattern}', hive_partitioning = true, union_by_name = true)"
+        )
+
+    def files(self):
+        return sorted(glob.glob(self.pattern, recursive=True))
+
+    def translate(self, sql):
+        """
+        Rewrite BigQuery Standard SQL into the DuckDB dialect.
+        DuckDB already understands TABLESAMPLE SYSTEM (n PERCENT), EXTRACT(HOUR ...)
+        and GROUP BY positions, so only identifiers and regex calls need rewriting.
+        """
+        # REGEXP_CONTAINS(col, r'...') -> regexp_matches(col, '...'); both engines use RE2
+        sql = re.sub(r"\bREGEXP_CONTAINS\s*\(", "regexp_matches(", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\br'", "'", sql)
+        # Fully qualified `project.dataset.table` references point at the local view
+        sql = re.sub(r"`[^`]+\.[^`]+\.([^`]+)`", lambda m: self.table if m.group(1) == TABLE else m.group(1), sql)
+        # Remaining backtick-quoted identifiers (e.g. `Humidity_%_`) become double-quoted
+        return re.sub(r"`([^`]+)`", r'"\1"', sql)
+
+    def _query(self, sql):
+        # DuckDB connections are not thread-safe; each call uses its own cursor
+        return self.con.cursor().execute(self.translate(sql)).df()
+
+    def query_batches(self, sql, batch_rows=256 * 1024):
+        # Only the referenced Parquet columns are read (projection pushdown)
+        reader = self.con.cursor().execute(self.translate(sql)).to_arrow_reader(batch_rows)
+        empty = True
+        for batch in reader:
+            empty = False
+            yield batch
+        if empty:
+            yield from _empty_batch(reader.schema)
+
+    def _table_version(self):
+        stats = [os.stat(f) for f in self.files()]
+        return f"{max(st.st_mtime_ns for st in stats)}-{len(stats)}-{sum(st.st_size for st in stats)}"
+
+    def columns(self):
+        return [row[0] for row in self.con.cursor().execute(f"DESCRIBE {self.table}").fetchall()]
+
+
+BACKENDS = {
+    BigQueryBackend.name: BigQueryBackend,
+    LocalParquetBackend.name: LocalParquetBackend,
+}
+
+
+def get_backend(engine=QUERY_ENGINE):
+    """
+    Build the query backend selected by the QUERY_ENGINE environment variable.
+    """
+    if engine not in BACKENDS:
+        raise ValueError(f"Unknown QUERY_ENGINE '{engine}', expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[engine]()
+
+
+def is_stale(path, built_version, dataset_version, job):
+    """
+    Whether the artifact at `path`, built from `built_version` of the table, is
+    out of date for `dataset_version` (None skips the check). A stale artifact
+    is logged with the offline `job` that rebuilds it.
+    """
+    if dataset_version is None or str(built_version) == str(dataset_version):
+        return False
+    logger.warning("Ignoring %s: built from dataset version %s, the table is at %s. Rebuild it with python -m %s",
+                   path, built_version, dataset_version, job)
+    return True
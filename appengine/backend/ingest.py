@@ -0,0 +1,368 @@
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import itertools
+
+import pandas as pd
+
+from backend.engine import LOCAL_DATA_DIR, TABLE
+from backend.derived import DERIVED_COLUMNS
+
+# ------------ TYPED CSV INGESTION ------------
+# The Kaggle export (data/us_accidents.csv, 7.7M rows, ~3 GB) is read with
+# Arrow's multithreaded CSV reader against an explicit schema: low-cardinality
+# strings are dictionary-encoded (pandas categoricals), readings are float32,
+# road flags are booleans, and only the requested columns are parsed.
+#
+# The file is converted once into the Hive-partitioned Parquet layout that
+# the local query engine reads (LOCAL_DATA_DIR/<TABLE_ID>/State=XX/...),
+# with BigQuery column names and the derived columns (backend/derived.py)
+# filled in on the way. read_accidents() and iter_accidents() then read only
+# the projected columns from Parquet, falling back to the typed CSV reader
+# when nothing has been converted yet.
+#
+# Which source is read: the converted dataset whenever it exists. A `path`
+# passed alongside it must name the CSV it was converted from (recorded in
+# _source.json), otherwise the read fails instead of silently using other
+# data; without a dataset, `path` is the CSV that is parsed. Derived columns
+# are only returned when asked for, so both sources give the same columns.
+#
+# Convert from the appengine/ directory with:
+#   python -m backend.ingest ../data/us_accidents.csv
+
+# Bytes per CSV parsing block (parsed in parallel) and rows per yielded chunk
+CSV_BLOCK_SIZE = int(os.environ.get("INGEST_BLOCK_BYTES", 64 * 1024 * 1024))
+CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", 500_000))
+
+# Kaggle column name -> Arrow type; columns not listed are type-inferred
+TIMESTAMP_COLUMNS = ["Start_Time", "End_Time", "Weather_Timestamp"]
+CATEGORY_COLUMNS = [
+    "Source", "City", "County", "State", "Zipcode", "Country", "Timezone", "Airport_Code",
+    "Wind_Direction", "Weather_Condition",
+    "Sunrise_Sunset", "Civil_Twilight", "Nautical_Twilight", "Astronomical_Twilight",
+]
+FLOAT_COLUMNS = [
+    "Distance(mi)", "Temperature(F)", "Wind_Chill(F)", "Humidity(%)", "Pressure(in)",
+    "Visibility(mi)", "Wind_Speed(mph)", "Precipitation(in)",
+]
+# Coordinates keep float64: float32 would round them to about a metre
+COORDINATE_COLUMNS = ["Start_Lat", "Start_Lng", "End_Lat", "End_Lng"]
+BOOLEAN_COLUMNS = [
+    "Amenity", "Bump", "Crossing", "Give_Way", "Junction", "No_Exit", "Railway", "Roundabout",
+    "Station", "Stop", "Traffic_Calming", "Traffic_Signal", "Turning_Loop", "highway",
+]
+
+# Identity of the CSV a dataset was converted from, next to its Parquet files
+SOURCE_FILE = "_source.json"
+
+
+def csv_schema():
+    import pyarrow as pa
+
+    schema = {"ID": pa.string(), "Severity": pa.int8(), "Description": pa.string(), "Street": pa.string()}
+    schema.update({col: pa.timestamp("us") for col in TIMESTAMP_COLUMNS})
+    schema.update({col: pa.dictionary(pa.int32(), pa.string()) for col in CATEGORY_COLUMNS})
+    schema.update({col: pa.float32() for col in FLOAT_COLUMNS})
+    schema.update({col: pa.float64() for col in COORDINATE_COLUMNS})
+    schema.update({col: pa.bool_() for col in BOOLEAN_COLUMNS})
+    return schema
+
+
+def bigquery_name(column):
+    """
+    Column name in the BigQuery table, e.g. "Temperature(F)" -> "Temperature_F_".
+    """
+    return re.sub(r"[()]", "_", column)
+
+
+def kaggle_name(column):
+    """
+    Inverse of bigquery_name() for the columns of the Kaggle export.
+    """
+    return {bigquery_name(name): name for name in csv_schema()}.get(column, column)
+
+
+def _csv_options(path, columns=None, exclude=()):
+    import pyarrow.csv as pacsv
+
+    schema = csv_schema()
+    header = pd.read_csv(path, nrows=0).columns
+    columns = [c for c in (header if columns is None else columns) if c not in set(exclude)]
+    missing = sorted(set(columns) - set(header))
+    if missing:
+        raise KeyError(f"{path} has no columns {missing}")
+
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=CSV_BLOCK_SIZE)
+    convert_options = pacsv.ConvertOptions(
+        include_columns=columns,
+        column_types={col: schema[col] for col in columns if col in schema},
+        timestamp_parsers=["%Y-%m-%d %H:%M:%S", pacsv.ISO8601],
+        true_values=["True", "true", "TRUE"],
+        false_values=["False", "false", "FALSE"],
+        strings_can_be_null=True,
+    )
+    return read_options, convert_options
+
+
+def _to_pandas(table):
+    # Dictionary columns become categoricals; split_blocks avoids one consolidated copy
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def dataset_dir(data_dir=LOCAL_DATA_DIR, table=TABLE):
+    return os.path.join(data_dir, table)
+
+
+def has_dataset(data_dir=LOCAL_DATA_DIR, table=TABLE):
+    directory = dataset_dir(data_dir, table)
+    return os.path.isdir(directory) and any(f.endswith(".parquet") for _, _, files in os.walk(directory) for f in files)
+
+
+def dataset_fingerprint(data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    Identity of the converted dataset (file count, total size, newest mtime), or None.
+    """
+    if not has_dataset(data_dir, table):
+        return None
+    files = [os.path.join(root, f) for root, _, names in os.walk(dataset_dir(data_dir, table))
+             for f in names if f.endswith(".parquet")]
+    stats = [os.stat(f) for f in files]
+    return {"files": len(stats), "size": sum(st.st_size for st in stats), "mtime_ns": max(st.st_mtime_ns for st in stats)}
+
+
+def csv_fingerprint(path):
+    """
+    Identity of a CSV file: absolute path, size and modification time.
+    """
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def dataset_source(data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    csv_fingerprint() of the CSV the dataset was converted from, or None if unknown.
+    """
+    source_path = os.path.join(dataset_dir(data_dir, table), SOURCE_FILE)
+    if not os.path.exists(source_path):
+        return None
+    with open(source_path) as f:
+        return json.load(f)
+
+
+def uses_dataset(path=None, data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    True if reads go to the converted dataset, False if they parse the CSV at
+    `path`. Raises when an explicit `path` is not the dataset's source (or has
+    changed since it was converted), or when there is nothing to read.
+    """
+    if not has_dataset(data_dir, table):
+        if path is None:
+            raise FileNotFoundError(f"No Parquet dataset under {dataset_dir(data_dir, table)} and no CSV path given")
+        return False
+    if path is None:
+        return True
+
+    source = dataset_source(data_dir, table)
+    # The CSV may have been removed after conversion; a changed one makes the dataset stale
+    if source is not None and source["path"] == os.path.abspath(path) \
+            and (not os.path.exists(path) or csv_fingerprint(path) == source):
+        return True
+    converted_from = "an unrecorded CSV" if source is None else source["path"]
+    raise ValueError(
+        f"The Parquet dataset under {dataset_dir(data_dir, table)} was converted from {converted_from}, "
+        f"which does not match {os.path.abspath(path)} as it is now. Read the dataset without a path, "
+        f"reconvert it with `python -m backend.ingest {path}`, or point LOCAL_DATA_DIR elsewhere."
+    )
+
+
+def source_fingerprint(path=None, data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    Identity of the source uses_dataset() picks: {"parquet": dataset_fingerprint()}
+    or {"csv": csv_fingerprint(path)}. Only the source that is read is stat'ed.
+    """
+    if uses_dataset(path, data_dir, table):
+        return {"parquet": dataset_fingerprint(data_dir, table)}
+    return {"csv": csv_fingerprint(path)}
+
+
+def available_columns(path=None, data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    Kaggle names of every column the source chosen by uses_dataset() can provide,
+    derived columns included.
+    """
+    if uses_dataset(path, data_dir, table):
+        return [kaggle_name(c) for c in _dataset(data_dir, table).schema.names]
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _dataset(data_dir, table):
+    import pyarrow.dataset as ds
+
+    return ds.dataset(dataset_dir(data_dir, table), format="parquet", partitioning="hive")
+
+
+def _parquet_columns(dataset, columns, exclude=()):
+    """
+    BigQuery names to read for the requested Kaggle (or BigQuery) column names.
+    """
+    available = set(dataset.schema.names)
+    if columns is None:
+        names = [kaggle_name(c) for c in dataset.schema.names if c not in DERIVED_COLUMNS]
+    else:
+        names = list(columns)
+    names = [c for c in names if c not in set(exclude)]
+    missing = [c for c in names if bigquery_name(c) not in available and c not in available]
+    if missing:
+        raise KeyError(f"Parquet dataset has no columns {missing}")
+    return names, [c if c in available else bigquery_name(c) for c in names]
+
+
+def read_accidents(columns=None, path=None, exclude=(), data_dir=LOCAL_DATA_DIR, table=TABLE):
+    """
+    Accidents as a typed pandas DataFrame with Kaggle column names, reading only
+    `columns` (the CSV's columns by default, minus `exclude`). Reads the
+    converted Parquet dataset when it exists, otherwise parses the CSV at
+    `path` (see uses_dataset()).
+    """
+    if uses_dataset(path, data_dir, table):
+        dataset = _dataset(data_dir, table)
+        names, stored = _parquet_columns(dataset, columns, exclude)
+        df = _to_pandas(dataset.to_table(columns=stored))
+        df.columns = names
+        return df
+
+    import pyarrow.csv as pacsv
+
+    read_options, convert_options = _csv_options(path, columns, exclude)
+    table = pacsv.read_csv(path, read_options=read_options, convert_options=convert_options)
+    return _to_pandas(table.select(convert_options.include_columns))
+
+
+def iter_tables(columns=None, path=None, exclude=(), data_dir=LOCAL_DATA_DIR, table=TABLE, chunk_rows=CHUNK_ROWS):
+    """
+    Yield (Kaggle column names, pyarrow Table) in chunks of about `chunk_rows` rows.
+    """
+    import pyarrow as pa
+
+    if uses_dataset(path, data_dir, table):
+        dataset = _dataset(data_dir, table)
+        names, stored = _parquet_columns(dataset, columns, exclude)
+        batches = dataset.to_batches(columns=stored, batch_size=chunk_rows)
+    else:
+        import pyarrow.csv as pacsv
+
+        read_options, convert_options = _csv_options(path, columns, exclude)
+        names = convert_options.include_columns
+        batches = (b.select(names) for b in pacsv.open_csv(path, read_options=read_options, convert_options=convert_options))
+
+    pending, rows = [], 0
+    for batch in batches:
+        pending.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_rows:
+            yield names, pa.Table.from_batches(pending)
+            pending, rows = [], 0
+    if rows:
+        yield names, pa.Table.from_batches(pending)
+
+
+def iter_accidents(columns=None, path=None, exclude=(), data_dir=LOCAL_DATA_DIR, table=TABLE, chunk_rows=CHUNK_ROWS):
+    """
+    Chunked read_accidents(): yields typed pandas DataFrames of about `chunk_rows` rows.
+    """
+    for names, chunk in iter_tables(columns, path, exclude, data_dir, table, chunk_rows):
+        df = _to_pandas(chunk)
+        df.columns = names
+        yield df
+
+
+def _prepare_batch(batch, derived=True):
+    """
+    Rename a CSV batch to BigQuery names, add the derived columns and make the
+    partition column a plain string.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from backend.derived import highway_flags
+
+    columns = {bigquery_name(name): column for name, column in zip(batch.schema.names, batch.columns)}
+    if "State" in columns:
+        columns["State"] = pc.cast(columns["State"], pa.string())
+    if derived and "Description" in columns and "highway" not in columns:
+        columns["highway"] = pa.array(highway_flags(columns["Description"]), type=pa.bool_())
+    return pa.RecordBatch.from_arrays(list(columns.values()), names=list(columns))
+
+
+def convert_csv(path, data_dir=LOCAL_DATA_DIR, table=TABLE, columns=None, partition="State", derived=True):
+    """
+    Stream the CSV into Hive-partitioned Parquet under data_dir/<table>/, with
+    BigQuery column names and derived columns. The dataset is written next to
+    the existing one and swapped in when complete. Returns the number of rows.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+
+    read_options, convert_options = _csv_options(path, columns)
+    reader = pacsv.open_csv(path, read_options=read_options, convert_options=convert_options)
+    batches = (_prepare_batch(batch, derived) for batch in reader)
+    first = next(batches, None)
+    if first is None:
+        return 0
+
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for batch in itertools.chain([first], batches):
+            rows += batch.num_rows
+            yield batch
+
+    target = dataset_dir(data_dir, table)
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_target, ignore_errors=True)
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(first.schema, counted()),
+        tmp_target,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([(partition, pa.string())]), flavor="hive") if partition else None,
+        basename_template="part-{i}.parquet",
+        max_rows_per_group=CHUNK_ROWS,
+    )
+    with open(os.path.join(tmp_target, SOURCE_FILE), "w") as f:
+        json.dump(csv_fingerprint(path), f, indent=2)
+
+    if os.path.exists(target):
+        old_target = f"{target}.{os.getpid()}.old"
+        os.replace(target, old_target)
+        os.replace(tmp_target, target)
+        shutil.rmtree(old_target, ignore_errors=True)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        os.replace(tmp_target, target)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the accidents CSV into partitioned Parquet")
+    parser.add_argument("csv", help="Kaggle export, e.g. ../data/us_accidents.csv")
+    parser.add_argument("--data-dir", default=LOCAL_DATA_DIR, help="LOCAL_DATA_DIR to write into")
+    parser.add_argument("--search-index", action="store_true",
+                        help="also build the Description index (backend/search.py) from the new files")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = convert_csv(args.csv, data_dir=args.data_dir)
+    print(f"Wrote {rows:,} rows to {dataset_dir(args.data_dir)} in {time.perf_counter() - start:.1f}s")
+
+    if args.search_index:
+        from backend.engine import LocalParquetBackend
+        from backend.search import build_search_index
+        print(f"Description index written to {build_search_index(LocalParquetBackend(args.data_dir))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backend.engine import ARTIFACT_DIR, get_backend, is_stale
+from backend.samples import WeatherSampleManager, WEATHER_FEATURES
+
+# ------------ MODEL REGISTRY ------------
+# Models shown on the dashboard are trained offline and stored as versioned
+# artifacts instead of being fitted inside a page render:
+#
+#   <REGISTRY_DIR>/<model>/<version>/model.joblib   fitted scaler + estimator
+#   <REGISTRY_DIR>/<model>/<version>/metadata.json  features, importances, data version
+#   <REGISTRY_DIR>/<model>/LATEST                   version served by the dashboard
+#
+# Estimators are dumped uncompressed so joblib can memory-map their arrays;
+# the dashboard maps the latest version of each model at startup, and the
+# importance charts only read metadata.json.
+#
+# Train and register every model from the appengine/ directory with:
+#   python -m backend.registry
+# or list what is registered with:
+#   python -m backend.registry --list
+
+REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR")
+REGISTRY_DIR = os.path.join(ARTIFACT_DIR, 'models') if REGISTRY_DIR is None else REGISTRY_DIR
+
+# Older versions kept next to the latest one, for rollback
+KEEP_VERSIONS = int(os.environ.get("MODEL_KEEP_VERSIONS", 3))
+
+# Parallel tree building for the offline job
+TRAIN_JOBS = int(os.environ.get("MODEL_TRAIN_JOBS", -1))
+
+IMPORTANCE_FEATURES = WEATHER_FEATURES + ["highway"]
+
+# Model name -> training setup on the shared weather sample
+MODEL_SPECS = {
+    # Methodology page: the full 5% weather sample
+    "highway_rf": {"features": IMPORTANCE_FEATURES, "fraction": None},
+    # Findings page: a 40% slice of the sample, i.e. the original 2% sample size
+    "predictive_rf": {"features": IMPORTANCE_FEATURES, "fraction": 0.4},
+}
+
+
+def severity_binary(severity):
+    """
+    Classification target: 0 = Low (1-2), 1 = High (3-4).
+    """
+    return (np.asarray(severity) >= 3).astype(np.int8)
+
+
+def fit_model(df, features, n_jobs=TRAIN_JOBS):
+    """
+    Scale `features` of a weather sample frame and fit a 100-tree Random Forest
+    on binary severity. Returns (scaler, model).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    X = df[features].astype(np.float32)
+    y = severity_binary(df["Severity"])
+
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    model = RandomForestClassifier(n_estimators=100, random_state=42, n_jobs=n_jobs)
+    model.fit(X_scaled, y)
+    return scaler, model
+
+
+class RegisteredModel:
+    """
+    One registered version: metadata is always loaded, the estimator only on
+    first use (memory-mapped).
+    """
+
+    def __init__(self, name, version, path, metadata):
+        self.name = name
+        self.version = version
+        self.path = path
+        self.metadata = metadata
+        self._artifact = None
+
+    @property
+    def features(self):
+        return self.metadata["features"]
+
+    def importances(self):
+        """
+        Feature importances as a DataFrame sorted ascending, ready for a bar chart.
+        """
+        return pd.DataFrame({
+            "Feature": self.features,
+            "Importance": self.metadata["importances"],
+        }).sort_values(by="Importance", ascending=True)
+
+    def _load(self):
+        import joblib
+
+        if self._artifact is None:
+            self._artifact = joblib.load(os.path.join(self.path, "model.joblib"), mmap_mode="r")
+        return self._artifact
+
+    @property
+    def scaler(self):
+        return self._load()["scaler"]
+
+    @property
+    def model(self):
+        return self._load()["model"]
+
+    def predict_proba(self, df):
+        return self.model.predict_proba(self.scaler.transform(df[self.features].astype(np.float32)))
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts under `root`.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def versions(self, name):
+        directory = os.path.join(self.root, name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(v for v in os.listdir(directory) if os.path.isfile(os.path.join(directory, v, "metadata.json")))
+
+    def latest(self, name):
+        pointer = os.path.join(self.root, name, "LATEST")
+        if not os.path.exists(pointer):
+            return None
+        with open(pointer) as f:
+            return f.read().strip() or None
+
+    def load(self, name, version=None):
+        """
+        The given (default: latest) version of a model, or None if it is not registered.
+        """
+        version = self.latest(name) if version is None else version
+        if version is None:
+            return None
+        path = os.path.join(self.root, name, version)
+        metadata_path = os.path.join(path, "metadata.json")
+        if not os.path.exists(metadata_path):
+            return None
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+        return RegisteredModel(name, version, path, metadata)
+
+    def register(self, name, scaler, model, features, metadata=None):
+        """
+        Write a new version of `name` and point LATEST at it.
+        """
+        import joblib
+
+        version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.root, name, version)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        # Uncompressed so the tree arrays can be memory-mapped on load
+        joblib.dump({"scaler": scaler, "model": model}, os.path.join(tmp_path, "model.joblib"))
+        metadata = {
+            **(metadata or {}),
+            "features": list(features),
+            "importances": [float(v) for v in getattr(model, "feature_importances_", [])],
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        with open(os.path.join(tmp_path, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(tmp_path, path)
+
+        pointer = os.path.join(self.root, name, "LATEST")
+        with open(f"{pointer}.tmp", "w") as f:
+            f.write(version)
+        os.replace(f"{pointer}.tmp", pointer)
+
+        self.prune(name)
+        return version
+
+    def prune(self, name, keep=KEEP_VERSIONS):
+        latest = self.latest(name)
+        older = [v for v in self.versions(name) if v != latest]
+        for version in older[:max(0, len(older) - keep)]:
+            shutil.rmtree(os.path.join(self.root, name, version), ignore_errors=True)
+
+
+def train_models(backend=None, names=None, registry=None):
+    """
+    Fit every model in MODEL_SPECS (or `names`) on one shared weather sample
+    and register a new version of each. Returns name -> version.
+    """
+    backend = get_backend() if backend is None else backend
+    registry = ModelRegistry() if registry is None else registry
+    samples = WeatherSampleManager(backend)
+
+    versions = {}
+    for name in MODEL_SPECS if names is None else names:
+        spec = MODEL_SPECS[name]
+        df = samples.frame(["Severity"] + spec["features"], fraction=spec["fraction"])
+        scaler, model = fit_model(df, spec["features"])
+        versions[name] = registry.register(name, scaler, model, spec["features"], metadata={
+            "dataset_version": str(backend.dataset_version()),
+            "sample_percent": samples.percent,
+            "fraction": spec["fraction"],
+            "rows": len(df),
+        })
+    return versions
+
+
+def load_model(name, registry=None, dataset_version=None):
+    """
+    Latest registered version of a model if the training job has run, otherwise None.
+    With `dataset_version`, a model trained on another version of the table is not loaded.
+    """
+    registry = ModelRegistry() if registry is None else registry
+    registered = registry.load(name)
+    if registered is None:
+        return None
+    if is_stale(registered.path, registered.metadata.get("dataset_version"), dataset_version, "backend.registry"):
+        return None
+    return registered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and register the dashboard models")
+    parser.add_argument("models", nargs="*", help=f"models to train (default: all of {', '.join(MODEL_SPECS)})")
+    parser.add_argument("--list", action="store_true", help="list registered versions instead of training")
+    args = parser.parse_args()
+    unknown = sorted(set(args.models) - set(MODEL_SPECS))
+    if unknown:
+        parser.error(f"unknown models: {', '.join(unknown)}")
+
+    registry = ModelRegistry()
+    if args.list:
+        for name in MODEL_SPECS:
+            latest = registry.latest(name)
+            for version in registry.versions(name):
+                print(f"{name:<16} {version}{'  (latest)' if version == latest else ''}")
+        return
+
+    for name, version in train_models(names=args.models or None, registry=registry).items():
+        print(f"Registered {name} version {version}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+
+import numpy as np
+import pandas as pd
+
+from backend.engine import TABLE_REF
+from backend.derived import highway_expression
+
+# ------------ SHARED WEATHER SAMPLE ------------
+# The Random Forests are fitted on a TABLESAMPLE of Severity plus six weather
+# readings: the offline training job (backend/registry.py) and, until it has
+# registered a model, the sample-based importance builders in analysis.py
+# (feature_importances, behind both Random Forest charts). The sample is
+# fetched once per refresh cycle and shared between them.
+
+SAMPLE_PERCENT = float(os.environ.get("WEATHER_SAMPLE_PERCENT", 5))
+SAMPLE_REFRESH_SECONDS = int(os.environ.get("WEATHER_SAMPLE_REFRESH", 24 * 3600))
+
+# Alias used by the builders -> column in the accidents table
+WEATHER_COLUMNS = {
+    "Temperature": "Temperature_F_",
+    "Humidity": "Humidity_%_",
+    "Visibility": "Visibility_mi_",
+    "Precipitation": "Precipitation_in_",
+    "Pressure": "Pressure_in_",
+    "Wind_Speed": "Wind_Speed_mph_",
+}
+WEATHER_FEATURES = list(WEATHER_COLUMNS)
+
+
+class WeatherSampleManager:
+    """
+    Holds one versioned weather sample in compact columnar form.
+
+    Columns are kept as separate numpy arrays (int8 severity, float32 readings,
+    bool highway flag) and frame() wraps slices of them in a DataFrame without
+    copying. Builders can add columns to the returned frame freely; assigning to
+    an existing column replaces it in that frame only.
+    """
+
+    def __init__(self, backend, percent=SAMPLE_PERCENT, refresh_seconds=SAMPLE_REFRESH_SECONDS):
+        self.backend = backend
+        self.percent = percent
+        self.refresh_seconds = refresh_seconds
+
+        self.version = None
+        self.fetched_at = 0.0
+        self._columns = None
+        self._lock = threading.Lock()
+
+    def query(self):
+        weather = ",\n                ".join(f"`{col}` AS {alias}" for alias, col in WEATHER_COLUMNS.items())
+        not_null = "\n              AND ".join(f"`{col}` IS NOT NULL" for col in WEATHER_COLUMNS.values())
+        # Stored highway flag (backend/derived.py), so Description is never transferred
+        return f"""
+            SELECT
+                Severity,
+                {weather},
+                {highway_expression(self.backend)} AS highway
+            FROM {TABLE_REF} TABLESAMPLE SYSTEM ({self.percent} PERCENT)
+            WHERE Severity IS NOT NULL
+              AND {not_null}
+        """
+
+    def refresh(self):
+        df = self.backend.query(self.query(), compact=True)
+
+        columns = {"Severity": df["Severity"].to_numpy(dtype=np.int8)}
+        for alias in WEATHER_FEATURES:
+            columns[alias] = df[alias].to_numpy(dtype=np.float32)
+        columns["highway"] = df["highway"].to_numpy(dtype=bool)
+
+        self._columns = columns
+        self.version = f"{self.backend.dataset_version()}@{int(time.time())}"
+        self.fetched_at = time.time()
+
+    def _current(self):
+        with self._lock:
+            if self._columns is None or time.time() - self.fetched_at > self.refresh_seconds:
+                self.refresh()
+            return self._columns
+
+    def frame(self, columns=None, fraction=None):
+        """
+        Return a zero-copy DataFrame view of the sample.
+        fraction takes a leading slice of the (already random) sample, e.g. 0.4
+        of a 5% sample to reproduce a 2% sample.
+        """
+        data = self._current()
+        columns = list(data) if columns is None else columns
+        n = len(data["Severity"])
+        if fraction is not None:
+            n = int(n * fraction)
+        return pd.DataFrame({c: data[c][:n] for c in columns}, copy=False)
+
+    def __len__(self):
+        return len(self._current()["Severity"])
@@ -0,0 +1,277 @@
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from backend.engine import TABLE_REF, ARTIFACT_DIR, get_backend, is_stale
+from backend.text import match_patterns
+
+# ------------ INVERTED INDEX OVER DESCRIPTION ------------
+# Maps every token of Description to the sorted list of records containing it,
+# so keyword and route lookups ("i-95", "ramp", "closed", "multi-vehicle")
+# become posting list intersections instead of regex scans of the table.
+#
+# Tokens are lowercase words; route mentions are normalized so "I 95", "I95",
+# "I-95" and "Interstate 95" all become "i-95" (likewise us-, sr-, hwy-, ...),
+# and hyphenated words are indexed whole and by part. Each posting list is
+# delta-encoded and zlib-compressed on its own, so a lookup only inflates
+# the lists it needs. Records are numbered in index order; ids() maps them
+# back to the table's ID column.
+#
+# Build it from the appengine/ directory with:
+#   python -m backend.search
+
+INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH")
+INDEX_PATH = os.path.join(ARTIFACT_DIR, 'description_index.npz') if INDEX_PATH is None else INDEX_PATH
+
+ROUTE_PREFIXES = r"i|us|sr|hwy|rte|route|ca|tx|fl|ny|nj|pa"
+
+
+def _words(descriptions):
+    """
+    Normalized words of a string column as (row, word) Arrow arrays.
+    """
+    import pyarrow.compute as pc
+
+    text = pc.utf8_lower(descriptions)
+    text = pc.replace_substring_regex(text, pattern=r"\binterstate\s+(\d+)", replacement=r"i-\1")
+    text = pc.replace_substring_regex(text, pattern=rf"\b({ROUTE_PREFIXES})[-\s]?(\d+)\b", replacement=r"\1-\2")
+
+    words = pc.split_pattern_regex(text, pattern=r"[^a-z0-9\-]+")
+    rows = pc.list_parent_indices(words)
+    tokens = pc.list_flatten(words)
+    keep = pc.greater(pc.utf8_length(pc.utf8_trim(tokens, "-")), 0)
+    return pc.filter(rows, keep), pc.filter(tokens, keep)
+
+
+def tokenize(descriptions):
+    """
+    Index tokens of a string column as (row, token) Arrow arrays: the words,
+    plus the parts of hyphenated words ("multi-vehicle" -> "multi", "vehicle").
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    rows, tokens = _words(descriptions)
+    hyphenated = pc.match_substring_regex(tokens, pattern=r"^[a-z]+(-[a-z]+)+$")
+    parts = pc.split_pattern(pc.filter(tokens, hyphenated), pattern="-")
+    part_rows = pc.take(pc.filter(rows, hyphenated), pc.list_parent_indices(parts))
+    return (
+        pa.concat_arrays([rows.cast(pa.int64()), part_rows.cast(pa.int64())]),
+        pa.concat_arrays([tokens, pc.list_flatten(parts)]),
+    )
+
+
+def normalize_term(term):
+    """
+    The index token for a query term, e.g. "I 95" -> "i-95".
+    """
+    import pyarrow as pa
+
+    _, tokens = _words(pa.array([term]))
+    tokens = tokens.to_pylist()
+    if len(tokens) != 1:
+        raise ValueError(f"'{term}' is not a single search term: {tokens}")
+    return tokens[0]
+
+
+def term_pattern(term):
+    """
+    Case-insensitive RE2 pattern matching the same descriptions as `term`,
+    for engines that have no index to consult.
+    """
+    token = normalize_term(term)
+    route = re.fullmatch(rf"({ROUTE_PREFIXES})-(\d+)", token)
+    if route is None:
+        return rf"(?i)\b{re.escape(token)}\b"
+    prefix, number = route.groups()
+    spelled = rf"|interstate\s+{number}" if prefix == "i" else ""
+    return rf"(?i)\b(?:{prefix}[-\s]?{number}{spelled})\b"
+
+
+def build_search_index(backend=None, path=INDEX_PATH):
+    """
+    Stream ID, Severity and Description from the table, tokenize each batch
+    and write the compressed posting lists.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    backend = get_backend() if backend is None else backend
+    query = f"""
+        SELECT ID, Severity, Description
+        FROM {TABLE_REF}
+    """
+
+    vocabulary = {}
+    pairs, ids, severity = [], [], []
+    offset = 0
+    for batch in backend.query_batches(query):
+        rows, tokens = tokenize(batch.column(2))
+
+        # Map this batch's distinct tokens onto global token numbers
+        encoded = pc.dictionary_encode(tokens)
+        local = [vocabulary.setdefault(t, len(vocabulary)) for t in encoded.dictionary.to_pylist()]
+        codes = np.asarray(local, dtype=np.int64)[encoded.indices.to_numpy(zero_copy_only=False)]
+
+        docs = rows.to_numpy(zero_copy_only=False) + offset
+        pairs.append(np.unique((codes << 32) | docs))
+
+        ids.append(pc.cast(batch.column(0), pa.string()))
+        severity.append(pc.fill_null(batch.column(1), 0).to_numpy(zero_copy_only=False).astype(np.int8))
+        offset += batch.num_rows
+
+    pairs = np.sort(np.concatenate(pairs)) if pairs else np.zeros(0, dtype=np.int64)
+    token_of_pair = pairs >> 32
+    docs = (pairs & 0xffffffff).astype(np.uint32)
+
+    # One compressed, delta-encoded posting list per token
+    bounds = np.searchsorted(token_of_pair, np.arange(len(vocabulary) + 1))
+    blobs = []
+    for t in range(len(vocabulary)):
+        postings = docs[bounds[t]:bounds[t + 1]]
+        blobs.append(zlib.compress(np.diff(postings, prepend=np.uint32(0)).astype(np.uint32).tobytes(), 6))
+    blob_offsets = np.concatenate([[0], np.cumsum([len(b) for b in blobs])]).astype(np.int64)
+
+    # IDs as one byte string plus offsets, so they load without a Python object per row
+    ids = pa.chunked_array(ids, type=pa.string()).cast(pa.large_string()).combine_chunks()
+    id_offsets = np.frombuffer(ids.buffers()[1], dtype=np.int64)[ids.offset:ids.offset + len(ids) + 1]
+    id_bytes = np.frombuffer(ids.buffers()[2] or b"", dtype=np.uint8)[id_offsets[0]:id_offsets[-1]]
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(
+        path,
+        vocabulary=np.frombuffer("\n".join(vocabulary).encode("utf-8"), dtype=np.uint8),
+        doc_counts=np.diff(bounds).astype(np.int64),
+        blob=np.frombuffer(b"".join(blobs), dtype=np.uint8),
+        blob_offsets=blob_offsets,
+        severity=np.concatenate(severity) if severity else np.zeros(0, np.int8),
+        id_bytes=id_bytes,
+        id_offsets=(id_offsets - id_offsets[0]).astype(np.int64),
+        version=str(backend.dataset_version()),
+    )
+    return path
+
+
+class SearchIndex:
+    """
+    Loaded posting lists with AND/OR lookups and per-severity aggregates.
+    """
+
+    def __init__(self, data):
+        words = bytes(data["vocabulary"]).decode("utf-8")
+        self.vocabulary = {t: i for i, t in enumerate(words.split("\n"))} if words else {}
+        self.doc_counts = data["doc_counts"]
+        self.blob = data["blob"]
+        self.blob_offsets = data["blob_offsets"]
+        self.severity = data["severity"]
+        self.id_bytes = data["id_bytes"]
+        self.id_offsets = data["id_offsets"]
+        self.version = str(data["version"])
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def __len__(self):
+        return len(self.severity)
+
+    def postings(self, term):
+        """
+        Sorted record numbers containing `term` (normalized like the index).
+        """
+        token = self.vocabulary.get(normalize_term(term))
+        if token is None:
+            return np.zeros(0, dtype=np.int64)
+        start, stop = self.blob_offsets[token], self.blob_offsets[token + 1]
+        deltas = np.frombuffer(zlib.decompress(self.blob[start:stop].tobytes()), dtype=np.uint32)
+        return np.cumsum(deltas, dtype=np.int64)
+
+    def search(self, all_of=(), any_of=()):
+        """
+        Records containing every term of `all_of` and at least one of `any_of`.
+        """
+        if not all_of and not any_of:
+            raise ValueError("search needs at least one term")
+
+        # Intersect from the rarest list up so the working set only shrinks
+        result = None
+        for term in sorted(all_of, key=self.document_frequency):
+            postings = self.postings(term)
+            result = postings if result is None else np.intersect1d(result, postings, assume_unique=True)
+            if len(result) == 0:
+                return result
+
+        if any_of:
+            union = np.unique(np.concatenate([self.postings(term) for term in any_of]))
+            result = union if result is None else np.intersect1d(result, union, assume_unique=True)
+        return result
+
+    def document_frequency(self, term):
+        token = self.vocabulary.get(normalize_term(term))
+        return 0 if token is None else int(self.doc_counts[token])
+
+    def _id_array(self):
+        import pyarrow as pa
+
+        return pa.LargeStringArray.from_buffers(
+            len(self), pa.py_buffer(self.id_offsets), pa.py_buffer(self.id_bytes)
+        )
+
+    def ids(self, records):
+        """
+        Table IDs of record numbers.
+        """
+        return self._id_array().take(np.asarray(records, dtype=np.int64)).to_pylist()
+
+    def term_flags(self, terms, ids):
+        """
+        One boolean column per term, aligned with the table IDs in `ids`;
+        IDs that are not in the index never match.
+        """
+        records = pd.Index(self._id_array().to_pandas()).get_indexer(pd.Index(ids))
+        flags = {}
+        for term in terms:
+            # Trailing False entry catches the -1 of unknown IDs
+            hit = np.zeros(len(self) + 1, dtype=bool)
+            hit[self.postings(term)] = True
+            flags[term] = hit[records]
+        return pd.DataFrame(flags, index=getattr(ids, "index", None))
+
+    def severity_counts(self, records):
+        """
+        Number of matching records per severity level.
+        """
+        counts = np.bincount(self.severity[records], minlength=5)
+        return pd.Series(counts[1:5], index=pd.Index([1, 2, 3, 4], name="Severity"), name="Count")
+
+
+def keyword_flags(terms, ids, descriptions, index=None):
+    """
+    Boolean column per term for the given rows: looked up in the index by ID
+    when one is loaded, otherwise matched against the descriptions.
+    """
+    if index is not None:
+        return index.term_flags(terms, ids)
+    flags = match_patterns(descriptions, {term: term_pattern(term) for term in terms})
+    return pd.DataFrame(flags, index=getattr(descriptions, "index", None))
+
+
+def load_search_index(path=INDEX_PATH, dataset_version=None):
+    """
+    Load the Description index if the offline job has produced one, otherwise return None.
+    With `dataset_version`, an index built from another version of the table is not loaded.
+    """
+    if not os.path.exists(path):
+        return None
+    index = SearchIndex.load(path)
+    if is_stale(path, index.version, dataset_version, "backend.search"):
+        return None
+    return index
+
+
+if __name__ == '__main__':
+    print(f"Description index written to {build_search_index()}")
@@ -0,0 +1,208 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+from backend.engine import ARTIFACT_DIR, get_backend, is_stale
+
+# ------------ SPATIAL GRID INDEX ------------
+# Accident counts per severity on a quadtree of web-mercator cells: a cell at
+# level L is one map tile at zoom L, so cells line up with the heatmap tiles.
+# The finest level is counted in the engine over the whole table; coarser
+# levels are rolled up by dropping one bit of each cell coordinate. Cells are
+# stored sorted by (row, column), so a bounding box is answered with one binary
+# search per cell row instead of a table scan.
+#
+# Build it from the appengine/ directory with:
+#   python -m backend.spatial
+
+INDEX_PATH = os.environ.get("SPATIAL_INDEX_PATH")
+INDEX_PATH = os.path.join(ARTIFACT_DIR, 'spatial_index.parquet') if INDEX_PATH is None else INDEX_PATH
+MAX_LEVEL = int(os.environ.get("SPATIAL_INDEX_MAX_LEVEL", 16))
+
+SEVERITIES = [1, 2, 3, 4]
+SEVERITY_COLUMNS = [f"Severity_{s}" for s in SEVERITIES]
+MAX_LAT = 85.05112878
+
+
+def cell_expressions(level):
+    """
+    SQL expressions for the column and row of a point's cell at `level`.
+    """
+    n = 1 << level
+    sin_lat = f"SIN(LEAST(GREATEST(Start_Lat, {-MAX_LAT}), {MAX_LAT}) * ACOS(-1) / 180)"
+    cx = f"CAST(FLOOR((Start_Lng + 180) / 360 * {n}) AS INT64)"
+    cy = f"CAST(FLOOR((0.5 - LN((1 + {sin_lat}) / (1 - {sin_lat})) / (4 * ACOS(-1))) * {n}) AS INT64)"
+    return cx, cy
+
+
+def lnglat_to_cell(lat, lng, level):
+    """
+    Fractional cell coordinates of lat/lng arrays at `level`.
+    """
+    n = 1 << level
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LAT, MAX_LAT)
+    sin_lat = np.sin(np.radians(lat))
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * n
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * n
+    return x, y
+
+
+def cell_to_lnglat(x, y, level):
+    """
+    Latitude/longitude of (fractional) cell coordinates at `level`.
+    """
+    n = 1 << level
+    lng = np.asarray(x, dtype=np.float64) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi - 2 * np.pi * np.asarray(y, dtype=np.float64) / n)))
+    return lat, lng
+
+
+def merge_cells(cx, cy, counts):
+    """
+    Sum the severity counts of duplicate cells and sort cells by (row, column).
+    """
+    keys = (cy.astype(np.int64) << 32) | cx.astype(np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    merged = np.column_stack([
+        np.bincount(inverse, weights=counts[:, i], minlength=len(unique)) for i in range(counts.shape[1])
+    ]).astype(counts.dtype)
+    return (unique & 0xffffffff), (unique >> 32), merged
+
+
+def build_index(backend=None, max_level=MAX_LEVEL, path=INDEX_PATH):
+    """
+    Count accidents per finest-level cell and severity in the engine, roll the
+    counts up to level 0 and, when `path` is set, write every level to Parquet.
+    """
+    backend = get_backend() if backend is None else backend
+
+    cx_expr, cy_expr = cell_expressions(max_level)
+    counts = backend.count_by(
+        [("cx", cx_expr), ("cy", cy_expr), "Severity"],
+        where=f"Start_Lat IS NOT NULL AND Start_Lng IS NOT NULL AND Severity BETWEEN {SEVERITIES[0]} AND {SEVERITIES[-1]}"
+    )
+
+    cx = counts["cx"].to_numpy(dtype=np.int64)
+    cy = counts["cy"].to_numpy(dtype=np.int64)
+    by_severity = np.zeros((len(counts), len(SEVERITIES)), dtype=np.int64)
+    by_severity[np.arange(len(counts)), counts["Severity"].to_numpy(dtype=np.int64) - SEVERITIES[0]] = counts["Count"]
+
+    levels = {}
+    cx, cy, by_severity = merge_cells(cx, cy, by_severity)
+    for level in range(max_level, -1, -1):
+        levels[level] = (cx, cy, by_severity)
+        cx, cy, by_severity = merge_cells(cx >> 1, cy >> 1, by_severity)
+
+    index = SpatialIndex(levels, version=backend.dataset_version())
+    if path is not None:
+        index.save(path)
+    return index
+
+
+class SpatialIndex:
+    """
+    Per-level arrays of cell columns, rows and severity counts, sorted by (row, column).
+    """
+
+    def __init__(self, levels, version=None):
+        self.version = version
+        self.levels = {}
+        for level, (cx, cy, counts) in levels.items():
+            keys = (np.asarray(cy, dtype=np.int64) << 32) | np.asarray(cx, dtype=np.int64)
+            order = np.argsort(keys, kind="stable")
+            self.levels[int(level)] = (keys[order], np.asarray(counts)[order])
+        self.max_level = max(self.levels)
+
+    def save(self, path=INDEX_PATH):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parts = []
+        for level, (keys, counts) in sorted(self.levels.items()):
+            part = pd.DataFrame({
+                "level": np.full(len(keys), level, dtype=np.int8),
+                "cx": (keys & 0xffffffff).astype(np.int32),
+                "cy": (keys >> 32).astype(np.int32),
+            })
+            for i, col in enumerate(SEVERITY_COLUMNS):
+                part[col] = counts[:, i].astype(np.int32)
+            parts.append(part)
+
+        table = pa.Table.from_pandas(pd.concat(parts, ignore_index=True), preserve_index=False)
+        metadata = {b"spatial_index": json.dumps({"version": self.version, "max_level": self.max_level}).encode()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        pq.write_table(table, path)
+        return path
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        info = json.loads((table.schema.metadata or {}).get(b"spatial_index", b"{}"))
+        df = table.to_pandas()
+
+        levels = {}
+        for level, part in df.groupby("level", sort=True):
+            levels[level] = (
+                part["cx"].to_numpy(dtype=np.int64),
+                part["cy"].to_numpy(dtype=np.int64),
+                part[SEVERITY_COLUMNS].to_numpy(dtype=np.int64),
+            )
+        return cls(levels, version=info.get("version"))
+
+    def cells(self, level, cx_min, cx_max, cy_min, cy_max):
+        """
+        Cells at `level` with column in [cx_min, cx_max] and row in [cy_min, cy_max]:
+        (cx, cy, counts) with one count column per severity.
+        """
+        keys, counts = self.levels[level]
+        rows = np.arange(max(cy_min, 0), min(cy_max, (1 << level) - 1) + 1, dtype=np.int64)
+        cx_min, cx_max = max(cx_min, 0), min(cx_max, (1 << level) - 1)
+
+        # One key range per cell row, since keys are ordered by row first
+        starts = np.searchsorted(keys, (rows << 32) | cx_min, side="left")
+        ends = np.searchsorted(keys, (rows << 32) | cx_max, side="right")
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+        selected = keys[positions]
+        return selected & 0xffffffff, selected >> 32, counts[positions]
+
+    def query_bbox(self, lat_min, lat_max, lng_min, lng_max, zoom):
+        """
+        Accident counts per cell at level `zoom` (capped at the finest level)
+        inside a bounding box, with the cell center and one column per severity.
+        """
+        level = min(int(zoom), self.max_level)
+        x0, y0 = lnglat_to_cell(lat_max, lng_min, level)
+        x1, y1 = lnglat_to_cell(lat_min, lng_max, level)
+        cx, cy, counts = self.cells(level, int(np.floor(x0)), int(np.floor(x1)), int(np.floor(y0)), int(np.floor(y1)))
+
+        lat, lng = cell_to_lnglat(cx + 0.5, cy + 0.5, level)
+        df = pd.DataFrame({"Lat": lat, "Lng": lng, "Count": counts.sum(axis=1)})
+        for i, col in enumerate(SEVERITY_COLUMNS):
+            df[col] = counts[:, i]
+        return df
+
+
+def load_spatial_index(path=INDEX_PATH, dataset_version=None):
+    """
+    Load the spatial index if the offline job has produced one, otherwise return None.
+    With `dataset_version`, an index built from another version of the table is not loaded.
+    """
+    if not os.path.exists(path):
+        return None
+    index = SpatialIndex.load(path)
+    if is_stale(path, index.version, dataset_version, "backend.spatial"):
+        return None
+    return index
+
+
+if __name__ == '__main__':
+    index = build_index()
+    print(f"Spatial index with levels 0-{index.max_level} written to {INDEX_PATH}")
@@ -0,0 +1,343 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import stats
+
+from backend.engine import TABLE_REF
+
+# Worker threads folding record batches into covariance partials
+COVARIANCE_WORKERS = int(os.environ.get("COVARIANCE_WORKERS", 4))
+
+# ------------ HYPOTHESIS TESTS FROM SUFFICIENT STATISTICS ------------
+# Welch t-tests, one-way ANOVA and the Pearson correlation of a variable with
+# the grouping variable only need each group's count, mean and sum of squared
+# deviations (M2). Those moments are aggregated inside the query engine, or
+# merged chunk by chunk when streaming a file, so the tests cover every row
+# while only a few numbers per group are transferred.
+
+
+class Moments:
+    """
+    Per-group count, mean and M2 of one variable. Moments of disjoint row sets
+    combine exactly with merge() (Chan et al. parallel update).
+    """
+
+    def __init__(self, groups, n, mean, m2):
+        order = np.argsort(np.asarray(groups), kind="stable")
+        self.groups = np.asarray(groups)[order]
+        self.n = np.asarray(n, dtype=np.float64)[order]
+        self.mean = np.asarray(mean, dtype=np.float64)[order]
+        self.m2 = np.asarray(m2, dtype=np.float64)[order]
+
+    @classmethod
+    def from_frame(cls, df, group, value):
+        """
+        Moments of `value` per `group` over the non-null rows of a DataFrame.
+        """
+        agg = df[[group, value]].dropna().groupby(group)[value].agg(["count", "mean", "var"])
+        return cls(agg.index.to_numpy(), agg["count"], agg["mean"], agg["var"].fillna(0.0) * (agg["count"] - 1))
+
+    def merge(self, other):
+        groups = np.union1d(self.groups, other.groups)
+        a = self._aligned(groups)
+        b = other._aligned(groups)
+
+        n = a[0] + b[0]
+        delta = b[1] - a[1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(n > 0, a[1] + delta * np.divide(b[0], n), 0.0)
+            m2 = a[2] + b[2] + np.where(n > 0, delta ** 2 * a[0] * b[0] / n, 0.0)
+        return Moments(groups, n, mean, m2)
+
+    def _aligned(self, groups):
+        n, mean, m2 = np.zeros(len(groups)), np.zeros(len(groups)), np.zeros(len(groups))
+        pos = np.searchsorted(groups, self.groups)
+        n[pos], mean[pos], m2[pos] = self.n, self.mean, self.m2
+        return n, mean, m2
+
+    def pooled(self, groups=None):
+        """
+        (n, mean, M2) of the union of `groups` (all groups by default).
+        """
+        keep = np.ones(len(self.groups), dtype=bool) if groups is None else np.isin(self.groups, groups)
+        n, mean, m2 = self.n[keep], self.mean[keep], self.m2[keep]
+        total = n.sum()
+        grand = (n * mean).sum() / total
+        return total, grand, m2.sum() + (n * (mean - grand) ** 2).sum()
+
+
+def query_moments(backend, columns, group="Severity", where=None):
+    """
+    Moments of each column per `group`, aggregated in the engine in one query.
+    columns maps an alias to a column of the accidents table. Rows missing the
+    group or any of the columns are dropped, as with dropna() over all of them.
+    """
+    selects = []
+    for alias, col in columns.items():
+        selects += [
+            f"COUNT(`{col}`) AS n_{alias}",
+            f"AVG(`{col}`) AS mean_{alias}",
+            f"VAR_SAMP(`{col}`) AS var_{alias}",
+        ]
+    selects = ",\n            ".join(selects)
+    filters = [f"{group} IS NOT NULL"] + [f"`{col}` IS NOT NULL" for col in columns.values()]
+    filters += [f"({where})"] if where else []
+    sql = f"""
+        SELECT {group} AS grp,
+            {selects}
+        FROM {TABLE_REF}
+        WHERE {" AND ".join(filters)}
+        GROUP BY grp
+    """
+    df = backend.query(sql)
+
+    moments = {}
+    for alias in columns:
+        n = df[f"n_{alias}"].astype(np.float64)
+        present = n > 0
+        m2 = df[f"var_{alias}"].astype(np.float64).fillna(0.0) * (n - 1).clip(lower=0)
+        moments[alias] = Moments(df["grp"][present].to_numpy(), n[present],
+                                 df[f"mean_{alias}"][present].astype(np.float64), m2[present])
+    return moments
+
+
+def accumulate_moments(frames, group, values):
+    """
+    Merge the moments of `values` per `group` over an iterable of DataFrame chunks.
+    Rows missing the group or any of `values` are dropped, as with dropna().
+    """
+    moments = None
+    for frame in frames:
+        frame = frame[[group] + list(values)].dropna()
+        chunk = {value: Moments.from_frame(frame, group, value) for value in values}
+        moments = chunk if moments is None else {v: moments[v].merge(chunk[v]) for v in values}
+    return moments
+
+
+def welch_ttest(a, b):
+    """
+    Welch's unequal-variance t-test from (n, mean, M2) of two samples,
+    as scipy.stats.ttest_ind(..., equal_var=False). Returns (t, p).
+    """
+    (na, ma, m2a), (nb, mb, m2b) = a, b
+    va, vb = m2a / (na - 1) / na, m2b / (nb - 1) / nb
+    t = (ma - mb) / np.sqrt(va + vb)
+    df = (va + vb) ** 2 / (va ** 2 / (na - 1) + vb ** 2 / (nb - 1))
+    return float(t), float(2 * stats.t.sf(abs(t), df))
+
+
+def one_way_anova(moments):
+    """
+    One-way ANOVA across the groups of a Moments, as scipy.stats.f_oneway. Returns (F, p).
+    """
+    k = len(moments.groups)
+    total, grand, _ = moments.pooled()
+    between = (moments.n * (moments.mean - grand) ** 2).sum()
+    within = moments.m2.sum()
+    f = (between / (k - 1)) / (within / (total - k))
+    return float(f), float(stats.f.sf(f, k - 1, total - k))
+
+
+def pearson_with_group(moments):
+    """
+    Pearson correlation between the variable and the (numeric) group value,
+    as scipy.stats.pearsonr on the underlying rows. Returns (r, p).
+    """
+    total, mean, m2 = moments.pooled()
+    g = moments.groups.astype(np.float64)
+    g_mean = (moments.n * g).sum() / total
+    cross = (moments.n * (moments.mean - mean) * (g - g_mean)).sum()
+    r = cross / np.sqrt(m2 * (moments.n * (g - g_mean) ** 2).sum())
+    r = float(np.clip(r, -1.0, 1.0))
+
+    # Same null distribution as pearsonr: r follows a beta distribution on [-1, 1]
+    dist = stats.beta(total / 2 - 1, total / 2 - 1, loc=-1, scale=2)
+    return r, float(2 * dist.sf(abs(r)))
+
+
+# ---- chi-square tests of independence, batched ----
+
+def chi_square(tables, correction=True):
+    """
+    Chi-square tests of independence for a stack of contingency tables of
+    shape (..., rows, cols), all computed at once. Rows and columns with a
+    zero total are ignored, as pd.crosstab would omit them, and Yates'
+    correction is applied to 1-dof tables, matching scipy's chi2_contingency.
+    Returns (chi2, p, dof) arrays over the leading dimensions.
+    """
+    observed = np.asarray(tables, dtype=np.float64)
+    row_totals = observed.sum(axis=-1, keepdims=True)
+    col_totals = observed.sum(axis=-2, keepdims=True)
+    total = observed.sum(axis=(-2, -1), keepdims=True)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = np.where(total > 0, row_totals * col_totals / total, 0.0)
+    dof = ((row_totals > 0).sum(axis=(-2, -1)) - 1) * ((col_totals > 0).sum(axis=(-2, -1)) - 1)
+    dof = np.maximum(dof, 0)
+
+    if correction:
+        diff = expected - observed
+        yates = np.sign(diff) * np.minimum(0.5, np.abs(diff))
+        observed = np.where((dof == 1)[..., None, None], observed + yates, observed)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        terms = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0)
+    chi2 = np.where(dof > 0, terms.sum(axis=(-2, -1)), 0.0)
+    p = np.where(dof > 0, stats.chi2.sf(chi2, np.maximum(dof, 1)), 1.0)
+    return chi2, p, dof
+
+
+def flag_tables(flags, counts):
+    """
+    Contingency tables of every boolean feature against a target from grouped
+    counts: flags is (groups, features) bool, counts is (groups, classes) row
+    counts per target class. Returns (features, 2, classes) tables whose rows
+    are [False, True], from one matrix product.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    present = np.asarray(flags, dtype=np.float64).T @ counts
+    absent = counts.sum(axis=0) - present
+    return np.stack([absent, present], axis=1)
+
+
+def pack_flags(matrix):
+    """
+    Pack each row of a (rows, features) boolean matrix into one integer code.
+    """
+    matrix = np.asarray(matrix, dtype=bool)
+    weights = np.left_shift(np.int64(1), np.arange(matrix.shape[1], dtype=np.int64))
+    return matrix.astype(np.int64) @ weights
+
+
+def packed_counts(codes, target, n_features, n_classes):
+    """
+    Count rows per (flag pattern, target class) with one bincount pass over
+    packed codes: a (2**n_features, n_classes) array. Arrays from several
+    chunks can simply be added together.
+    """
+    return np.bincount(np.asarray(codes) * n_classes + np.asarray(target),
+                       minlength=(1 << n_features) * n_classes).reshape(-1, n_classes)
+
+
+def unpack_counts(counts, n_features):
+    """
+    (flags, counts) of the flag patterns that occur in packed_counts() output,
+    ready for flag_tables().
+    """
+    patterns = np.flatnonzero(np.asarray(counts).sum(axis=1))
+    flags = (patterns[:, None] >> np.arange(n_features)) & 1
+    return flags.astype(bool), np.asarray(counts)[patterns]
+
+
+def grouped_table(df, feature, target, count="Count"):
+    """
+    Contingency table of a (possibly high-cardinality) feature against a target
+    from grouped counts, e.g. count_by([feature, target]) output.
+    """
+    return df.pivot_table(index=feature, columns=target, values=count, aggfunc="sum", fill_value=0).to_numpy()
+
+
+# ---- lift of boolean features ----
+
+def flag_lift(flags, counts, values):
+    """
+    Row counts and mean value with each boolean feature present and absent,
+    for any number of features, from grouped counts: flags is (groups, features)
+    bool, counts the rows in each group and values the group's value (e.g. its
+    Severity). One product of the transposed flag matrix with [counts, sums]
+    gives every feature at once. Means of empty sides are 0.
+    Returns (count_present, count_absent, mean_present, mean_absent).
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = np.column_stack([counts, counts * np.asarray(values, dtype=np.float64)])
+    present = np.asarray(flags, dtype=np.float64).T @ totals
+    absent = totals.sum(axis=0) - present
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_present = np.where(present[:, 0] > 0, present[:, 1] / present[:, 0], 0.0)
+        mean_absent = np.where(absent[:, 0] > 0, absent[:, 1] / absent[:, 0], 0.0)
+    return present[:, 0].astype(np.int64), absent[:, 0].astype(np.int64), mean_present, mean_absent
+
+
+# ---- streaming covariance ----
+
+class Covariance:
+    """
+    Row count, mean vector and co-moment matrix (sum of outer products of
+    deviations) of several columns. Chunks are folded in with update() and
+    partial results combine exactly with merge() (Chan et al.).
+    """
+
+    def __init__(self, k):
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if len(X) == 0:
+            return self
+        chunk = Covariance(X.shape[1])
+        chunk.n = len(X)
+        chunk.mean = X.mean(axis=0)
+        deviations = X - chunk.mean
+        chunk.comoment = deviations.T @ deviations
+        return self.merge(chunk, inplace=True)
+
+    def merge(self, other, inplace=False):
+        target = self if inplace else Covariance(len(self.mean))
+        n = self.n + other.n
+        if n == 0:
+            return target
+        delta = other.mean - self.mean
+        target.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        target.mean = self.mean + delta * (other.n / n)
+        target.n = n
+        return target
+
+    def covariance(self):
+        return self.comoment / (self.n - 1)
+
+    def correlation(self):
+        sd = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.comoment / np.outer(sd, sd)
+
+
+def batch_covariance(batch):
+    """
+    Covariance accumulator of one Arrow record batch of numeric columns.
+    """
+    return Covariance(batch.num_columns).update(np.column_stack([
+        batch.column(j).to_numpy(zero_copy_only=False).astype(np.float64) for j in range(batch.num_columns)
+    ]))
+
+
+def stream_covariance(backend, columns, workers=COVARIANCE_WORKERS):
+    """
+    Covariance of the columns (alias -> column of the accidents table) over all
+    rows where every one is present. The result is streamed in record batches
+    whose partial accumulators are computed by a pool of worker threads while
+    the next batches download, then merged in order.
+    """
+    select = ", ".join(f"`{col}` AS {alias}" for alias, col in columns.items())
+    not_null = " AND ".join(f"`{col}` IS NOT NULL" for col in columns.values())
+    sql = f"""
+        SELECT {select}
+        FROM {TABLE_REF}
+        WHERE {not_null}
+    """
+
+    total = Covariance(len(columns))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in backend.query_batches(sql):
+            pending.append(pool.submit(batch_covariance, batch))
+            # Bound the number of batches held in memory
+            if len(pending) >= 2 * workers:
+                total = total.merge(pending.popleft().result())
+        while pending:
+            total = total.merge(pending.popleft().result())
+    return total
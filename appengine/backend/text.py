@@ -0,0 +1,72 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ------------ REGEX FEATURES OVER DESCRIPTION ------------
+# Incident descriptions repeat heavily ("Accident on I-5 at Exit 12", ...).
+# Text flags are therefore evaluated once per distinct string: the column is
+# dictionary-encoded, each pattern runs over the dictionary with Arrow's RE2
+# kernel split across threads (the kernels release the GIL), and results are
+# mapped back to rows through the dictionary codes.
+
+TEXT_THREADS = int(os.environ.get("TEXT_THREADS", os.cpu_count() or 1))
+
+# Distinct strings per kernel call when the dictionary is split across threads
+MIN_SLICE = 16 * 1024
+
+
+def _as_arrow(values):
+    import pyarrow as pa
+
+    if isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values
+    return pa.array(values, type=pa.string(), from_pandas=True)
+
+
+def _dictionary(values):
+    """
+    (codes, distinct strings) of a string column; codes are -1 for nulls.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    values = _as_arrow(values)
+    if isinstance(values, pa.ChunkedArray):
+        if pa.types.is_dictionary(values.type):
+            values = values.unify_dictionaries()
+        values = values.combine_chunks()
+    if not pa.types.is_dictionary(values.type):
+        values = pc.dictionary_encode(values)
+    codes = pc.fill_null(values.indices, -1).to_numpy(zero_copy_only=False)
+    return codes, values.dictionary
+
+
+def match_patterns(values, patterns, ignore_case=True, threads=TEXT_THREADS):
+    """
+    Flag every row of a string column (pandas Series, list or Arrow array)
+    against each regex in `patterns` (name -> RE2 pattern). Null strings never
+    match. Returns name -> numpy bool array.
+    """
+    import pyarrow.compute as pc
+
+    codes, dictionary = _dictionary(values)
+    n = len(dictionary)
+    slices = max(1, min(threads, n // MIN_SLICE))
+    bounds = np.linspace(0, n, slices + 1).astype(int)
+
+    def run(pattern, start, stop):
+        matched = pc.match_substring_regex(dictionary.slice(start, stop - start), pattern=pattern,
+                                           ignore_case=ignore_case)
+        return pc.fill_null(matched, False).to_numpy(zero_copy_only=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as pool:
+        futures = {
+            name: [pool.submit(run, pattern, bounds[i], bounds[i + 1]) for i in range(slices)]
+            for name, pattern in patterns.items()
+        }
+        distinct = {name: np.concatenate([f.result() for f in parts]) if n else np.zeros(0, dtype=bool)
+                    for name, parts in futures.items()}
+
+    # One extra False entry so null rows (code -1) map to "no match"
+    return {name: np.append(flags, False)[codes] for name, flags in distinct.items()}
@@ -0,0 +1,63 @@
+import re
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from backend.engine import TABLE_REF, get_backend
+from backend.derived import HIGHWAY_PATTERN
+from backend.text import match_patterns, TEXT_THREADS
+
+# ------------ BENCHMARK: REGEX FLAGS OVER DESCRIPTION ------------
+# Compares pandas Series.str.contains with the dictionary-encoded, threaded
+# Arrow extractor (backend/text.py) on the highway pattern.
+#
+# Run from the appengine/ directory against either query engine:
+#   python -m benchmarks.text_features --rows 5000000
+
+
+def load_descriptions(rows):
+    """
+    `rows` descriptions from the accidents table, repeated if the table is smaller.
+    """
+    df = get_backend().query(f"SELECT Description FROM {TABLE_REF} LIMIT {int(rows)}", compact=True)
+    values = df["Description"].astype(object)
+    if len(values) < rows:
+        values = pd.Series(np.resize(values.to_numpy(), rows))
+    return values
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regex flags over Description")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=TEXT_THREADS)
+    args = parser.parse_args()
+
+    values = load_descriptions(args.rows)
+    print(f"{len(values):,} descriptions, {values.nunique():,} distinct, {args.threads} threads")
+
+    pandas_time, expected = timed(
+        lambda: values.str.contains(HIGHWAY_PATTERN, flags=re.IGNORECASE, na=False).to_numpy(), args.repeat
+    )
+    arrow_time, flags = timed(
+        lambda: match_patterns(values, {"highway": HIGHWAY_PATTERN}, threads=args.threads)["highway"], args.repeat
+    )
+
+    for name, seconds in [("pandas str.contains", pandas_time), ("dictionary + Arrow RE2", arrow_time)]:
+        print(f"{name:<24} {seconds:8.3f}s  {len(values) / seconds / 1e6:8.2f} M rows/s")
+    print(f"speedup {pandas_time / arrow_time:.1f}x, identical flags: {bool(np.array_equal(expected, flags))}")
+
+
+if __name__ == '__main__':
+    main()
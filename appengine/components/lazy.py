@@ -0,0 +1,52 @@
+from dash import dcc, html, callback, Input, Output, MATCH, ctx
+from dash.exceptions import PreventUpdate
+
+# ------------ LAZY FIGURE SECTIONS ------------
+# Pages render a light placeholder per figure. assets/lazy_sections.js clicks a
+# section's trigger once it scrolls into view, and the callback below builds
+# that one figure, so the page paints before any query or model has run.
+
+# Section name -> zero-argument builder returning a Dash component.
+# Pages register their builders at import time so every worker process knows them.
+SECTION_BUILDERS = {}
+
+
+def register_sections(builders):
+    SECTION_BUILDERS.update(builders)
+
+
+def lazy_section(name, min_height='450px'):
+    """
+    Placeholder for the figure produced by the registered builder `name`.
+    """
+    if name not in SECTION_BUILDERS:
+        raise KeyError(f"No builder registered for section '{name}'")
+
+    return html.Div(className='lazy-section', children=[
+        # Zero-height sentinel watched by the IntersectionObserver
+        html.Div(id={'type': 'lazy-trigger', 'name': name}, className='lazy-trigger'),
+        dcc.Loading(
+            type="circle",
+            children=html.Div(
+                id={'type': 'lazy-content', 'name': name},
+                children=html.Div(style={'minHeight': min_height})
+            )
+        )
+    ])
+
+
+@callback(
+    Output({'type': 'lazy-content', 'name': MATCH}, 'children'),
+    Input({'type': 'lazy-trigger', 'name': MATCH}, 'n_clicks'),
+    prevent_initial_call=True
+)
+def load_section(n_clicks):
+    # Only the first trigger builds the figure
+    if n_clicks != 1:
+        raise PreventUpdate
+
+    name = ctx.triggered_id['name']
+    try:
+        return SECTION_BUILDERS[name]()
+    except Exception as e:
+        return html.Div(f"Error rendering {name.replace('_', ' ')}: {str(e)}")
@@ -20,6 +20,19 @@ from visuals.analysis import (
     model_performance_visualization,
     generate_risk_map_visualization
 )
+from components.lazy import lazy_section, register_sections
+
+# Query-backed figures load lazily, one callback per section (see components/lazy.py)
+register_sections({
+    'severity_distribution': severity_distribution,
+    'weather_condition_counts': weather_condition_counts,
+    'severity_by_weather_conditions': severity_by_weather_conditions,
+    'highway_severity_analysis': highway_severity_analysis,
+    'accident_time_analysis': accident_time_analysis,
+    'accidents_by_month': accidents_by_month,
+    'accident_heatmap': accident_heatmap,
+    'generate_risk_map_visualization': generate_risk_map_visualization,
+})
 
 def page():
     return html.Div(style=container_style, children=[
@@ -103,7 +116,7 @@ def page():
                     "The distribution of accident severity levels reveals important patterns about traffic safety concerns:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                severity_distribution(),
+                lazy_section('severity_distribution'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "Most accidents fall into the moderate severity range (levels 2-3), with fewer incidents at the extremes. "
@@ -163,7 +176,7 @@ def page():
                     "Analysis of weather conditions present during accidents reveals important patterns:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                weather_condition_counts(),
+                lazy_section('weather_condition_counts'),
             ]),
             
             # NEW: Severity by Weather Conditions
@@ -180,7 +193,7 @@ def page():
                     "Different weather conditions show distinct patterns in accident severity distribution:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                severity_by_weather_conditions(),
+                lazy_section('severity_by_weather_conditions'),
                 html.Div(style={'marginTop': '15px'}, children=[
                 html.P(
                     "While most accidents occur during clear or fair weather, adverse conditions such as light snow, overcast skies, "
@@ -223,7 +236,7 @@ def page():
                     "Comparative analysis of accident severity on highways versus local roads:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                highway_severity_analysis()
+                lazy_section('highway_severity_analysis')
             ]),
         ]),
         
@@ -249,7 +262,7 @@ def page():
                     "Analysis of how accident frequency and severity vary throughout the day:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                accident_time_analysis(),
+                lazy_section('accident_time_analysis'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "Morning and evening rush hours show dramatic spikes in accident frequency, with notable differences "
@@ -274,7 +287,7 @@ def page():
                     "Interactive visualization of daily accident patterns across different months, with holiday markers:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                accidents_by_month(),
+                lazy_section('accidents_by_month'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "Our temporal analysis reveals distinct patterns in accident frequency across different months and days. "
@@ -308,7 +321,7 @@ def page():
                     "Geographical distribution of accidents reveals critical patterns for targeted safety interventions:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                accident_heatmap(),
+                lazy_section('accident_heatmap'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "The heatmap visualization clearly identifies accident hotspots concentrated around major urban centers "
@@ -334,7 +347,7 @@ def page():
                     "Geographical analysis of accident risk reveals critical safety insights:",
                     style={'fontSize': '16px', 'marginBottom': '20px'}
                 ),
-                generate_risk_map_visualization(),
+                lazy_section('generate_risk_map_visualization'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "The risk map provides a nuanced visualization of accident severity across the United States. "
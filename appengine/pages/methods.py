@@ -18,6 +18,17 @@ from visuals.analysis import (
     road_feature_chi_square,
     model_performance_comparison
 )
+from components.lazy import lazy_section, register_sections
+
+# Query-backed figures load lazily, one callback per section (see components/lazy.py)
+register_sections({
+    'weather_impact_analysis': weather_impact_analysis,
+    'road_feature_chi_square': road_feature_chi_square,
+    'feature_correlation': feature_correlation,
+    'severity_distribution': severity_distribution,
+    'precipitation_vs_severity': precipitation_vs_severity,
+    'accidents_by_state': accidents_by_state,
+})
 
 def page():
     """
@@ -162,7 +173,7 @@ def page():
             
             # Statistical methods visualization
             html.Div([
-                weather_impact_analysis()
+                lazy_section('weather_impact_analysis')
             ]),
 
             # Spacer
@@ -177,7 +188,7 @@ def page():
             
             # Categorical features visualization
             html.Div([
-                road_feature_chi_square()
+                lazy_section('road_feature_chi_square')
             ])
             ]),
         ]),
@@ -203,11 +214,11 @@ def page():
                 
                 # EDA visualizations 
                 html.Div([
-                feature_correlation(),
+                lazy_section('feature_correlation'),
                 html.Div(style={'height': '30px'}),
-                severity_distribution(),
+                lazy_section('severity_distribution'),
                 html.Div(style={'height': '30px'}),  # Spacer
-                precipitation_vs_severity(),
+                lazy_section('precipitation_vs_severity'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "While most accidents occur during conditions of low precipitation (<1 inch), we observe that higher "
@@ -218,7 +229,7 @@ def page():
                     )
                 ]),  # Added closing bracket here
                 html.Div(style={'height': '30px'}),  # Spacer
-                accidents_by_state(),
+                lazy_section('accidents_by_state'),
                 html.Div(style={'marginTop': '15px'}, children=[
                     html.P(
                         "The visualization of accidents across states reveals significant disparities in incident frequencies. California leads with an exceptional 1,741,433 accidents, substantially higher than Texas at 880,192. The top five states - California, Texas, South Carolina, New York, and North Carolina - demonstrate considerable variation in accident counts, likely influenced by factors such as population density, road infrastructure, and driving conditions.",
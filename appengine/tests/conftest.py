@@ -0,0 +1,79 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Tests import the dashboard packages (backend, visuals, ...) from appengine/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from backend.engine import TABLE, LocalParquetBackend
+
+STATES = ["CA", "FL", "NY", "TX"]
+ROAD_FEATURES = [
+    "Amenity", "Bump", "Crossing", "Junction",
+    "No_Exit", "Railway", "Roundabout", "Station", "Stop",
+    "Traffic_Calming", "Traffic_Signal", "Turning_Loop"
+]
+DESCRIPTIONS = [
+    "Accident on I-95 Northbound at Exit 12",
+    "Right lane blocked due to accident on US-1",
+    "Multi-vehicle crash on Main St, road closed",
+    "Ramp closed to I 10 Westbound",
+    "Slow traffic on Hwy 50 near Elm Ave",
+    "Accident at Oak St and 5th Ave",
+    "Interstate 5 southbound two lanes blocked",
+    None,
+]
+
+
+def accidents_frame(rows=6000, seed=7):
+    """
+    Synthetic accidents with BigQuery column names, NULLs in the road flags,
+    highway and the weather readings, and points across the continental US.
+    """
+    rng = np.random.default_rng(seed)
+
+    def with_nulls(values, share=0.1):
+        values = pd.array(values)
+        values[rng.random(rows) < share] = pd.NA
+        return values
+
+    df = pd.DataFrame({
+        "ID": [f"A-{i}" for i in range(rows)],
+        "Severity": rng.choice([1, 2, 3, 4], size=rows, p=[0.1, 0.5, 0.3, 0.1]).astype("int64"),
+        "State": rng.choice(STATES, size=rows),
+        "Start_Time": pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 60, rows), unit="min"),
+        "Weather_Condition": pd.array(rng.choice(["Clear", "Rain", "Fog", "Snow"], size=rows), dtype="string"),
+        "Description": pd.array(rng.choice(np.array(DESCRIPTIONS, dtype=object), size=rows), dtype="string"),
+        "Temperature_F_": with_nulls(rng.normal(60, 15, rows).astype("float64")),
+        "Humidity_%_": with_nulls(rng.uniform(10, 100, rows).astype("float64")),
+        "Visibility_mi_": with_nulls(rng.uniform(0, 10, rows).astype("float64")),
+        "Precipitation_in_": with_nulls(rng.exponential(0.05, rows).astype("float64")),
+        "Pressure_in_": with_nulls(rng.normal(29.9, 0.3, rows).astype("float64")),
+        "Wind_Speed_mph_": with_nulls(rng.gamma(2.0, 4.0, rows).astype("float64")),
+    })
+    for feature in ROAD_FEATURES + ["highway"]:
+        df[feature] = with_nulls(rng.random(rows) < 0.3, share=0.15).astype("boolean")
+    df["Start_Lat"] = rng.uniform(25.0, 49.0, rows)
+    df["Start_Lng"] = rng.uniform(-124.0, -67.0, rows)
+    return df
+
+
+@pytest.fixture(scope="session")
+def accidents():
+    return accidents_frame()
+
+
+@pytest.fixture(scope="session")
+def local_backend(accidents, tmp_path_factory):
+    """
+    LocalParquetBackend over `accidents`, Hive-partitioned by State like the converted dataset.
+    """
+    data_dir = tmp_path_factory.mktemp("parquet")
+    for state, part in accidents.groupby("State"):
+        directory = data_dir / TABLE / f"State={state}"
+        directory.mkdir(parents=True)
+        part.drop(columns="State").to_parquet(directory / "part-0.parquet", index=False)
+    return LocalParquetBackend(str(data_dir))
@@ -0,0 +1,19 @@
+from backend.engine import TABLE_REF
+from backend.samples import WeatherSampleManager, WEATHER_FEATURES
+
+
+def test_compact_query_of_empty_result_keeps_columns(local_backend):
+    df = local_backend.query(f"""
+        SELECT Severity, `Temperature_F_` AS Temperature, Weather_Condition, Amenity
+        FROM {TABLE_REF}
+        WHERE Severity > 10
+    """, compact=True)
+    assert len(df) == 0
+    assert list(df.columns) == ["Severity", "Temperature", "Weather_Condition", "Amenity"]
+
+
+def test_empty_weather_sample_has_every_column(local_backend):
+    samples = WeatherSampleManager(local_backend, percent=0)
+    df = samples.frame()
+    assert len(df) == 0
+    assert list(df.columns) == ["Severity"] + WEATHER_FEATURES + ["highway"]
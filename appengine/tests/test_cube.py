@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from backend.cube import CUBOIDS, ROAD_FEATURES, RollupCube, build_cube, load_cube
+
+
+@pytest.fixture(scope="module")
+def cube_path(local_backend, tmp_path_factory):
+    return build_cube(local_backend, path=str(tmp_path_factory.mktemp("cube") / "rollup_cube.parquet"))
+
+
+@pytest.fixture(scope="module")
+def cube(cube_path):
+    return load_cube(cube_path)
+
+
+def test_every_cuboid_counts_all_rows(cube, accidents):
+    for name in CUBOIDS:
+        assert cube.cuboids[name]["Count"].sum() == len(accidents)
+
+
+def test_road_cuboid_has_no_duplicate_groups(cube):
+    road = cube.cuboids["road"]
+    assert not road.duplicated(CUBOIDS["road"]).any()
+    assert road[ROAD_FEATURES + ["highway"]].notna().all().all()
+
+
+def test_road_counts_match_pandas(cube, accidents):
+    features = ["Amenity", "Bump", "highway"]
+    df = accidents.copy()
+    for f in features:
+        df[f] = df[f].fillna(False).astype(bool)
+    expected = df.groupby(["Severity"] + features).size().rename("Count").reset_index()
+
+    result = cube.count_by(["Severity"] + features)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+@pytest.mark.parametrize("dims", [["Severity"], ["State", "Severity"], ["Weather_Condition"], ["Hour"]])
+def test_cube_matches_engine(cube, local_backend, dims):
+    engine_dims = [("Hour", "EXTRACT(HOUR FROM Start_Time)") if d == "Hour" else d for d in dims]
+    expected = local_backend.count_by(engine_dims)
+    pd.testing.assert_frame_equal(cube.count_by(dims), expected, check_dtype=False)
+
+
+def test_cube_declines_filtered_requests(cube):
+    assert cube.count_by(["Severity"], where="Severity > 2") is None
+    assert cube.count_by(["Severity", "Zipcode"]) is None
+    assert isinstance(cube, RollupCube)
+
+
+def test_cube_of_another_dataset_version_is_not_loaded(cube_path, local_backend):
+    assert load_cube(cube_path, dataset_version=local_backend.dataset_version()) is not None
+    assert load_cube(cube_path, dataset_version="older") is None
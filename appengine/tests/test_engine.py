@@ -0,0 +1,55 @@
+import pandas as pd
+import pytest
+
+
+def expected_counts(df, dims):
+    return df.dropna(subset=dims).groupby(dims).size().rename("Count").reset_index()
+
+
+def test_count_by_matches_pandas(local_backend, accidents):
+    result = local_backend.count_by(["Severity", "State"])
+    expected = expected_counts(accidents, ["Severity", "State"])
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_count_by_groups_on_expression_shadowing_a_column(local_backend, accidents):
+    # IFNULL(Amenity, FALSE) AS Amenity must group on the expression, not the raw column
+    features = ["Amenity", "Bump"]
+    result = local_backend.count_by(["Severity"] + [(f, f"IFNULL({f}, FALSE)") for f in features])
+
+    df = accidents.copy()
+    for f in features:
+        df[f] = df[f].fillna(False).astype(bool)
+    expected = expected_counts(df, ["Severity"] + features)
+
+    assert len(result) == 4 * 2 ** len(features)
+    assert not result.duplicated(["Severity"] + features).any()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+
+def test_count_by_expression_dimension(local_backend, accidents):
+    result = local_backend.count_by([("Hour", "EXTRACT(HOUR FROM Start_Time)")])
+    expected = accidents.groupby(accidents["Start_Time"].dt.hour.rename("Hour")).size()
+    assert result.set_index("Hour")["Count"].to_dict() == expected.to_dict()
+
+
+@pytest.mark.parametrize("top_n, min_count", [(3, None), (None, 200)])
+def test_count_by_top_n_and_min_count(local_backend, accidents, top_n, min_count):
+    result = local_backend.count_by(["State", "Severity"], top_n=top_n, min_count=min_count)
+    expected = expected_counts(accidents, ["State", "Severity"])
+    if min_count is not None:
+        expected = expected[expected["Count"] > min_count]
+        pd.testing.assert_frame_equal(result, expected.reset_index(drop=True), check_dtype=False)
+    else:
+        assert result["Count"].tolist() == expected["Count"].nlargest(top_n).tolist()
+
+
+def test_highway_counts_with_null_flags(local_backend, accidents):
+    # highway_severity_analysis(): one bar per severity and flag, NULL flags counted as False
+    from backend.derived import highway_expression
+
+    result = local_backend.count_by(["Severity", ("highway", highway_expression(local_backend))])
+    assert accidents["highway"].isna().any()
+    expected = accidents.assign(highway=accidents["highway"].fillna(False).astype(bool))
+    expected = expected.groupby(["Severity", "highway"]).size().rename("Count").reset_index()
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
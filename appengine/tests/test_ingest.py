@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+import pytest
+
+from backend.ingest import available_columns, convert_csv, iter_accidents, read_accidents, uses_dataset
+
+KAGGLE_COLUMNS = ["ID", "Severity", "Start_Time", "State", "Description", "Temperature(F)", "Amenity"]
+
+
+@pytest.fixture()
+def csv_path(tmp_path, accidents):
+    df = accidents.head(500).rename(columns={"Temperature_F_": "Temperature(F)"})[KAGGLE_COLUMNS]
+    path = tmp_path / "us_accidents.csv"
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_reads_the_csv_until_converted(csv_path, tmp_path):
+    data_dir = str(tmp_path / "parquet")
+    assert not uses_dataset(csv_path, data_dir=data_dir)
+    df = read_accidents(path=csv_path, data_dir=data_dir)
+    assert list(df.columns) == KAGGLE_COLUMNS
+    with pytest.raises(FileNotFoundError):
+        read_accidents(data_dir=data_dir)
+
+
+def test_converted_dataset_matches_the_csv(csv_path, tmp_path):
+    data_dir = str(tmp_path / "parquet")
+    assert convert_csv(csv_path, data_dir=data_dir) == 500
+    assert uses_dataset(csv_path, data_dir=data_dir)
+
+    from_csv = read_accidents(path=csv_path, data_dir=str(tmp_path / "none"))
+    from_parquet = read_accidents(path=csv_path, data_dir=data_dir)
+    # Derived columns only when asked for, so both sources give the CSV's columns
+    assert sorted(from_parquet.columns) == sorted(KAGGLE_COLUMNS)
+    assert "highway" in available_columns(csv_path, data_dir=data_dir)
+
+    columns = ["ID", "Severity", "Temperature(F)", "Amenity"]
+    expected = from_csv[columns].sort_values("ID").reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        from_parquet[columns].sort_values("ID").reset_index(drop=True), expected, check_dtype=False
+    )
+    chunked = pd.concat(iter_accidents(columns, path=csv_path, data_dir=data_dir, chunk_rows=100))
+    pd.testing.assert_frame_equal(chunked.sort_values("ID").reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_explicit_path_must_be_the_dataset_source(csv_path, tmp_path):
+    data_dir = str(tmp_path / "parquet")
+    convert_csv(csv_path, data_dir=data_dir)
+
+    other = tmp_path / "other.csv"
+    other.write_text(open(csv_path).read())
+    with pytest.raises(ValueError, match="converted from"):
+        read_accidents(path=str(other), data_dir=data_dir)
+    with pytest.raises(ValueError):
+        next(iter_accidents(path=str(other), data_dir=data_dir))
+
+    # A CSV changed after conversion makes the dataset stale
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with pytest.raises(ValueError):
+        read_accidents(path=csv_path, data_dir=data_dir)
+    assert len(read_accidents(data_dir=data_dir)) == 500
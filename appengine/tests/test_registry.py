@@ -0,0 +1,11 @@
+from backend.registry import ModelRegistry, load_model
+
+
+def test_model_of_another_dataset_version_is_not_loaded(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    registry.register("predictive_rf", None, None, ["Temperature"], metadata={"dataset_version": "v2"})
+
+    assert load_model("predictive_rf", registry).metadata["dataset_version"] == "v2"
+    assert load_model("predictive_rf", registry, dataset_version="v2") is not None
+    assert load_model("predictive_rf", registry, dataset_version="v1") is None
+    assert load_model("highway_rf", registry, dataset_version="v2") is None
@@ -0,0 +1,66 @@
+import re
+
+import numpy as np
+import pytest
+
+from backend.search import (
+    SearchIndex, build_search_index, keyword_flags, load_search_index, normalize_term, term_pattern,
+)
+
+TERMS = ["I-95", "I 10", "interstate 5", "US 1", "ramp", "closed", "blocked", "multi-vehicle", "vehicle", "accident"]
+
+
+@pytest.fixture(scope="module")
+def index_path(local_backend, tmp_path_factory):
+    return build_search_index(local_backend, path=str(tmp_path_factory.mktemp("search") / "index.npz"))
+
+
+@pytest.fixture(scope="module")
+def index(index_path):
+    return SearchIndex.load(index_path)
+
+
+def regex_ids(accidents, term):
+    pattern = re.compile(term_pattern(term))
+    hits = accidents["Description"].map(lambda text: isinstance(text, str) and bool(pattern.search(text)))
+    return set(accidents["ID"][hits.astype(bool)])
+
+
+def test_route_terms_are_normalized():
+    assert normalize_term("I 95") == normalize_term("I95") == normalize_term("Interstate 95") == "i-95"
+    assert normalize_term("US-1") == "us-1"
+
+
+@pytest.mark.parametrize("term", TERMS)
+def test_postings_match_regex(index, accidents, term):
+    assert set(index.ids(index.postings(term))) == regex_ids(accidents, term)
+    assert index.document_frequency(term) == len(regex_ids(accidents, term))
+
+
+@pytest.mark.parametrize("term", TERMS)
+def test_term_pattern_matches_engine_regex(index, local_backend, term):
+    df = local_backend.count_by(["Severity"], where=f"REGEXP_CONTAINS(Description, r'{term_pattern(term)}')")
+    records = index.postings(term)
+    assert df["Count"].sum() == len(records)
+    expected = index.severity_counts(records)
+    assert df.set_index("Severity")["Count"].reindex(expected.index, fill_value=0).tolist() == expected.tolist()
+
+
+def test_search_combines_terms(index, accidents):
+    found = set(index.ids(index.search(all_of=["accident"], any_of=["I-95", "ramp"])))
+    expected = regex_ids(accidents, "accident") & (regex_ids(accidents, "I-95") | regex_ids(accidents, "ramp"))
+    assert found == expected
+
+
+def test_keyword_flags_agree_with_and_without_index(index, accidents):
+    terms = ["closed", "multi-vehicle", "I-10"]
+    sample = accidents.sample(500, random_state=1)
+    from_index = keyword_flags(terms, sample["ID"], sample["Description"], index)
+    from_text = keyword_flags(terms, sample["ID"], sample["Description"])
+    for term in terms:
+        np.testing.assert_array_equal(from_index[term].to_numpy(), from_text[term].to_numpy())
+
+
+def test_index_of_another_dataset_version_is_not_loaded(index_path, local_backend):
+    assert load_search_index(index_path, dataset_version=local_backend.dataset_version()) is not None
+    assert load_search_index(index_path, dataset_version="older") is None
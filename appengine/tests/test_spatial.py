@@ -0,0 +1,23 @@
+import pytest
+
+from backend.spatial import build_index, load_spatial_index
+
+
+@pytest.fixture(scope="module")
+def index_path(local_backend, tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("spatial") / "spatial_index.parquet")
+    build_index(local_backend, max_level=8, path=path)
+    return path
+
+
+def test_index_of_another_dataset_version_is_not_loaded(index_path, local_backend):
+    index = load_spatial_index(index_path, dataset_version=local_backend.dataset_version())
+    assert index is not None and index.max_level == 8
+    assert load_spatial_index(index_path, dataset_version="older") is None
+
+
+def test_every_level_counts_all_rows(index_path, accidents):
+    index = load_spatial_index(index_path)
+    for level in (0, 4, 8):
+        cells = index.query_bbox(-85.0, 85.0, -180.0, 180.0, level)
+        assert cells["Count"].sum() == len(accidents)
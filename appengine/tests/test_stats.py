@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from backend.cube import ROAD_FEATURES
+from backend.stats import (
+    Moments, accumulate_moments, chi_square, flag_lift, flag_tables, grouped_table, one_way_anova, pack_flags,
+    packed_counts, pearson_with_group, query_moments, stream_covariance, unpack_counts, welch_ttest,
+)
+
+
+WEATHER = {"Temperature": "Temperature_F_", "Humidity": "Humidity_%_", "Visibility": "Visibility_mi_"}
+
+
+@pytest.fixture(scope="module")
+def engine_moments(local_backend):
+    return query_moments(local_backend, WEATHER)
+
+
+@pytest.mark.parametrize("alias", list(WEATHER))
+def test_moment_tests_match_scipy(engine_moments, accidents, alias):
+    df = accidents[["Severity"] + list(WEATHER.values())].dropna()
+    values = df[WEATHER[alias]].astype(float)
+    moments = engine_moments[alias]
+
+    low, high = values[df["Severity"] <= 2], values[df["Severity"] >= 3]
+    t, p = welch_ttest(moments.pooled([1, 2]), moments.pooled([3, 4]))
+    expected = stats.ttest_ind(low, high, equal_var=False)
+    assert t == pytest.approx(expected.statistic, rel=1e-9)
+    assert p == pytest.approx(expected.pvalue, rel=1e-7)
+
+    f, p = one_way_anova(moments)
+    expected = stats.f_oneway(*[values[df["Severity"] == s] for s in (1, 2, 3, 4)])
+    assert f == pytest.approx(expected.statistic, rel=1e-9)
+    assert p == pytest.approx(expected.pvalue, rel=1e-7)
+
+    r, p = pearson_with_group(moments)
+    expected = stats.pearsonr(values, df["Severity"])
+    assert r == pytest.approx(expected[0], rel=1e-9)
+    assert p == pytest.approx(expected[1], rel=1e-7)
+
+
+def test_streamed_moments_match_engine_moments(engine_moments, accidents):
+    frames = (chunk.rename(columns={col: alias for alias, col in WEATHER.items()})
+              for _, chunk in accidents.groupby(np.arange(len(accidents)) // 700))
+    streamed = accumulate_moments(frames, "Severity", list(WEATHER))
+    df = accidents[["Severity"] + list(WEATHER.values())].dropna()
+    for alias in WEATHER:
+        expected = Moments.from_frame(df, "Severity", WEATHER[alias])
+        np.testing.assert_allclose(engine_moments[alias].n, expected.n)
+        np.testing.assert_allclose(engine_moments[alias].mean, expected.mean, rtol=1e-12)
+        np.testing.assert_allclose(engine_moments[alias].m2, expected.m2, rtol=1e-9)
+        np.testing.assert_allclose(streamed[alias].n, expected.n)
+        np.testing.assert_allclose(streamed[alias].mean, expected.mean, rtol=1e-12)
+        np.testing.assert_allclose(streamed[alias].m2, expected.m2, rtol=1e-9)
+
+
+def test_road_feature_chi_square_matches_scipy(local_backend, accidents):
+    # Same pipeline as road_feature_chi_square(): grouped counts -> per-feature 2x2 tables
+    df = local_backend.count_by(["Severity"] + [(f, f"IFNULL({f}, FALSE)") for f in ROAD_FEATURES])
+    high = (df["Severity"] >= 3).to_numpy()
+    counts = np.column_stack([np.where(high, 0, df["Count"]), np.where(high, df["Count"], 0)])
+    chi2, p, dof = chi_square(flag_tables(df[ROAD_FEATURES].to_numpy(dtype=bool), counts))
+
+    target = (accidents["Severity"] >= 3).astype(int)
+    for i, feature in enumerate(ROAD_FEATURES):
+        assert accidents[feature].isna().any()
+        table = pd.crosstab(accidents[feature].fillna(False).astype(bool), target)
+        expected = stats.chi2_contingency(table)
+        assert chi2[i] == pytest.approx(expected[0], rel=1e-9)
+        assert p[i] == pytest.approx(expected[1], rel=1e-9)
+        assert dof[i] == expected[2]
+
+
+def test_chi_square_of_larger_tables_matches_scipy(local_backend, accidents):
+    df = local_backend.count_by(["State", "Severity"])
+    chi2, p, dof = chi_square(grouped_table(df, "State", "Severity"))
+    expected = stats.chi2_contingency(pd.crosstab(accidents["State"], accidents["Severity"]))
+    assert float(chi2) == pytest.approx(expected[0], rel=1e-9)
+    assert float(p) == pytest.approx(expected[1], rel=1e-9)
+    assert int(dof) == expected[2]
+
+
+def test_chi_square_ignores_empty_rows_and_columns():
+    table = np.array([[10, 0, 5], [0, 0, 0], [3, 0, 12]])
+    chi2, p, dof = chi_square(table)
+    expected = stats.chi2_contingency(table[[0, 2]][:, [0, 2]])
+    assert float(chi2) == pytest.approx(expected[0])
+    assert int(dof) == expected[2] == 1
+
+
+def test_packed_counts_and_lift_match_pandas(accidents):
+    features = ROAD_FEATURES[:5]
+    flags = accidents[features].fillna(False).astype(bool)
+    high = (accidents["Severity"] >= 3).to_numpy(dtype=np.int64)
+
+    counts = packed_counts(pack_flags(flags.to_numpy()), high, len(features), 2)
+    chi2, p, _ = chi_square(flag_tables(*unpack_counts(counts, len(features))))
+    for i, feature in enumerate(features):
+        expected = stats.chi2_contingency(pd.crosstab(flags[feature], high))
+        assert chi2[i] == pytest.approx(expected[0], rel=1e-9)
+
+    grouped = accidents.assign(**flags).groupby(["Severity"] + features).size().rename("Count").reset_index()
+    present, absent, mean_present, mean_absent = flag_lift(
+        grouped[features].to_numpy(dtype=bool), grouped["Count"], grouped["Severity"]
+    )
+    for i, feature in enumerate(features):
+        assert present[i] == flags[feature].sum()
+        assert absent[i] == (~flags[feature]).sum()
+        assert mean_present[i] == pytest.approx(accidents["Severity"][flags[feature]].mean())
+        assert mean_absent[i] == pytest.approx(accidents["Severity"][~flags[feature]].mean())
+
+
+def test_stream_covariance_matches_numpy(local_backend, accidents):
+    result = stream_covariance(local_backend, WEATHER, workers=2)
+    df = accidents[list(WEATHER.values())].dropna().astype(float)
+    assert result.n == len(df)
+    np.testing.assert_allclose(result.correlation(), np.corrcoef(df.to_numpy(), rowvar=False), rtol=1e-9)
+    np.testing.assert_allclose(result.covariance(), np.cov(df.to_numpy(), rowvar=False), rtol=1e-9)
@@ -0,0 +1,24 @@
+import os
+
+import numpy as np
+
+from visuals.tiles import BASE_ZOOM, DensityPyramid, HeatmapTiles, build_pyramid
+
+
+def test_pyramid_counts_every_located_row(local_backend, accidents, tmp_path):
+    pyramid = build_pyramid(local_backend, str(tmp_path / "heatmap_density.npz"))
+    located = accidents[["Start_Lat", "Start_Lng"]].dropna()
+    assert pyramid.counts.sum() == len(located)
+    assert pyramid.version == str(local_backend.dataset_version())
+
+
+def test_pyramid_of_another_dataset_version_is_rebuilt_outside_artifacts(local_backend, tmp_path):
+    artifact = str(tmp_path / "heatmap_density.npz")
+    np.savez_compressed(artifact, keys=np.array([0]), counts=np.array([1]), base_zoom=BASE_ZOOM, version="older")
+    tiles = HeatmapTiles(local_backend, pyramid_path=artifact, tile_dir=str(tmp_path / "tiles"))
+
+    pyramid = tiles.pyramid
+    assert pyramid.version == str(local_backend.dataset_version())
+    assert DensityPyramid.load(artifact).version == "older"
+    assert os.listdir(tmp_path / "tiles") == [f"pyramid-{pyramid.digest}.npz"]
+    assert tiles.pyramid is pyramid
@@ -1,27 +1,107 @@
-from dash import dcc, html
+from dash import dcc, html, callback, Input, Output, State, Patch
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
 import plotly.express as px
 import folium
-from folium.plugins import HeatMap, MarkerCluster
-from google.cloud import bigquery
-import os
 import pandas as pd
 import numpy as np
-import re
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import classification_report, confusion_matrix
-from scipy.stats import ttest_ind, f_oneway, pearsonr, chi2_contingency
-
-client = bigquery.Client()
-PROJECT_ID = os.environ.get("PROJECT_ID")
-DATASET = os.environ.get("DATASET_ID")
-TABLE = os.environ.get("TABLE_ID")
-
-PROJECT_ID = 'cs163-final-project' if PROJECT_ID is None else PROJECT_ID
-DATASET = 'us_accident_data' if DATASET is None else DATASET
-TABLE = 'us_accidents' if TABLE is None else TABLE
+import threading
+from backend.engine import get_backend, PROJECT_ID, DATASET, TABLE
+from backend.cache import CachedBackend
+from backend.samples import WeatherSampleManager, WEATHER_COLUMNS
+from backend.derived import highway_expression
+from backend.stats import query_moments, welch_ttest, pearson_with_group, chi_square, flag_tables, flag_lift, stream_covariance
+from backend.cube import load_cube
+from backend.spatial import load_spatial_index, lnglat_to_cell, cell_to_lnglat
+from backend.clusters import ZoneClusters, ZONE_LEVEL
+from backend.search import load_search_index, term_pattern
+from backend.registry import load_model, fit_model, MODEL_SPECS
+from visuals.static_maps import publish_map
+from visuals.tiles import HeatmapTiles, MAX_ZOOM as HEATMAP_MAX_ZOOM
+
+# BigQuery by default, or local Parquet files when QUERY_ENGINE=local.
+# Results are cached in memory and on disk per dataset version.
+backend = CachedBackend(get_backend())
+
+# One weather sample shared by the correlation, t-test and Random Forest builders
+weather_samples = WeatherSampleManager(backend)
+
+# Precomputed accident counts (python -m backend.cube); None until the job has run
+# or when it was counted from another version of the table
+cube = load_cube(dataset_version=backend.dataset_version())
+
+# Accident counts per map cell (python -m backend.spatial); None until the job has run
+# or when it was built from another version of the table
+spatial_index = load_spatial_index(dataset_version=backend.dataset_version())
+
+# Server-rendered accident density tiles, served by webapp.py at /tiles/{z}/{x}/{y}.png
+heatmap_tiles = HeatmapTiles(backend, index=spatial_index)
+
+# Inverted index over Description (python -m backend.search); None until the job has run
+# or when it was built from another version of the table
+search_index = load_search_index(dataset_version=backend.dataset_version())
+
+# Latest registered models (python -m backend.registry); None until the job has run
+# or when they were trained on another version of the table
+registered_models = {name: load_model(name, dataset_version=backend.dataset_version()) for name in MODEL_SPECS}
+
+
+def count_by(dimensions, **kwargs):
+    """
+    Grouped accident counts, sliced from the rollup cube when it covers the
+    requested dimensions and aggregated by the query engine otherwise.
+    """
+    # The table may have changed since startup; then the engine counts it again
+    if cube is not None and str(cube.version) == str(backend.dataset_version()):
+        df = cube.count_by(dimensions, **kwargs)
+        if df is not None:
+            return df
+    return backend.count_by(dimensions, **kwargs)
+
+
+def keyword_severity(all_of=(), any_of=()):
+    """
+    Accidents per severity level whose Description contains every term of
+    `all_of` and at least one of `any_of` (words or routes such as "I-95").
+    Answered from the Description index when it matches the table's current
+    version, otherwise by a regex count in the query engine.
+    """
+    if search_index is not None and search_index.version == str(backend.dataset_version()):
+        counts = search_index.severity_counts(search_index.search(all_of=all_of, any_of=any_of))
+        return counts.reset_index()
+
+    filters = [f"REGEXP_CONTAINS(Description, r'{term_pattern(term)}')" for term in all_of]
+    if any_of:
+        filters.append("(" + " OR ".join(f"REGEXP_CONTAINS(Description, r'{term_pattern(term)}')" for term in any_of) + ")")
+    df = backend.count_by(["Severity"], where=" AND ".join(filters))
+    return df.set_index("Severity")["Count"].reindex([1, 2, 3, 4], fill_value=0).reset_index()
+
+
+def feature_importances(name):
+    """
+    Random Forest feature importances of a registered model, sorted ascending.
+    Until the training job has run for the table's current version, the model is
+    fitted on the shared weather sample, once per dataset version.
+    """
+    registered = registered_models.get(name)
+    if registered is not None and registered.metadata.get("dataset_version") == str(backend.dataset_version()):
+        return registered.importances()
+    return backend.cached(f"feature_importances:{name}", lambda: sample_importances(name))
+
+
+def sample_importances(name):
+    """
+    Importances of a model from MODEL_SPECS fitted on the shared weather sample.
+    """
+    spec = MODEL_SPECS[name]
+    df = weather_samples.frame(["Severity"] + spec["features"], fraction=spec["fraction"])
+    if len(df) == 0:
+        raise ValueError("the weather sample has no rows to fit on; register the model with python -m backend.registry")
+    _, model = fit_model(df, spec["features"])
+    return pd.DataFrame({
+        "Feature": spec["features"],
+        "Importance": model.feature_importances_
+    }).sort_values(by="Importance", ascending=True)
 
 # ------------ BASIC VISUALIZATIONS FOR BOTH PAGES ------------
 
@@ -29,13 +109,9 @@ def severity_distribution():
     """
     Create a bar chart showing the distribution of accident severity levels.
     """
-    query = f"""
-        SELECT Severity
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE Severity IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    severity_counts = df["Severity"].value_counts().sort_index()
+    # Aggregated in the engine: one row per severity level
+    df = count_by(["Severity"])
+    severity_counts = df.set_index("Severity")["Count"].sort_index()
     
     # Create a DataFrame to use with Plotly Express
     plot_df = pd.DataFrame({
@@ -85,27 +161,15 @@ def feature_correlation():
     """
     Create a heatmap showing correlations between various weather metrics and accident severity.
     """
-    query = f"""
-        SELECT
-            Severity,
-            `Temperature_F_` AS Temperature,
-            `Humidity_%_` AS Humidity,
-            `Visibility_mi_` AS Visibility,
-            `Precipitation_in_` AS Precipitation,
-            `Pressure_in_` AS Pressure,
-            `Wind_Speed_mph_` AS Wind_Speed
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Severity IS NOT NULL 
-          AND `Temperature_F_` IS NOT NULL
-          AND `Humidity_%_` IS NOT NULL
-          AND `Visibility_mi_` IS NOT NULL
-          AND `Precipitation_in_` IS NOT NULL
-          AND `Pressure_in_` IS NOT NULL
-          AND `Wind_Speed_mph_` IS NOT NULL
-    """
-
-    df = client.query(query).to_dataframe()
-    corr_matrix = df.corr(method='pearson').round(2)
+    # Pearson correlations over every complete row, streamed in batches and
+    # cached per dataset version
+    columns = {"Severity": "Severity", **WEATHER_COLUMNS}
+    corr = backend.cached(
+        "feature_correlation: " + ", ".join(columns.values()),
+        lambda: pd.DataFrame(stream_covariance(backend, columns).correlation(), columns=list(columns))
+    )
+    corr.index = corr.columns
+    corr_matrix = corr.round(2)
     
     # Create heatmap with custom styling
     fig = px.imshow(
@@ -159,7 +223,7 @@ def precipitation_vs_severity():
         WHERE Precipitation_in_ IS NOT NULL AND Severity IS NOT NULL
         LIMIT 50000
     """
-    df = client.query(query).to_dataframe()
+    df = backend.query(query, compact=True)
     
     # Create scatter plot with custom styling
     fig = px.scatter(
@@ -193,14 +257,9 @@ def accidents_by_state():
     """
     Create a bar chart showing the distribution of accidents by state with different colors.
     """
-    query = f"""
-        SELECT State
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE State IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    state_counts = df["State"].value_counts().sort_values(ascending=False)
-    top_states = state_counts.head(15)
+    # Aggregated in the engine: only the top 15 states are transferred
+    df = count_by(["State"], top_n=15)
+    top_states = df.set_index("State")["Count"]
     
     # Create a DataFrame for easier plotting
     plot_df = pd.DataFrame({
@@ -263,36 +322,32 @@ def accident_heatmap():
     """
     Create a heatmap showing the geographical distribution of accidents across the US.
     """
-    query = f"""
-        SELECT Start_Lat, Start_Lng
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Start_Lat IS NOT NULL AND Start_Lng IS NOT NULL
-    """
-    try:
-        df = client.query(query).to_dataframe()
-        
-        heat_data = df[["Start_Lat", "Start_Lng"]].values.tolist()
-
+    def render():
         # Create map centered in the US
         m = folium.Map(
             location=[37.8, -96],
             zoom_start=5,
             tiles="CartoDB Voyager",
             min_zoom=4,
-            max_zoom=8
+            max_zoom=HEATMAP_MAX_ZOOM
         )
 
-        # Add heatmap layer with custom parameters
-        HeatMap(
-            heat_data, 
-            radius=2,
-            blur=2,
-            max_zoom=10
+        # Density tiles rendered server-side from every accident (visuals/tiles.py)
+        folium.TileLayer(
+            tiles=heatmap_tiles.url(),
+            attr="US Accidents density",
+            name="Accident density",
+            overlay=True,
+            control=False,
+            max_zoom=HEATMAP_MAX_ZOOM
         ).add_to(m)
         
-        map_html = m.get_root().render()
-        
-        return html.Iframe(srcDoc=map_html, width='100%', height='600px')
+        return m.get_root().render()
+
+    try:
+        # Rendered once per data version and served as a static file
+        map_url = publish_map('accident_heatmap', heatmap_tiles.pyramid.version, render)
+        return html.Iframe(src=map_url, width='100%', height='600px')
 
     except Exception as e:
         return html.Div(f"Error rendering heatmap: {str(e)}")
@@ -305,41 +360,19 @@ def weather_impact_analysis():
     Analyze the statistical relationship between weather variables and accident severity.
     For methodology page - focuses on the statistical approach.
     """
-    query = f"""
-        SELECT
-            Severity,
-            `Temperature_F_` AS Temperature,
-            `Humidity_%_` AS Humidity,
-            `Visibility_mi_` AS Visibility,
-            `Precipitation_in_` AS Precipitation,
-            `Pressure_in_` AS Pressure,
-            `Wind_Speed_mph_` AS Wind_Speed
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Severity IS NOT NULL 
-          AND `Temperature_F_` IS NOT NULL
-          AND `Humidity_%_` IS NOT NULL
-          AND `Visibility_mi_` IS NOT NULL
-          AND `Precipitation_in_` IS NOT NULL
-          AND `Pressure_in_` IS NOT NULL
-          AND `Wind_Speed_mph_` IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
-    # Create binary severity groups (Low: 1-2, High: 3-4)
-    df["Severity_Binary"] = df["Severity"].apply(lambda x: "Low" if x <= 2 else "High")
+    # Per-severity moments of the weather readings over every complete row, aggregated in the engine
+    moments = query_moments(backend, WEATHER_COLUMNS)
     
     # Run statistical tests and store results
     features = ["Temperature", "Humidity", "Visibility", "Precipitation", "Pressure", "Wind_Speed"]
     results = []
     
     for feature in features:
-        # T-Test between Low vs High severity
-        group_low = df[df["Severity_Binary"] == "Low"][feature]
-        group_high = df[df["Severity_Binary"] == "High"][feature]
-        t_stat, t_pval = ttest_ind(group_low, group_high, equal_var=False)
+        # T-Test between Low (1-2) vs High (3-4) severity
+        t_stat, t_pval = welch_ttest(moments[feature].pooled([1, 2]), moments[feature].pooled([3, 4]))
         
         # Correlation with Severity
-        corr, corr_pval = pearsonr(df[feature], df["Severity"])
+        corr, corr_pval = pearson_with_group(moments[feature])
         
         # Store results
         results.append({
@@ -400,59 +433,8 @@ def highway_feature_importance():
     """
     For methodology page - focuses on the machine learning approach and feature importance.
     """
-    query = f"""
-        SELECT
-            Severity,
-            `Temperature_F_` AS Temperature,
-            `Humidity_%_` AS Humidity,
-            `Visibility_mi_` AS Visibility,
-            `Precipitation_in_` AS Precipitation,
-            `Pressure_in_` AS Pressure,
-            `Wind_Speed_mph_` AS Wind_Speed,
-            Description
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Severity IS NOT NULL 
-          AND `Temperature_F_` IS NOT NULL
-          AND `Humidity_%_` IS NOT NULL
-          AND `Visibility_mi_` IS NOT NULL
-          AND `Precipitation_in_` IS NOT NULL
-          AND `Pressure_in_` IS NOT NULL
-          AND `Wind_Speed_mph_` IS NOT NULL
-          AND Description IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
-    # Create highway feature using regex pattern
-    highway_pattern = r'\b(?:I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
-    df['highway'] = df['Description'].str.contains(highway_pattern, flags=re.IGNORECASE, na=False).astype(int)
-    
-    # Drop Description column as it's no longer needed
-    df = df.drop(columns=['Description'])
-    
-    # Create binary severity for classification (0 = Low (1-2), 1 = High (3-4))
-    df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
-    
-    # Prepare features and target
-    features = ["Temperature", "Humidity", "Visibility", "Precipitation", "Pressure", "Wind_Speed", "highway"]
-    X = df[features]
-    y = df["Severity_Binary"]
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    # Train Random Forest model
-    rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-    rf_model.fit(X_scaled, y)
-    
-    # Extract feature importances
-    importances = rf_model.feature_importances_
-    
-    # Create DataFrame for visualization
-    feat_df = pd.DataFrame({
-        "Feature": features,
-        "Importance": importances
-    }).sort_values(by="Importance", ascending=True)
+    # Random Forest trained offline on the shared 5% weather sample (backend/registry.py)
+    feat_df = feature_importances("highway_rf")
     
     # Create horizontal bar chart
     fig = px.bar(
@@ -490,29 +472,6 @@ def road_feature_chi_square():
     """
     For methodology page - focuses on the Chi-Square testing methodology.
     """
-    query = f"""
-        SELECT
-            Severity,
-            Amenity,
-            Bump,
-            Crossing,
-            Junction,
-            No_Exit,
-            Railway,
-            Roundabout,
-            Station,
-            Stop,
-            Traffic_Calming,
-            Traffic_Signal,
-            Turning_Loop
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (3 PERCENT)
-        WHERE Severity IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
-    # Create binary severity for analysis (0 = Low (1-2), 1 = High (3-4))
-    df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
-    
     # Define categorical/boolean columns
     categorical_cols = [
         "Amenity", "Bump", "Crossing", "Junction",
@@ -520,20 +479,25 @@ def road_feature_chi_square():
         "Traffic_Calming", "Traffic_Signal", "Turning_Loop"
     ]
     
-    # Run chi-square tests
-    results = []
-    for col in categorical_cols:
-        # Replace NaNs with False
-        df[col] = df[col].fillna(False)
-        
-        contingency = pd.crosstab(df[col], df["Severity_Binary"])
-        chi2, p, dof, _ = chi2_contingency(contingency)
-        results.append({
+    # Full-table counts per severity and flag combination (missing flags count as False),
+    # from the rollup cube's road cuboid when it has been built
+    df = count_by(["Severity"] + [(col, f"IFNULL({col}, FALSE)") for col in categorical_cols])
+    
+    # Counts per binary severity (0 = Low (1-2), 1 = High (3-4)) for every flag combination
+    high = (df["Severity"] >= 3).to_numpy()
+    counts = np.column_stack([np.where(high, 0, df["Count"]), np.where(high, df["Count"], 0)])
+    
+    # Run all chi-square tests at once: one 2x2 table per feature
+    chi2, p, _ = chi_square(flag_tables(df[categorical_cols].to_numpy(dtype=bool), counts))
+    results = [
+        {
             "Feature": col,
-            "Chi2": round(chi2, 2),
-            "P_Value": round(p, 5),
-            "Significant": "Yes" if p < 0.05 else "No"
-        })
+            "Chi2": round(chi2[i], 2),
+            "P_Value": round(p[i], 5),
+            "Significant": "Yes" if p[i] < 0.05 else "No"
+        }
+        for i, col in enumerate(categorical_cols)
+    ]
     
     # Sort by Chi2 value
     results_df = pd.DataFrame(results).sort_values(by="Chi2", ascending=False)
@@ -725,21 +689,7 @@ def severity_by_weather_conditions():
     """
     For findings page - analyze severity distribution across different weather conditions.
     """
-    query = f"""
-        SELECT 
-            Weather_Condition,
-            Severity,
-            COUNT(*) as Count
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE Weather_Condition IS NOT NULL
-        AND Severity IS NOT NULL
-        GROUP BY Weather_Condition, Severity
-        HAVING COUNT(*) > 1000
-        ORDER BY COUNT(*) DESC
-        LIMIT 50
-    """
-    
-    df = client.query(query).to_dataframe()
+    df = count_by(["Weather_Condition", "Severity"], top_n=50, min_count=1000)
     
     # Get top 10 weather conditions by total count
     top_conditions = df.groupby('Weather_Condition')['Count'].sum().nlargest(10).index.tolist()
@@ -798,19 +748,7 @@ def accident_time_analysis():
     """
     For findings page - analyze accident frequency by hour of day.
     """
-    query = f"""
-        SELECT 
-            EXTRACT(HOUR FROM Start_Time) as Hour,
-            Severity,
-            COUNT(*) as Count
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE Start_Time IS NOT NULL
-        AND Severity IS NOT NULL
-        GROUP BY Hour, Severity
-        ORDER BY Hour, Severity
-    """
-    
-    df = client.query(query).to_dataframe()
+    df = count_by([("Hour", "EXTRACT(HOUR FROM Start_Time)"), "Severity"])
     
     # Create pivot table for easier plotting
     pivot_df = df.pivot_table(
@@ -921,26 +859,6 @@ def severity_by_road_feature():
     """
     For findings page - analyze which road features are associated with higher severity accidents.
     """
-    query = f"""
-        SELECT
-            Severity,
-            Amenity,
-            Bump,
-            Crossing,
-            Junction,
-            No_Exit,
-            Railway,
-            Roundabout,
-            Station,
-            Stop,
-            Traffic_Calming,
-            Traffic_Signal,
-            Turning_Loop
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Severity IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
     # Define road features to analyze
     road_features = [
         "Amenity", "Bump", "Crossing", "Junction",
@@ -948,45 +866,25 @@ def severity_by_road_feature():
         "Traffic_Calming", "Traffic_Signal", "Turning_Loop"
     ]
     
-    # Replace NaN with False
-    for feature in road_features:
-        df[feature] = df[feature].fillna(False)
+    # Full-table counts per severity and flag combination (missing flags count as False)
+    df = count_by(["Severity"] + [(feature, f"IFNULL({feature}, FALSE)") for feature in road_features])
     
-    # Calculate average severity for each feature
-    results = []
-    for feature in road_features:
-        # Filter to get records where feature is present/absent
-        present_df = df[df[feature] == True]
-        absent_df = df[df[feature] == False]
-        
-        # Calculate means only if data exists
-        if len(present_df) > 0:
-            feature_present = present_df['Severity'].mean()
-        else:
-            feature_present = 0
-            
-        if len(absent_df) > 0:
-            feature_absent = absent_df['Severity'].mean()
-        else:
-            feature_absent = 0
-            
-        # Safe rounding - only round if not null
-        avg_present = round(feature_present, 2) if not pd.isna(feature_present) else 0
-        avg_absent = round(feature_absent, 2) if not pd.isna(feature_absent) else 0
-        diff = round(feature_present - feature_absent, 2) if (not pd.isna(feature_present) and not pd.isna(feature_absent)) else 0
-        
-        # Count records
-        count_present = len(present_df)
-        count_absent = len(absent_df)
-        
-        results.append({
+    # Present/absent counts and average severity for every feature in one pass
+    count_present, count_absent, feature_present, feature_absent = flag_lift(
+        df[road_features].to_numpy(dtype=bool), df["Count"], df["Severity"]
+    )
+    
+    results = [
+        {
             'Feature': feature,
-            'Avg_Severity_Present': avg_present,
-            'Avg_Severity_Absent': avg_absent,
-            'Severity_Difference': diff,
-            'Count_Present': count_present,
-            'Count_Absent': count_absent
-        })
+            'Avg_Severity_Present': round(feature_present[i], 2),
+            'Avg_Severity_Absent': round(feature_absent[i], 2),
+            'Severity_Difference': round(feature_present[i] - feature_absent[i], 2),
+            'Count_Present': count_present[i],
+            'Count_Absent': count_absent[i]
+        }
+        for i, feature in enumerate(road_features)
+    ]
     
     results_df = pd.DataFrame(results)
     
@@ -1032,22 +930,11 @@ def highway_severity_analysis():
     """
     For findings page - analyze the relation between highways and accident severity.
     """
-    query = f"""
-        SELECT
-            Severity,
-            Description
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (10 PERCENT)
-        WHERE Severity IS NOT NULL
-        AND Description IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
-    # Create highway feature using regex pattern
-    highway_pattern = r'\b(?:I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
-    df['highway'] = df['Description'].str.contains(highway_pattern, flags=re.IGNORECASE, na=False)
-    
-    # Group by highway presence and severity to get counts
-    grouped = df.groupby(['highway', 'Severity']).size().reset_index(name='count')
+    # Full-table counts per severity and stored highway flag (backend/derived.py)
+    grouped = count_by(
+        [("highway", highway_expression(backend)), "Severity"]
+    ).rename(columns={'Count': 'count'})
+    grouped['highway'] = grouped['highway'].astype(bool)
     
     # Calculate relative percentages within each highway group
     highway_total = grouped[grouped['highway']].count()['count']
@@ -1069,8 +956,9 @@ def highway_severity_analysis():
     )
     
     # Add average severity lines for each group
-    avg_severity_highway = (df[df['highway']]['Severity'] * 1.0).mean()
-    avg_severity_non_highway = (df[~df['highway']]['Severity'] * 1.0).mean()
+    weighted = grouped['Severity'] * grouped['count']
+    avg_severity_highway = weighted[grouped['highway']].sum() / grouped[grouped['highway']]['count'].sum()
+    avg_severity_non_highway = weighted[~grouped['highway']].sum() / grouped[~grouped['highway']]['count'].sum()
     
     # Create insight section with statistics
     insights = html.Div([
@@ -1101,18 +989,7 @@ def weather_condition_counts():
     """
     For findings page - analyze frequency of different weather conditions in accidents.
     """
-    query = f"""
-        SELECT 
-            Weather_Condition,
-            COUNT(*) as Count
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}`
-        WHERE Weather_Condition IS NOT NULL
-        GROUP BY Weather_Condition
-        ORDER BY Count DESC
-        LIMIT 15
-    """
-    
-    df = client.query(query).to_dataframe()
+    df = count_by(["Weather_Condition"], top_n=15)
     
     # Create treemap
     fig = px.treemap(
@@ -1165,59 +1042,8 @@ def predictive_feature_importance():
     """
     For findings page - focuses on the feature importance results and implications.
     """
-    query = f"""
-        SELECT
-            Severity,
-            `Temperature_F_` AS Temperature,
-            `Humidity_%_` AS Humidity,
-            `Visibility_mi_` AS Visibility,
-            `Precipitation_in_` AS Precipitation,
-            `Pressure_in_` AS Pressure,
-            `Wind_Speed_mph_` AS Wind_Speed,
-            Description
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (2 PERCENT)
-        WHERE Severity IS NOT NULL 
-          AND `Temperature_F_` IS NOT NULL
-          AND `Humidity_%_` IS NOT NULL
-          AND `Visibility_mi_` IS NOT NULL
-          AND `Precipitation_in_` IS NOT NULL
-          AND `Pressure_in_` IS NOT NULL
-          AND `Wind_Speed_mph_` IS NOT NULL
-          AND Description IS NOT NULL
-    """
-    df = client.query(query).to_dataframe()
-    
-    # Create highway feature using regex pattern
-    highway_pattern = r'\b(?:I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
-    df['highway'] = df['Description'].str.contains(highway_pattern, flags=re.IGNORECASE, na=False).astype(int)
-    
-    # Drop Description column as it's no longer needed
-    df = df.drop(columns=['Description'])
-    
-    # Create binary severity for classification (0 = Low (1-2), 1 = High (3-4))
-    df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
-    
-    # Prepare features and target
-    features = ["Temperature", "Humidity", "Visibility", "Precipitation", "Pressure", "Wind_Speed", "highway"]
-    X = df[features]
-    y = df["Severity_Binary"]
-    
-    # Scale features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    
-    # Train Random Forest model
-    rf_model = RandomForestClassifier(n_estimators=100, random_state=42)
-    rf_model.fit(X_scaled, y)
-    
-    # Extract feature importances
-    importances = rf_model.feature_importances_
-    
-    # Create DataFrame for visualization
-    feat_df = pd.DataFrame({
-        "Feature": features,
-        "Importance": importances
-    }).sort_values(by="Importance", ascending=True)
+    # Random Forest trained offline on a 2% weather sample (backend/registry.py)
+    feat_df = feature_importances("predictive_rf")
     
     # Create horizontal bar chart
     fig = px.bar(
@@ -1267,19 +1093,15 @@ def predictive_feature_importance():
 
 def accidents_by_month():
     """Monthly accidents trends visualization - from original code."""
-    # Get day and month data
-    query = f"""
-        SELECT
-            EXTRACT(YEAR FROM Start_Time) AS Year,
-            EXTRACT(MONTH FROM Start_Time) AS Month,
-            EXTRACT(DAY FROM Start_Time) AS Day
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (10 PERCENT)
-        WHERE Start_Time IS NOT NULL
-    """
-    df = client.query(query).to_dataframe().dropna()
+    # Get accident counts per day and month over the full table
+    df = count_by([
+        ("Year", "EXTRACT(YEAR FROM Start_Time)"),
+        ("Month", "EXTRACT(MONTH FROM Start_Time)"),
+        ("Day", "EXTRACT(DAY FROM Start_Time)")
+    ])
 
     # Choose a representative year (most frequent)
-    base_year = int(df['Year'].mode()[0])
+    base_year = int(df.groupby('Year')['Count'].sum().idxmax())
     
     # Organize holidays by month (simplified from original)
     holiday_days_by_month = {
@@ -1294,14 +1116,14 @@ def accidents_by_month():
     }
 
     # Aggregate "All Months"
-    all_data = df.groupby('Day').size().reset_index(name='Accidents')
+    all_data = df.groupby('Day')['Count'].sum().reset_index(name='Accidents')
     all_data['Rolling'] = all_data['Accidents'].rolling(3, center=True).mean()
 
     # Aggregate per month
     monthly_data = {}
     for m in range(1, 13):
         mdf = df[df['Month'] == m]
-        mgroup = mdf.groupby('Day').size().reset_index(name='Accidents')
+        mgroup = mdf.groupby('Day')['Count'].sum().reset_index(name='Accidents')
         mgroup['Rolling'] = mgroup['Accidents'].rolling(3, center=True).mean()
         monthly_data[m] = mgroup
 
@@ -1421,96 +1243,100 @@ def accidents_by_month():
 
     return dcc.Graph(figure=fig)
 
+# Cluster hierarchy of the current data version, built on first use.
+# gunicorn serves map requests on several threads; the lock lets one build it.
+_zone_clusters = {}
+_zone_clusters_lock = threading.Lock()
+
+RISK_MAP_UNAVAILABLE = ("The risk map needs a spatial index of the current data down to level "
+                        f"{ZONE_LEVEL}. Run python -m backend.spatial from appengine/ to build it.")
+
+
+def risk_zone_clusters():
+    """
+    Risk zone clusters (backend/clusters.py) for the current data version, or
+    None until python -m backend.spatial has indexed it down to ZONE_LEVEL.
+    """
+    version = backend.dataset_version()
+    with _zone_clusters_lock:
+        if version not in _zone_clusters:
+            index = spatial_index
+            current = index is not None and index.max_level >= ZONE_LEVEL and str(index.version) == str(version)
+            _zone_clusters.clear()
+            _zone_clusters[version] = ZoneClusters(index) if current else None
+        return _zone_clusters[version]
+
+
+def map_viewport(center, zoom, width=1100, height=600):
+    """
+    Approximate (lat_min, lat_max, lng_min, lng_max) shown by a Plotly map of
+    the given pixel size, for when the browser has not reported its bounds.
+    """
+    # Plotly maps use 512px tiles: the world is 512 * 2**zoom pixels wide
+    world = 512 * 2 ** zoom
+    x, y = lnglat_to_cell(center['lat'], center['lon'], 0)
+    lat_max, lng_min = cell_to_lnglat(x - width / 2 / world, y - height / 2 / world, 0)
+    lat_min, lng_max = cell_to_lnglat(x + width / 2 / world, y + height / 2 / world, 0)
+    return float(lat_min), float(lat_max), max(float(lng_min), -180.0), min(float(lng_max), 180.0)
+
+
+def risk_map_markers(clusters, lat_min, lat_max, lng_min, lng_max, zoom):
+    """
+    Marker positions, sizes, colors and hover text for the clusters in view.
+    """
+    # A Plotly map zoom shows the same area as one level deeper on 256px web map tiles
+    clusters = clusters.query(lat_min, lat_max, lng_min, lng_max, zoom + 1)
+
+    total = clusters['total_accidents'].to_numpy()
+    severe = clusters['severe_accidents'].to_numpy()
+    risk = np.divide(severe, total, out=np.zeros(len(clusters)), where=total > 0)
+
+    # Risk bands: < 0.2 green, < 0.4 orange, < 0.6 red, otherwise dark red
+    colors = np.select([risk < 0.2, risk < 0.4, risk < 0.6], ["green", "orange", "red"], "darkred")
+    sizes = np.clip(4 + 3 * np.log10(np.maximum(total, 1)), 6, 30)
+
+    text = [
+        f"Lat/Lon: ({lat:.2f}, {lng:.2f})<br>Zones: {zones:,}<br>Total Accidents: {t:,}<br>"
+        f"Severe Accidents: {s:,}<br>Risk Score: {r:.2f}"
+        for lat, lng, zones, t, s, r in zip(clusters['Lat'], clusters['Lng'], clusters['zones'],
+                                            total.tolist(), severe.tolist(), risk.tolist())
+    ]
+    return {
+        'lat': clusters['Lat'].tolist(),
+        'lon': clusters['Lng'].tolist(),
+        'text': text,
+        'marker': {'size': sizes.tolist(), 'color': colors.tolist(), 'opacity': 0.6},
+    }
+
+
 def generate_risk_map_visualization():
     """
     Generate an interactive risk map visualization showing geographic accident risk distribution.
+    Zones are clustered on the server; the map only receives the clusters in its viewport.
     """
-    query = f"""
-        SELECT 
-            Start_Lat,
-            Start_Lng,
-            Severity
-        FROM `{PROJECT_ID}.{DATASET}.{TABLE}` TABLESAMPLE SYSTEM (5 PERCENT)
-        WHERE Start_Lat IS NOT NULL AND Start_Lng IS NOT NULL AND Severity IS NOT NULL
-    """
-    
-    df = client.query(query).to_dataframe()
-    
-    # Improved rounding logic with dynamic precision
-    def smart_round(series, min_zones=50, max_zones=200):
-        # Calculate the range of coordinates
-        coord_range = series.max() - series.min()
-        
-        # Determine appropriate rounding precision
-        if coord_range > 10:
-            # For large geographic areas, round to 1 decimal place
-            return series.round(1)
-        elif coord_range > 5:
-            # For medium areas, round to 2 decimal places
-            return series.round(2)
-        else:
-            # For smaller areas, round to 3 decimal places
-            return series.round(3)
-    
-    # Apply smart rounding
-    df['Lat_rounded'] = smart_round(df['Start_Lat'])
-    df['Lng_rounded'] = smart_round(df['Start_Lng'])
-    
-    # Group and calculate risk scores with additional filtering
-    grouped = df.groupby(['Lat_rounded', 'Lng_rounded']).agg(
-        total_accidents=('Severity', 'count'),
-        severe_accidents=('Severity', lambda x: (x >= 3).sum())
-    ).reset_index()
-    
-    # Filter out locations with very few total accidents to reduce noise
-    grouped = grouped[grouped['total_accidents'] >= 5]
-    
-    # Calculate risk score with zero-division handling
-    grouped['risk_score'] = grouped.apply(
-        lambda row: row['severe_accidents'] / row['total_accidents'] 
-        if row['total_accidents'] > 0 else 0, 
-        axis=1
-    )
-    # Create base map
-    risk_map = folium.Map(
-        location=[37.8, -96],
-        zoom_start=5,
-        tiles="CartoDB positron"
+    clusters = risk_zone_clusters()
+    if clusters is None:
+        return html.Div(RISK_MAP_UNAVAILABLE, style={'fontSize': '15px', 'color': '#4A5568'})
+
+    center, zoom = {'lat': 37.8, 'lon': -96}, 3.5
+    markers = risk_map_markers(clusters, *map_viewport(center, zoom), zoom)
+
+    fig = go.Figure(go.Scattermap(
+        lat=markers['lat'],
+        lon=markers['lon'],
+        text=markers['text'],
+        marker=markers['marker'],
+        mode='markers',
+        hoverinfo='text'
+    ))
+    fig.update_layout(
+        map=dict(style='carto-positron', center=center, zoom=zoom),
+        margin=dict(l=0, r=0, t=0, b=0),
+        height=600,
+        # Keep the user's pan and zoom when the markers are replaced
+        uirevision='risk-map'
     )
     
-    # Create marker cluster
-    cluster = MarkerCluster().add_to(risk_map)
-    
-    # Define color picker function
-    def color_picker(score):
-        if score < 0.2:
-            return "green"
-        elif score < 0.4:
-            return "orange"
-        elif score < 0.6:
-            return "red"
-        else:
-            return "darkred"
-    
-    # Add markers for each location
-    for _, row in grouped.iterrows():
-        folium.CircleMarker(
-            location=[row['Lat_rounded'], row['Lng_rounded']],
-            radius=6,
-            color=color_picker(row['risk_score']),
-            fill=True,
-            fill_opacity=0.6,
-            popup=(
-                f"Lat/Lon: ({row['Lat_rounded']:.2f}, {row['Lng_rounded']:.2f})<br>"
-                f"Total Accidents: {row['total_accidents']}<br>"
-                f"Severe Accidents: {row['severe_accidents']}<br>"
-                f"Risk Score: {row['risk_score']:.2f}"
-            )
-        ).add_to(cluster)
-    
-    # Convert map to HTML and display in iframe
-    map_html = risk_map.get_root().render()
-    
     description = html.P(
         "This risk map shows the geographic distribution of accident risk across the US. "
         "Green markers indicate low risk areas, while red and dark red markers show high-risk zones. "
@@ -1519,11 +1345,49 @@ def generate_risk_map_visualization():
     )
     
     return html.Div([
-        html.Iframe(srcDoc=map_html, width='100%', height='600px'),
+        dcc.Graph(id='risk-map', figure=fig, config={'scrollZoom': True}),
         description
     ])
 
 
+@callback(
+    Output('risk-map', 'figure'),
+    Input('risk-map', 'relayoutData'),
+    State('risk-map', 'figure'),
+    prevent_initial_call=True
+)
+def update_risk_map(relayout, figure):
+    """
+    Replace the risk map markers with the clusters for the new zoom and viewport.
+    """
+    if not relayout or ('map.zoom' not in relayout and 'map.center' not in relayout):
+        raise PreventUpdate
+
+    patch = Patch()
+    clusters = risk_zone_clusters()
+    if clusters is None:
+        # The data changed since the page loaded and its index has not been built yet
+        patch['data'][0]['lat'], patch['data'][0]['lon'], patch['data'][0]['text'] = [], [], []
+        patch['layout']['annotations'] = [dict(text=RISK_MAP_UNAVAILABLE, x=0.5, y=0.5, xref='paper', yref='paper',
+                                               showarrow=False, bgcolor='white', font=dict(size=13))]
+        return patch
+
+    # A pan only reports the new center: keep the zoom the map is already at
+    zoom = relayout.get('map.zoom', figure.get('layout', {}).get('map', {}).get('zoom', 3.5))
+    derived = relayout.get('map._derived', {}).get('coordinates')
+    if derived:
+        lngs, lats = [c[0] for c in derived], [c[1] for c in derived]
+        viewport = (min(lats), max(lats), max(min(lngs), -180.0), min(max(lngs), 180.0))
+    else:
+        viewport = map_viewport(relayout.get('map.center', {'lat': 37.8, 'lon': -96}), zoom)
+
+    markers = risk_map_markers(clusters, *viewport, zoom)
+    for key, value in markers.items():
+        patch['data'][0][key] = value
+    # Recorded in the figure for the next pan; uirevision keeps the view where the user left it
+    patch['layout']['map']['zoom'] = zoom
+    return patch
+
 
 def model_performance_visualization():
     """
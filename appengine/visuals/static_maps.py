@@ -0,0 +1,65 @@
+import os
+import glob
+import hashlib
+import tempfile
+import threading
+
+from flask import send_from_directory
+
+# ------------ FOLIUM MAPS AS STATIC FILES ------------
+# Folium maps are multi-megabyte HTML documents. Each one is rendered once per
+# data version into a content-hashed file, served by the Flask server with
+# long-lived cache headers and referenced from the layout with Iframe(src=...).
+
+MAP_DIR = os.environ.get("STATIC_MAP_DIR")
+MAP_DIR = os.path.join(tempfile.gettempdir(), 'traffic-analysis', 'maps') if MAP_DIR is None else MAP_DIR
+MAP_URL_PREFIX = '/maps/'
+
+# File names change with their content, so browsers may keep them for a year
+MAP_MAX_AGE = 365 * 24 * 3600
+
+_render_lock = threading.Lock()
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def publish_map(name, version, render):
+    """
+    Return the URL of map `name` for data `version`, calling render() to produce
+    the map HTML only if no file exists yet for that version.
+    """
+    prefix = f"{name}-{_digest(str(version))}-"
+
+    with _render_lock:
+        existing = sorted(glob.glob(os.path.join(MAP_DIR, f"{prefix}*.html")))
+        if existing:
+            return MAP_URL_PREFIX + os.path.basename(existing[-1])
+
+        map_html = render()
+        filename = f"{prefix}{_digest(map_html)}.html"
+
+        os.makedirs(MAP_DIR, exist_ok=True)
+        tmp_path = os.path.join(MAP_DIR, f".{filename}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(map_html)
+        os.replace(tmp_path, os.path.join(MAP_DIR, filename))
+
+        # Older versions of this map are no longer referenced by any layout
+        for path in glob.glob(os.path.join(MAP_DIR, f"{name}-*.html")):
+            if not os.path.basename(path).startswith(prefix):
+                os.remove(path)
+
+    return MAP_URL_PREFIX + filename
+
+
+def serve_map(filename):
+    """
+    Flask view for MAP_URL_PREFIX; send_from_directory adds ETag/Last-Modified
+    and answers conditional requests with 304.
+    """
+    response = send_from_directory(MAP_DIR, filename, max_age=MAP_MAX_AGE, conditional=True, etag=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
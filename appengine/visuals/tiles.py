@@ -0,0 +1,388 @@
+import os
+import zlib
+import struct
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+from flask import Response, request
+
+from backend.engine import TABLE_REF, ARTIFACT_DIR, is_stale
+
+# ------------ TILED ACCIDENT HEATMAP ------------
+# Instead of shipping sampled points to the browser, accident density is binned
+# on the server into web-mercator pixels from every row and served as PNG tiles
+# at /tiles/{z}/{x}/{y}.png. Zoom levels up to BASE_ZOOM are cut from a density
+# pyramid built once per data version; deeper tiles are rendered on first
+# request from the spatial index (backend/spatial.py), or from a bounding-box
+# query when no index of the same data version has been built, and cached on disk.
+#
+# The app never writes to ARTIFACT_DIR: when the prebuilt pyramid is missing or
+# from another data version, it builds one into TILE_DIR for the current version.
+#
+# Prebuild the pyramid and the low-zoom tiles from the appengine/ directory with:
+#   python -m visuals.tiles
+
+TILE_SIZE = 256
+BASE_ZOOM = int(os.environ.get("HEATMAP_BASE_ZOOM", 6))
+MAX_ZOOM = int(os.environ.get("HEATMAP_MAX_ZOOM", 13))
+BLUR_RADIUS = 2
+TILE_URL = '/tiles/{z}/{x}/{y}.png'
+
+PYRAMID_PATH = os.path.join(ARTIFACT_DIR, 'heatmap_density.npz')
+TILE_DIR = os.environ.get("HEATMAP_TILE_DIR")
+TILE_DIR = os.path.join(tempfile.gettempdir(), 'traffic-analysis', 'tiles') if TILE_DIR is None else TILE_DIR
+TILE_MAX_AGE = 7 * 24 * 3600
+
+# Heat gradient (position, RGB), similar to the leaflet.heat default used before
+GRADIENT = [
+    (0.0, (0, 0, 255)),
+    (0.4, (0, 0, 255)),
+    (0.6, (0, 255, 255)),
+    (0.7, (0, 255, 0)),
+    (0.8, (255, 255, 0)),
+    (1.0, (255, 0, 0)),
+]
+
+
+# ---- projection and image helpers ----
+
+def lnglat_to_pixel(lat, lng, zoom):
+    """
+    Global web-mercator pixel coordinates of lat/lng arrays at `zoom`.
+    """
+    scale = TILE_SIZE * (1 << zoom)
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -85.05112878, 85.05112878)
+    x = (np.asarray(lng, dtype=np.float64) + 180.0) / 360.0 * scale
+    sin_lat = np.sin(np.radians(lat))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return x, y
+
+
+def pixel_to_lnglat(x, y, zoom):
+    scale = TILE_SIZE * (1 << zoom)
+    lng = np.asarray(x, dtype=np.float64) / scale * 360.0 - 180.0
+    n = np.pi - 2 * np.pi * np.asarray(y, dtype=np.float64) / scale
+    lat = np.degrees(np.arctan(np.sinh(n)))
+    return lat, lng
+
+
+def box_blur(grid, radius=BLUR_RADIUS):
+    """
+    Separable box blur using cumulative sums (edges treated as empty).
+    """
+    if radius <= 0:
+        return grid.astype(np.float32)
+    k = 2 * radius + 1
+    out = grid.astype(np.float64)
+    for axis in (0, 1):
+        padded = np.pad(out, [(radius + 1, radius) if a == axis else (0, 0) for a in (0, 1)])
+        csum = np.cumsum(padded, axis=axis)
+        if axis == 0:
+            out = (csum[k:] - csum[:-k]) / k
+        else:
+            out = (csum[:, k:] - csum[:, :-k]) / k
+    return out.astype(np.float32)
+
+
+def colorize(density, reference):
+    """
+    Map a density grid to RGBA using a log scale relative to `reference`.
+    """
+    t = np.log1p(density) / np.log1p(max(reference, 1e-6))
+    t = np.clip(t, 0.0, 1.0)
+
+    stops = [p for p, _ in GRADIENT]
+    rgba = np.zeros(density.shape + (4,), dtype=np.uint8)
+    for channel in range(3):
+        rgba[..., channel] = np.interp(t, stops, [c[channel] for _, c in GRADIENT]).astype(np.uint8)
+    alpha = np.clip(t * 1.6, 0.0, 0.85) * 255
+    rgba[..., 3] = np.where(density > 0, alpha, 0).astype(np.uint8)
+    return rgba
+
+
+def encode_png(rgba):
+    """
+    Minimal RGBA PNG encoder (no imaging library needed).
+    """
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)  # filter byte 0 per scanline
+
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)) + chunk(b'IEND', b''))
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+# ---- density pyramid ----
+
+def build_pyramid(backend, path=PYRAMID_PATH):
+    """
+    Bin every accident into BASE_ZOOM pixels, streaming the coordinates in
+    record batches, and save the sparse pixel counts.
+    """
+    query = f"""
+        SELECT Start_Lat, Start_Lng
+        FROM {TABLE_REF}
+        WHERE Start_Lat IS NOT NULL AND Start_Lng IS NOT NULL
+    """
+    width = TILE_SIZE * (1 << BASE_ZOOM)
+    keys, counts = [], []
+    for batch in backend.query_batches(query):
+        lat = batch.column(0).to_numpy(zero_copy_only=False)
+        lng = batch.column(1).to_numpy(zero_copy_only=False)
+        x, y = lnglat_to_pixel(lat, lng, BASE_ZOOM)
+        key = y.astype(np.int64) * width + x.astype(np.int64)
+        unique, count = np.unique(key, return_counts=True)
+        keys.append(unique)
+        counts.append(count)
+
+    # Merge the per-batch counts
+    keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    merged = np.bincount(inverse, weights=counts).astype(np.int64)
+
+    version = str(backend.dataset_version())
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Written aside and moved into place, so other workers never load a partial file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+    np.savez_compressed(tmp_path, keys=unique, counts=merged, base_zoom=BASE_ZOOM, version=version)
+    os.replace(tmp_path, path)
+    return DensityPyramid(unique, merged, BASE_ZOOM, version)
+
+
+def version_digest(version):
+    return hashlib.sha256(str(version).encode('utf-8')).hexdigest()[:12]
+
+
+class DensityPyramid:
+    """
+    Sparse per-pixel accident counts at base_zoom, with dense blurred grids
+    derived for every zoom level up to it.
+    """
+
+    def __init__(self, keys, counts, base_zoom, version):
+        self.base_zoom = int(base_zoom)
+        self.version = str(version)
+        width = TILE_SIZE * (1 << self.base_zoom)
+        self.px = (keys % width).astype(np.int64)
+        self.py = (keys // width).astype(np.int64)
+        self.counts = counts.astype(np.float64)
+        self._levels = {}
+        self._references = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=PYRAMID_PATH):
+        data = np.load(path)
+        return cls(data['keys'], data['counts'], data['base_zoom'], data['version'])
+
+    @property
+    def digest(self):
+        return version_digest(self.version)
+
+    def level(self, zoom):
+        """
+        Dense blurred density grid for `zoom` <= base_zoom, covering whole tiles
+        around the data: (grid, first tile x, first tile y).
+        """
+        with self._lock:
+            if zoom not in self._levels:
+                shift = self.base_zoom - zoom
+                px, py = self.px >> shift, self.py >> shift
+                tx0, ty0 = px.min() // TILE_SIZE, py.min() // TILE_SIZE
+                tx1, ty1 = px.max() // TILE_SIZE + 1, py.max() // TILE_SIZE + 1
+                shape = ((ty1 - ty0) * TILE_SIZE, (tx1 - tx0) * TILE_SIZE)
+                flat = (py - ty0 * TILE_SIZE) * shape[1] + (px - tx0 * TILE_SIZE)
+                grid = np.bincount(flat, weights=self.counts, minlength=shape[0] * shape[1]).reshape(shape)
+                self._levels[zoom] = (box_blur(grid), tx0, ty0)
+            return self._levels[zoom]
+
+    def reference(self, zoom):
+        """
+        Density mapped to the top of the color scale at `zoom`. Below base_zoom it
+        is a high percentile of the blurred grid; deeper zooms spread the same
+        counts over 4x more pixels per level.
+        """
+        level = min(zoom, self.base_zoom)
+        if level not in self._references:
+            grid, _, _ = self.level(level)
+            nonzero = grid[grid > 0]
+            self._references[level] = float(np.percentile(nonzero, 99.5)) if len(nonzero) else 1.0
+        reference = self._references[level]
+        if zoom > self.base_zoom:
+            reference /= 4 ** (zoom - self.base_zoom)
+        return reference
+
+    def tile_density(self, z, x, y):
+        grid, tx0, ty0 = self.level(z)
+        row, col = (y - ty0) * TILE_SIZE, (x - tx0) * TILE_SIZE
+        if row < 0 or col < 0 or row >= grid.shape[0] or col >= grid.shape[1]:
+            return None
+        return grid[row:row + TILE_SIZE, col:col + TILE_SIZE]
+
+
+class HeatmapTiles:
+    """
+    Serves heatmap tiles for one backend, caching rendered PNGs on disk.
+    """
+
+    def __init__(self, backend, index=None, pyramid_path=PYRAMID_PATH, tile_dir=TILE_DIR):
+        self.backend = backend
+        self.index = index
+        self.pyramid_path = pyramid_path
+        self.tile_dir = tile_dir
+        self._pyramid = None
+        self._lock = threading.Lock()
+
+    @property
+    def pyramid(self):
+        """
+        Density pyramid of the table's current version: the prebuilt artifact when
+        it matches, otherwise one built on first use under tile_dir.
+        """
+        version = str(self.backend.dataset_version())
+        with self._lock:
+            if self._pyramid is None or self._pyramid.version != version:
+                self._pyramid = self._load_pyramid(version)
+            return self._pyramid
+
+    def _load_pyramid(self, version):
+        if os.path.exists(self.pyramid_path):
+            pyramid = DensityPyramid.load(self.pyramid_path)
+            if not is_stale(self.pyramid_path, pyramid.version, version, "visuals.tiles"):
+                return pyramid
+        path = os.path.join(self.tile_dir, f"pyramid-{version_digest(version)}.npz")
+        if os.path.exists(path):
+            return DensityPyramid.load(path)
+        return build_pyramid(self.backend, path)
+
+    def url(self):
+        # The version parameter lets browsers cache tiles until the data changes
+        return f"{TILE_URL}?v={self.pyramid.digest}"
+
+    def _tile_path(self, z, x, y):
+        return os.path.join(self.tile_dir, self.pyramid.digest, str(z), str(x), f"{y}.png")
+
+    def render_points(self, z, x, y):
+        """
+        Render a tile deeper than the pyramid by binning the rows inside it
+        (plus a blur margin) at full pixel resolution.
+        """
+        margin = BLUR_RADIUS
+        x0, y0 = x * TILE_SIZE - margin, y * TILE_SIZE - margin
+        size = TILE_SIZE + 2 * margin
+        lat_max, lng_min = pixel_to_lnglat(x0, y0, z)
+        lat_min, lng_max = pixel_to_lnglat(x0 + size, y0 + size, z)
+
+        query = f"""
+            SELECT Start_Lat, Start_Lng
+            FROM {TABLE_REF}
+            WHERE Start_Lat BETWEEN {float(lat_min)} AND {float(lat_max)}
+              AND Start_Lng BETWEEN {float(lng_min)} AND {float(lng_max)}
+        """
+        grid = np.zeros(size * size, dtype=np.float64)
+        for batch in self.backend.query_batches(query):
+            px, py = lnglat_to_pixel(batch.column(0).to_numpy(zero_copy_only=False),
+                                     batch.column(1).to_numpy(zero_copy_only=False), z)
+            col = np.clip((px - x0).astype(np.int64), 0, size - 1)
+            row = np.clip((py - y0).astype(np.int64), 0, size - 1)
+            grid += np.bincount(row * size + col, minlength=size * size)
+        return box_blur(grid.reshape(size, size))[margin:margin + TILE_SIZE, margin:margin + TILE_SIZE]
+
+    def render_cells(self, z, x, y):
+        """
+        Render a tile deeper than the pyramid from spatial index cells, spreading
+        each cell's count evenly over the pixels it covers.
+        """
+        margin = BLUR_RADIUS
+        x0, y0 = x * TILE_SIZE - margin, y * TILE_SIZE - margin
+        size = TILE_SIZE + 2 * margin
+
+        # Pixels at zoom z are cells at level z + 8; coarser index cells cover `scale` pixels a side
+        level = min(z + 8, self.index.max_level)
+        scale = 1 << (z + 8 - level)
+        cx0, cy0 = x0 // scale, y0 // scale
+        n = (x0 + size - 1) // scale - cx0 + 1
+        cx, cy, counts = self.index.cells(level, cx0, cx0 + n - 1, cy0, cy0 + n - 1)
+
+        cells = np.bincount((cy - cy0) * n + (cx - cx0), weights=counts.sum(axis=1), minlength=n * n)
+        grid = np.repeat(np.repeat(cells.reshape(n, n), scale, axis=0), scale, axis=1) / (scale * scale)
+        ox, oy = x0 - cx0 * scale, y0 - cy0 * scale
+        grid = grid[oy:oy + size, ox:ox + size]
+        return box_blur(grid)[margin:margin + TILE_SIZE, margin:margin + TILE_SIZE]
+
+    def render(self, z, x, y):
+        if z <= self.pyramid.base_zoom:
+            density = self.pyramid.tile_density(z, x, y)
+        elif self.index is not None and str(self.index.version) == self.pyramid.version:
+            density = self.render_cells(z, x, y)
+        else:
+            density = self.render_points(z, x, y)
+        if density is None or not density.any():
+            return EMPTY_TILE
+        return encode_png(colorize(density, self.pyramid.reference(z)))
+
+    def tile(self, z, x, y):
+        """
+        PNG bytes for tile z/x/y, from the disk cache when available.
+        """
+        if z < 0 or z > MAX_ZOOM or not (0 <= x < (1 << z)) or not (0 <= y < (1 << z)):
+            return None
+        path = self._tile_path(z, x, y)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read()
+
+        png = self.render(z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        return png
+
+    def prerender(self):
+        """
+        Render every non-empty tile up to the pyramid's base zoom.
+        """
+        rendered = 0
+        for z in range(self.pyramid.base_zoom + 1):
+            grid, tx0, ty0 = self.pyramid.level(z)
+            for ty in range(grid.shape[0] // TILE_SIZE):
+                for tx in range(grid.shape[1] // TILE_SIZE):
+                    self.tile(z, tx0 + tx, ty0 + ty)
+                    rendered += 1
+        return rendered
+
+    def serve(self, z, x, y):
+        """
+        Flask view for /tiles/<z>/<x>/<y>.png.
+        """
+        png = self.tile(z, x, y)
+        if png is None:
+            return Response(status=404)
+
+        response = Response(png, mimetype='image/png')
+        response.set_etag(f"{self.pyramid.digest}-{z}-{x}-{y}")
+        response.cache_control.public = True
+        response.cache_control.max_age = TILE_MAX_AGE
+        return response.make_conditional(request)
+
+
+if __name__ == '__main__':
+    from backend.engine import get_backend
+
+    tiles = HeatmapTiles(get_backend())
+    tiles._pyramid = build_pyramid(tiles.backend, tiles.pyramid_path)
+    print(f"Density pyramid written to {tiles.pyramid_path}")
+    print(f"Prerendered {tiles.prerender()} tiles up to zoom {tiles.pyramid.base_zoom} in {tiles.tile_dir}")
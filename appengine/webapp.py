@@ -3,21 +3,25 @@ from pages import home, objectives, methods, findings
 from dash import Dash, callback, Input, Output
 from components.navbar import navbar
 from styles.styles import footer_style
+from visuals.static_maps import serve_map, MAP_URL_PREFIX
+from visuals.analysis import heatmap_tiles
 
 # Set up app and data
 app = Dash(__name__, suppress_callback_exceptions=True)
 server = app.server
 
+# Pre-rendered folium maps, referenced by the map iframes
+server.add_url_rule(f"{MAP_URL_PREFIX}<path:filename>", "serve_map", serve_map)
+
+# Accident density tiles drawn by the heatmap's TileLayer
+server.add_url_rule("/tiles/<int:z>/<int:x>/<int:y>.png", "serve_tile", heatmap_tiles.serve)
+
 # ====================== APP LAYOUT ===========================
 app.layout = html.Div([
     dcc.Location(id='url', refresh=False),
     navbar,
-    dcc.Loading(
-        id="loading",
-        type="circle",
-        fullscreen=True,
-        children=html.Div(id='page-content')
-    ),
+    # Pages render immediately; each figure section shows its own loader (components/lazy.py)
+    html.Div(id='page-content'),
     html.Div("© 2025 Traffic Accident Research Dashboard | Shervan Shahparnia & Nathan Cohn", style=footer_style)
 ])
 
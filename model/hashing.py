@@ -0,0 +1,200 @@
+import os
+import shutil
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ------------ OUT-OF-CORE TEXT FEATURES ------------
+# Description is featurized chunk by chunk with a stateless HashingVectorizer
+# (same tokenization as TfidfVectorizer), in worker processes that write one
+# sparse shard of raw term counts per chunk to disk. Each shard also stores
+# its document frequencies and term totals, so corpus statistics are sums
+# over shards and nothing is fitted on the full column.
+#
+# Shards are keyed by a hash of their text, so a re-run reuses every chunk it
+# has seen before: appending a new month of data only featurizes the chunks
+# that contain it. TF-IDF (smooth idf, l2 rows) and the top-`max_features`
+# columns are then derived from the summed statistics.
+
+SHARD_DIR = os.environ.get("TEXT_SHARD_DIR")
+SHARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts', 'text_shards') if SHARD_DIR is None else SHARD_DIR
+
+HASH_FEATURES = int(os.environ.get("TEXT_HASH_FEATURES", 2 ** 20))
+TEXT_WORKERS = int(os.environ.get("TEXT_WORKERS", os.cpu_count() or 1))
+CHUNK_ROWS = int(os.environ.get("TEXT_CHUNK_ROWS", 250_000))
+
+
+def vectorizer(n_features=HASH_FEATURES):
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    # Raw counts; idf weighting and normalization happen after the counts are summed
+    return HashingVectorizer(n_features=n_features, stop_words='english', alternate_sign=False, norm=None,
+                             dtype=np.float32)
+
+
+def shard_key(texts, n_features=HASH_FEATURES):
+    digest = hashlib.sha256(f"hashing-v1:{n_features}".encode("utf-8"))
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def featurize_shard(root, key, texts, n_features=HASH_FEATURES):
+    """
+    Count the terms of `texts` and write them as shard `key` under `root`.
+    Runs in a worker process.
+    """
+    counts = vectorizer(n_features).transform(texts).tocsr()
+    counts.sum_duplicates()
+    df_columns, df_counts = np.unique(counts.indices, return_counts=True)
+    term_counts = np.bincount(counts.indices, weights=counts.data, minlength=n_features)[df_columns]
+
+    parts = {
+        "data": counts.data, "indices": counts.indices, "indptr": counts.indptr,
+        "shape": np.asarray(counts.shape), "df_columns": df_columns,
+        "df_counts": df_counts.astype(np.int64), "term_counts": term_counts,
+    }
+    path = os.path.join(root, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    for name, values in parts.items():
+        np.save(os.path.join(tmp_path, f"{name}.npy"), values)
+    if os.path.exists(path):
+        shutil.rmtree(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return key
+
+
+class ShardStore:
+    """
+    Hashed term-count shards under `root`, and TF-IDF built from them.
+    """
+
+    def __init__(self, root=SHARD_DIR, n_features=HASH_FEATURES):
+        self.root = os.path.join(root, str(n_features))
+        self.n_features = n_features
+
+    def has(self, key):
+        return os.path.isdir(os.path.join(self.root, key))
+
+    def part(self, key, name):
+        return np.load(os.path.join(self.root, key, f"{name}.npy"), mmap_mode="r")
+
+    def counts(self, key):
+        import scipy.sparse as sp
+
+        shape = tuple(int(n) for n in self.part(key, "shape"))
+        return sp.csr_matrix((self.part(key, "data"), self.part(key, "indices"), self.part(key, "indptr")),
+                             shape=shape, copy=False)
+
+    def add(self, chunks, workers=TEXT_WORKERS):
+        """
+        Featurize an iterable of text chunks (lists of strings) into shards,
+        skipping chunks already stored. Returns the shard keys in chunk order.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        keys = []
+        # Forked workers: model.py is a script without a __main__ guard, which spawn would re-run
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context) as pool:
+            # Bounded in flight: at most two chunks per worker are held in memory
+            pending = deque()
+            for texts in chunks:
+                key = shard_key(texts, self.n_features)
+                keys.append(key)
+                if self.has(key):
+                    continue
+                pending.append(pool.submit(featurize_shard, self.root, key, texts, self.n_features))
+                while len(pending) >= 2 * max(1, workers):
+                    pending.popleft().result()
+            for future in pending:
+                future.result()
+        return keys
+
+    def statistics(self, keys):
+        """
+        (documents, document frequency, term total) per hashed column over `keys`.
+        """
+        n_docs = 0
+        df = np.zeros(self.n_features, dtype=np.int64)
+        terms = np.zeros(self.n_features, dtype=np.float64)
+        for key in keys:
+            n_docs += int(self.part(key, "shape")[0])
+            columns = self.part(key, "df_columns")
+            df[columns] += self.part(key, "df_counts")
+            terms[columns] += self.part(key, "term_counts")
+        return n_docs, df, terms
+
+    def tfidf(self, keys, max_features=None):
+        """
+        TF-IDF rows of the shards in `keys`, stacked in order, restricted to the
+        `max_features` most frequent hashed columns. Returns (CSR float32
+        matrix, selected columns, idf of those columns).
+        """
+        import scipy.sparse as sp
+        from sklearn.preprocessing import normalize
+
+        n_docs, df, terms = self.statistics(keys)
+        observed = np.flatnonzero(df)
+        if max_features is not None and len(observed) > max_features:
+            # Most frequent terms first, ties by column, as TfidfVectorizer's max_features
+            order = np.lexsort((observed, -terms[observed]))
+            observed = np.sort(observed[order[:max_features]])
+        idf = (np.log((1 + n_docs) / (1 + df[observed])) + 1).astype(np.float32)
+
+        blocks = []
+        for key in keys:
+            block = self.counts(key)[:, observed].multiply(idf).tocsr()
+            blocks.append(normalize(block, norm="l2", copy=False))
+        matrix = sp.vstack(blocks, format="csr", dtype=np.float32) if blocks \
+            else sp.csr_matrix((0, len(observed)), dtype=np.float32)
+        return matrix, observed, idf
+
+    def prune(self, keep):
+        """
+        Remove shards not in `keep`, e.g. after the source data was rewritten.
+        """
+        keep = set(keep)
+        for key in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            if key not in keep:
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+
+def iter_text_chunks(parquet_path, column="Description", chunk_rows=CHUNK_ROWS):
+    """
+    Lists of about `chunk_rows` strings read from one column of a Parquet file,
+    without loading the column whole.
+
+    Chunks end after rows whose text hashes onto a boundary (between half and
+    twice `chunk_rows` rows), not at fixed row counts, so rows inserted into
+    the middle of the data (a new month within each State partition) only
+    change the chunks they land in, and every other shard is reused.
+    """
+    import pyarrow.parquet as pq
+
+    min_rows, max_rows = max(1, chunk_rows // 2), max(1, 2 * chunk_rows)
+    pending, marks = [], np.zeros(0, dtype=bool)
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=chunk_rows, columns=[column]):
+        texts = ["" if text is None else str(text) for text in batch.column(0).to_pylist()]
+        hashes = pd.util.hash_array(np.asarray(texts, dtype=object))
+        pending.extend(texts)
+        marks = np.concatenate([marks, hashes % min_rows == 0])
+
+        while True:
+            boundaries = np.flatnonzero(marks[min_rows - 1:max_rows])
+            if len(boundaries):
+                cut = min_rows + int(boundaries[0])
+            elif len(pending) >= max_rows:
+                cut = max_rows
+            else:
+                break
+            yield pending[:cut]
+            pending, marks = pending[cut:], marks[cut:]
+    if pending:
+        yield pending
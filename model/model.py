@@ -1,83 +1,38 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
-import torch
 import torch.nn as nn
-import torch.optim as optim
-from torch.utils.data import DataLoader, TensorDataset
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.utils import resample
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-# ==================== STEP 1: Load Dataset ====================
-df = pd.read_csv("../data/us_accidents.csv")
-
-# ==================== STEP 2: Basic Cleanup ====================
-drop_cols = ['ID', 'Start_Time', 'End_Time', 'Weather_Timestamp', 'City', 'County',
-             'Street', 'Zipcode', 'Airport_Code', 'Country', 'State']
-df = df.drop(columns=[col for col in drop_cols if col in df.columns], errors='ignore')
-df = df.dropna(subset=['Severity', 'Description'])
-df = df.dropna()
-df = df[df['Severity'].isin([1, 2, 3, 4])]
-
-# ==================== STEP 3: TF-IDF Vectorization for Description ====================
-tfidf = TfidfVectorizer(max_features=500, stop_words='english')
-desc_tfidf = tfidf.fit_transform(df['Description'].astype(str)).toarray()
-
-# Drop raw Description (it's now vectorized)
-df = df.drop(columns=['Description'])
-
-# ==================== STEP 4: Encode Categorical and Scale Numeric Features ====================
-categorical_cols = df.select_dtypes(include='object').columns
-df = pd.get_dummies(df, columns=categorical_cols)
-df['Severity'] = df['Severity'].astype(int)
-
-y_full = df['Severity'] - 1
-X_full = df.drop(columns=['Severity'])
-
-scaler = StandardScaler()
-X_scaled_structured = scaler.fit_transform(X_full)
-
-# ==================== STEP 5: Combine Structured + TF-IDF Features ====================
-X_combined = np.hstack([X_scaled_structured, desc_tfidf])
-
-# ==================== STEP 6: Split and Balance ====================
-X_train_all, X_test, y_train_all, y_test = train_test_split(
-    X_combined, y_full, test_size=0.2, stratify=y_full, random_state=42
-)
-
-train_df = pd.DataFrame(X_train_all)
-train_df['Severity'] = y_train_all.values + 1
-
-min_class_size = train_df['Severity'].value_counts().min()
-train_balanced = pd.concat([
-    resample(g, replace=False, n_samples=min_class_size, random_state=42)
-    for _, g in train_df.groupby('Severity')
-])
+# The blocks below share loaders and statistics with the dashboard (appengine/backend/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "appengine"))
 
-y_train = train_balanced['Severity'].astype(int) - 1
-X_train = train_balanced.drop(columns=['Severity']).values
+# Steps 1-10 run as cached stages (pipeline.py): re-runs skip every stage whose
+# inputs, parameters and code are unchanged, so editing the network below only
+# retrains and re-evaluates it. Stage results live in model/artifacts/.
+from pipeline import severity_pipeline
 
-# ==================== STEP 7: PyTorch Setup ====================
-X_train_tensor = torch.tensor(X_train, dtype=torch.float32)
-y_train_tensor = torch.tensor(y_train.values, dtype=torch.long)
-X_test_tensor = torch.tensor(X_test, dtype=torch.float32)
-y_test_tensor = torch.tensor(y_test.values, dtype=torch.long)
-
-train_dataset = TensorDataset(X_train_tensor, y_train_tensor)
-train_loader = DataLoader(train_dataset, batch_size=256, shuffle=True)
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# Every block reads this CSV, or the Parquet dataset converted from it by
+# `python -m backend.ingest ../data/us_accidents.csv` once that exists
+DATA_CSV = "../data/us_accidents.csv"
 
 # ==================== STEP 8: Model ====================
 class AccidentSeverityNN(nn.Module):
-    def __init__(self, input_dim):
+    def __init__(self, structured_dim, text_dim):
         super().__init__()
+        # The first layer is split: a dense Linear over the structured features plus a
+        # sum-mode EmbeddingBag over the sparse TF-IDF entries (a sparse-dense matmul),
+        # together equal to one Linear over the concatenated features
+        bound = 1 / np.sqrt(structured_dim + text_dim)
+        self.structured = nn.Linear(structured_dim, 512)
+        self.text = nn.EmbeddingBag(text_dim, 512, mode='sum')
+        for weight in (self.structured.weight, self.structured.bias, self.text.weight):
+            nn.init.uniform_(weight, -bound, bound)
+
         self.net = nn.Sequential(
-            nn.Linear(input_dim, 512),
             nn.BatchNorm1d(512),
             nn.LeakyReLU(),
             nn.Dropout(0.3),
@@ -90,67 +45,20 @@ class AccidentSeverityNN(nn.Module):
             nn.Linear(128, 4)
         )
 
-    def forward(self, x):
-        return self.net(x)
-
-model = AccidentSeverityNN(X_train_tensor.shape[1]).to(device)
-
-# ==================== STEP 9: Training ====================
-class_counts = np.bincount(y_train)
-class_weights = torch.tensor(1. / class_counts, dtype=torch.float32).to(device)
-criterion = nn.CrossEntropyLoss(weight=class_weights)
-optimizer = optim.AdamW(model.parameters(), lr=0.001)
-scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=10, gamma=0.7)
-
-epochs = 50
-best_accuracy = 0
-patience = 7
-early_stop_counter = 0
-
-for epoch in range(epochs):
-    model.train()
-    running_loss = 0.0
-    for X_batch, y_batch in train_loader:
-        X_batch, y_batch = X_batch.to(device), y_batch.to(device)
-        optimizer.zero_grad()
-        outputs = model(X_batch)
-        loss = criterion(outputs, y_batch)
-        loss.backward()
-        optimizer.step()
-        running_loss += loss.item()
-    scheduler.step()
-
-    # Validation
-    model.eval()
-    with torch.no_grad():
-        val_outputs = model(X_test_tensor.to(device))
-        y_val_pred = torch.argmax(val_outputs, dim=1).cpu().numpy()
-        acc = accuracy_score(y_test, y_val_pred)
-
-    print(f"Epoch {epoch+1}: Loss={running_loss:.4f}, Val Accuracy={acc:.4f}")
-
-    if acc > best_accuracy:
-        best_accuracy = acc
-        best_model_state = model.state_dict()
-        early_stop_counter = 0
-    else:
-        early_stop_counter += 1
-        if early_stop_counter >= patience:
-            print("Early stopping.")
-            break
-
-# ==================== STEP 10: Evaluation ====================
-model.load_state_dict(best_model_state)
-model.eval()
-with torch.no_grad():
-    y_pred = model(X_test_tensor.to(device))
-    y_pred_labels = torch.argmax(y_pred, dim=1).cpu().numpy()
-    y_true = y_test_tensor.cpu().numpy()
+    def forward(self, x, text_indices, text_offsets, text_weights):
+        hidden = self.structured(x) + self.text(text_indices, text_offsets, per_sample_weights=text_weights)
+        return self.net(hidden)
+
+# ==================== STEPS 1-7, 9, 10: Load, Clean, TF-IDF, Encode, Split, Balance, Train, Evaluate ====================
+stages = severity_pipeline(DATA_CSV, AccidentSeverityNN)
+y_true = stages["evaluate"]["y_true"]
+y_pred_labels = stages["evaluate"]["y_pred"]
 
 print("\nClassification Report:\n")
 print(classification_report(y_true, y_pred_labels, labels=[0, 1, 2, 3]))
 print(f"Accuracy: {accuracy_score(y_true, y_pred_labels):.2f}")
 
+
 # ==================== STEP 11: Confusion Matrix ====================
 cm = confusion_matrix(y_true, y_pred_labels)
 labels = [1, 2, 3, 4]
@@ -167,13 +75,34 @@ plt.show()
 
 # Shervan Added Code
 
-import re
+# Highway flag shared with the dashboard (appengine/backend/derived.py); the converted
+# dataset stores it, so Description is only matched when reading the raw CSV
+from backend.derived import highway_flags
+
+# Typed, column-projected loads from the converted Parquet dataset (appengine/backend/ingest.py),
+# or from the CSV itself until `python -m backend.ingest ../data/us_accidents.csv` has run
+from backend.ingest import read_accidents, iter_accidents, available_columns
+
+
+def read_with_highway(columns, path=DATA_CSV):
+    """
+    read_accidents() including the 'highway' flag: the stored column when the
+    source has one, otherwise matched from Description (read for that only).
+    """
+    if "highway" in available_columns(path):
+        return read_accidents(columns, path=path)
+    read = [c for c in columns if c != "highway"]
+    df = read_accidents(read + ([] if "Description" in read else ["Description"]), path=path)
+    df["highway"] = highway_flags(df["Description"])
+    return df[columns]
+
 
-# Define expanded regex pattern to capture I-5, I 5, US-101, US 101, Hwy, etc.
-highway_pattern = r'\b(I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
+available = available_columns(DATA_CSV)
 
-# Create a new 'highway' column in df_original
-df_original['highway'] = df_original['Description'].str.contains(highway_pattern, flags=re.IGNORECASE, na=False)
+# Description is only loaded when the highway regex still needs the text (an unconverted CSV)
+needs_description = "highway" not in available
+columns = [c for c in available if c != "highway" and (c != "Description" or needs_description)]
+df_original = read_with_highway(columns + ["highway"])
 
 # Create a filtered DataFrame containing only highway-related accidents
 df_highway_only = df_original[df_original['highway'] == True]
@@ -183,15 +112,7 @@ df_highway_only.to_csv("Filtered_Highway_Accidents.csv", index=False)
 
 # Preview the result
 print(f"✅ Rows with highway mentions: {df_highway_only.shape[0]}")
-print(df_highway_only[['ID', 'Description', 'highway']].head())
-
-import re
-
-# Use non-capturing groups to avoid warning
-highway_pattern = r'\b(?:I[-\s]?\d+|US[-\s]?\d+|Hwy|HWY|highway)\b'
-
-# Add 'highway' column with True/False values based on Description content
-df_original['highway'] = df_original['Description'].str.contains(highway_pattern, flags=re.IGNORECASE, na=False)
+print(df_highway_only[[c for c in ['ID', 'Description', 'highway'] if c in df_highway_only]].head())
 
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
@@ -200,15 +121,15 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, ConfusionMatrixDisplay
 import matplotlib.pyplot as plt
 
-# === Step 1: Load your dataset ===
-df = pd.read_csv("US_Accidents_With_Highway_Flag.csv")
-
-# === Step 2: Define features and target ===
+# === Step 1: Define features and target ===
 features = [
     "Temperature(F)", "Humidity(%)", "Wind_Speed(mph)",
     "Pressure(in)", "Precipitation(in)", "Visibility(mi)", "highway"
 ]
 
+# === Step 2: Load only those columns, typed (appengine/backend/ingest.py) ===
+df = read_with_highway(["Severity"] + features)
+
 # Drop rows with missing values in selected columns
 df = df[["Severity"] + features].dropna()
 df["highway"] = df["highway"].astype(int)
@@ -255,15 +176,15 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, ConfusionMatrixDisplay
 import matplotlib.pyplot as plt
 
-# === Load dataset ===
-df = pd.read_csv("US_Accidents_With_Highway_Flag.csv")
-
 # === Define features and target ===
 features = [
     "Temperature(F)", "Humidity(%)", "Wind_Speed(mph)",
     "Pressure(in)", "Precipitation(in)", "Visibility(mi)", "highway"
 ]
 
+# === Load only those columns, typed (appengine/backend/ingest.py) ===
+df = read_with_highway(["Severity"] + features)
+
 df = df[["Severity"] + features].dropna()
 df["highway"] = df["highway"].astype(int)
 df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
@@ -352,15 +273,15 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, ConfusionMatrixDisplay
 import matplotlib.pyplot as plt
 
-# === Load dataset ===
-df = pd.read_csv("US_Accidents_With_Highway_Flag.csv")
-
 # === Define features and target ===
 features = [
     "Temperature(F)", "Humidity(%)", "Wind_Speed(mph)",
     "Pressure(in)", "Precipitation(in)", "Visibility(mi)", "highway"
 ]
 
+# === Load only those columns, typed (appengine/backend/ingest.py) ===
+df = read_with_highway(["Severity"] + features)
+
 df = df[["Severity"] + features].dropna()
 df["highway"] = df["highway"].astype(int)
 df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
@@ -412,11 +333,12 @@ ConfusionMatrixDisplay.from_estimator(rf, X_test_bal, y_test_bal, cmap="Blues")
 plt.title("Random Forest - Balanced Train/Test")
 plt.show()
 
+import numpy as np
 import pandas as pd
-from scipy.stats import chi2_contingency
 
-# Load the dataset
-df = pd.read_csv("US_Accidents_With_Highway_Flag.csv")
+# Batched chi-square tests shared with the dashboard (appengine/backend/stats.py)
+from backend.stats import chi_square, flag_tables, pack_flags, packed_counts, unpack_counts, grouped_table
+from backend.ingest import iter_accidents
 
 # Define categorical/boolean columns (you can expand this list)
 categorical_cols = [
@@ -425,21 +347,35 @@ categorical_cols = [
     "Traffic_Calming", "Traffic_Signal", "Turning_Loop"
 ]
 
-# Clean the data
-df = df[["Severity"] + categorical_cols].dropna()
-df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
-
-# Run chi-square tests
-results = []
+# Stream the dataset in chunks, counting rows per flag combination and binary severity
+# with one bincount pass per chunk; Weather_Condition counts are summed alongside
+flag_counts = np.zeros((1 << len(categorical_cols), 2), dtype=np.int64)
+weather_counts = []
+chunks = iter_accidents(["Severity", "Weather_Condition"] + categorical_cols, path=DATA_CSV, chunk_rows=500000)
+for chunk in chunks:
+    # Clean the data
+    flags_df = chunk[["Severity"] + categorical_cols].dropna()
+    severity_binary = (flags_df["Severity"] >= 3).to_numpy(dtype=np.int64)
+    codes = pack_flags(flags_df[categorical_cols].to_numpy(dtype=bool))
+    flag_counts += packed_counts(codes, severity_binary, len(categorical_cols), 2)
+
+    weather_df = chunk[["Severity", "Weather_Condition"]].dropna()
+    weather_counts.append(
+        weather_df.groupby(["Weather_Condition", weather_df["Severity"] >= 3], observed=True).size().rename("Count").reset_index()
+    )
+
+# Run all chi-square tests at once: one 2x2 table per feature
+flags, counts = unpack_counts(flag_counts, len(categorical_cols))
+chi2, p, _ = chi_square(flag_tables(flags, counts))
+results = [
+    {"Feature": col, "Chi2 Stat": round(chi2[i], 2), "P-Value": round(p[i], 5)}
+    for i, col in enumerate(categorical_cols)
+]
 
-for col in categorical_cols:
-    contingency = pd.crosstab(df[col], df["Severity_Binary"])
-    chi2, p, dof, _ = chi2_contingency(contingency)
-    results.append({
-        "Feature": col,
-        "Chi2 Stat": round(chi2, 2),
-        "P-Value": round(p, 5)
-    })
+# High-cardinality columns use the same engine on their grouped counts
+weather_table = grouped_table(pd.concat(weather_counts), "Weather_Condition", "Severity")
+chi2, p, _ = chi_square(weather_table)
+results.append({"Feature": "Weather_Condition", "Chi2 Stat": round(float(chi2), 2), "P-Value": round(float(p), 5)})
 
 # Show results
 chi2_df = pd.DataFrame(results).sort_values(by="P-Value")
@@ -447,47 +383,31 @@ print("\nChi-Square Test Results (Categorical vs Severity):\n")
 print(chi2_df.to_string(index=False))
 
 import pandas as pd
-from sklearn.utils import resample
-from scipy.stats import ttest_ind, f_oneway, pearsonr
 
-# === Load your dataset ===
-df = pd.read_csv("US_Accidents_With_Highway_Flag.csv")
+# Moment-based tests shared with the dashboard (appengine/backend/stats.py)
+from backend.stats import accumulate_moments, welch_ttest, one_way_anova, pearson_with_group
+from backend.ingest import iter_accidents
 
-# === Define numeric columns ===
-numeric_cols = df.select_dtypes(include=["float64", "int64"]).columns.tolist()
+# === Define numeric columns (from the typed schema of the first chunk) ===
+df_head = next(iter_accidents(path=DATA_CSV, chunk_rows=10000))
+numeric_cols = df_head.select_dtypes(include="number").columns.tolist()
 numeric_cols = [col for col in numeric_cols if col != "Severity"]
 
-# === Drop missing values for selected numeric columns + Severity ===
-df = df[["Severity"] + numeric_cols].dropna()
-
-# === Binary group: Low (1–2) vs High (3–4) ===
-df["Severity_Binary"] = df["Severity"].apply(lambda x: 0 if x <= 2 else 1)
-
-# === Create a balanced small subset (undersample majority class) ===
-low = df[df["Severity_Binary"] == 0]
-high = df[df["Severity_Binary"] == 1]
-sample_size = min(len(low), len(high), 10000)  # you can adjust 10000
-
-low_sample = resample(low, replace=False, n_samples=sample_size, random_state=42)
-high_sample = resample(high, replace=False, n_samples=sample_size, random_state=42)
-
-df_balanced = pd.concat([low_sample, high_sample])
-
-# === Add Severity Group for readability (for T-test) ===
-df_balanced["Severity_Group"] = df_balanced["Severity"].apply(lambda x: "Low" if x <= 2 else "High")
+# === Stream the file in chunks, merging per-severity moments ===
+# Rows missing Severity or any numeric column are dropped, as before
+chunks = iter_accidents(["Severity"] + numeric_cols, path=DATA_CSV, chunk_rows=500000)
+moments = accumulate_moments(chunks, "Severity", numeric_cols)
 
-# === Run statistical tests ===
+# === Run statistical tests on all rows ===
 results = []
 
 for col in numeric_cols:
-    group_low = df_balanced[df_balanced["Severity_Group"] == "Low"][col]
-    group_high = df_balanced[df_balanced["Severity_Group"] == "High"][col]
-    t_stat, t_pval = ttest_ind(group_low, group_high, equal_var=False)
+    # T-test: Low (1–2) vs High (3–4)
+    t_stat, t_pval = welch_ttest(moments[col].pooled([1, 2]), moments[col].pooled([3, 4]))
     
-    groups_anova = [df_balanced[df_balanced["Severity"] == s][col] for s in sorted(df_balanced["Severity"].unique())]
-    a_stat, a_pval = f_oneway(*groups_anova)
+    a_stat, a_pval = one_way_anova(moments[col])
     
-    corr, corr_pval = pearsonr(df_balanced[col], df_balanced["Severity"])
+    corr, corr_pval = pearson_with_group(moments[col])
 
     results.append({
         "Feature": col,
@@ -499,5 +419,5 @@ for col in numeric_cols:
 
 # === Display results ===
 results_df = pd.DataFrame(results)
-print("\nStatistical Test Results (Balanced Subset):\n")
+print("\nStatistical Test Results (All Rows):\n")
 print(results_df.to_string(index=False))
@@ -0,0 +1,486 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+
+import numpy as np
+import pandas as pd
+
+# Typed CSV / Parquet loading shared with the dashboard (appengine/backend/ingest.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "appengine"))
+from backend.ingest import read_accidents, source_fingerprint
+
+from hashing import ShardStore, iter_text_chunks, SHARD_DIR, HASH_FEATURES, TEXT_WORKERS, CHUNK_ROWS
+
+# ------------ STAGED TRAINING PIPELINE ------------
+# model.py's severity network is trained through named stages:
+#
+#   load -> clean -> {text_featurize, encode} -> split -> balance -> train -> evaluate
+#
+# Every stage result is stored under CACHE_DIR/<stage>/<key>/, where the key
+# hashes the stage's code (with every function, class or module of this
+# repository it reaches, e.g. sparse_batch() for train or ShardStore for
+# text_featurize), its parameters and the keys of the stages it reads (the
+# load stage hashes the size and modification time of the CSV or of the
+# converted Parquet dataset, whichever is read). Keys are known before anything runs, so a re-run
+# only executes stages whose inputs, parameters or code changed, and upstream
+# results are only read when a stage actually has to run. Changing the network
+# retrains from the cached features and balanced rows in seconds.
+#
+# Outputs are stored by type: DataFrames as Parquet, numpy arrays as .npy
+# and sparse matrices as CSR component .npy files (both memory-mapped on
+# load), anything else with joblib.
+#
+# text_featurize streams Description out of the cleaned Parquet file into
+# hashed term-count shards (model/hashing.py) that outlive stage keys, so new
+# data only featurizes the chunks it changed.
+
+CACHE_DIR = os.environ.get("PIPELINE_CACHE_DIR")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts') if CACHE_DIR is None else CACHE_DIR
+
+
+# Code under this directory is hashed into stage keys; library code is not
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _in_repo(obj):
+    try:
+        path = inspect.getsourcefile(obj)
+    except TypeError:
+        return False
+    return path is not None and os.path.abspath(path).startswith(REPO_ROOT + os.sep)
+
+
+def _global_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _global_names(const)
+    return names
+
+
+def _functions(obj):
+    if inspect.isfunction(obj):
+        return [obj]
+    members = []
+    for member in vars(obj).values():
+        member = member.fget if isinstance(member, property) else getattr(member, "__func__", member)
+        if inspect.isfunction(member):
+            members.append(member)
+    return members
+
+
+def code_dependencies(fn):
+    """
+    Source of `fn` and of every function, class or module of this repository
+    it reaches through global names, transitively. Editing any of them
+    changes the keys of the stages that use it.
+    """
+    sources = {}
+    stack = [fn]
+    while stack:
+        obj = stack.pop()
+        name = obj.__name__ if inspect.ismodule(obj) else f"{obj.__module__}.{obj.__qualname__}"
+        if name in sources:
+            continue
+        sources[name] = inspect.getsource(obj)
+        if inspect.ismodule(obj):
+            continue
+        for function in _functions(obj):
+            for global_name in _global_names(function.__code__):
+                value = function.__globals__.get(global_name)
+                if (inspect.isfunction(value) or inspect.isclass(value) or inspect.ismodule(value)) and _in_repo(value):
+                    stack.append(value)
+    return sources
+
+
+def save_output(directory, name, value):
+    """
+    Write one stage output and return its kind for the manifest.
+    """
+    import scipy.sparse as sp
+
+    if isinstance(value, pd.DataFrame):
+        value.to_parquet(os.path.join(directory, f"{name}.parquet"), index=False)
+        return "parquet"
+    if isinstance(value, pd.Series):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        np.save(os.path.join(directory, f"{name}.npy"), value)
+        return "npy"
+    if sp.issparse(value):
+        value = value.tocsr()
+        for part in ("shape", "data", "indices", "indptr"):
+            np.save(os.path.join(directory, f"{name}.{part}.npy"), np.asarray(getattr(value, part)))
+        return "csr"
+
+    import joblib
+    joblib.dump(value, os.path.join(directory, f"{name}.joblib"))
+    return "joblib"
+
+
+def load_output(directory, name, kind):
+    if kind == "parquet":
+        return pd.read_parquet(os.path.join(directory, f"{name}.parquet"))
+    if kind == "npy":
+        return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+    if kind == "csr":
+        import scipy.sparse as sp
+        shape = tuple(int(n) for n in np.load(os.path.join(directory, f"{name}.shape.npy")))
+        parts = [np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode="r")
+                 for part in ("data", "indices", "indptr")]
+        return sp.csr_matrix(tuple(parts), shape=shape, copy=False)
+
+    import joblib
+    return joblib.load(os.path.join(directory, f"{name}.joblib"))
+
+
+class StageResult:
+    """
+    Lazily materialized output of one stage; index it by output name.
+    """
+
+    def __init__(self, pipeline, name, fn, upstream, params, source=None):
+        self.pipeline = pipeline
+        self.name = name
+        self.fn = fn
+        self.upstream = upstream
+        self.params = params
+        self.key = _digest({
+            "stage": name,
+            "code": code_dependencies(fn),
+            "source": source,
+            "params": params,
+            "upstream": [u.key for u in upstream],
+        })
+        self.path = os.path.join(pipeline.root, name, self.key)
+        self._manifest = None
+        self._loaded = {}
+
+    def file(self, output):
+        """
+        Path of a stored Parquet output, for stages that stream it instead of loading it.
+        """
+        kind = self.manifest()["outputs"].get(output)
+        if kind != "parquet":
+            raise KeyError(f"stage '{self.name}' has no Parquet output '{output}'")
+        return os.path.join(self.path, f"{output}.parquet")
+
+    @property
+    def cached(self):
+        return os.path.exists(os.path.join(self.path, "manifest.json"))
+
+    def manifest(self):
+        if self._manifest is None:
+            if not self.cached:
+                self._run()
+            with open(os.path.join(self.path, "manifest.json")) as f:
+                self._manifest = json.load(f)
+        return self._manifest
+
+    def _run(self):
+        # Bring upstream stages up to date first so the timing below is this stage's own
+        for upstream in self.upstream:
+            upstream.manifest()
+
+        start = time.perf_counter()
+        outputs = self.fn(*self.upstream, **self.params)
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        kinds = {name: save_output(tmp_path, name, value) for name, value in outputs.items()}
+        with open(os.path.join(tmp_path, "manifest.json"), "w") as f:
+            json.dump({"stage": self.name, "params": self.params, "outputs": kinds}, f, indent=2, default=str)
+        if os.path.exists(self.path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.replace(tmp_path, self.path)
+
+        # Keep the in-memory values; the stored copies serve later runs
+        self._loaded.update(outputs)
+        self.pipeline.log(f"{self.name:<15} ran in {time.perf_counter() - start:7.1f}s  [{self.key}]")
+
+    def __getitem__(self, output):
+        if output not in self._loaded:
+            kinds = self.manifest()["outputs"]
+            if output not in kinds:
+                raise KeyError(f"stage '{self.name}' has no output '{output}' (has {', '.join(kinds)})")
+            self._loaded[output] = load_output(self.path, output, kinds[output])
+        return self._loaded[output]
+
+    def keys(self):
+        return self.manifest()["outputs"].keys()
+
+
+class Pipeline:
+    """
+    Builds content-addressed stages; nothing runs until an output is read.
+    """
+
+    def __init__(self, root=CACHE_DIR, verbose=True):
+        self.root = root
+        self.verbose = verbose
+
+    def log(self, message):
+        if self.verbose:
+            print(f"[pipeline] {message}")
+
+    def stage(self, name, fn, *upstream, source=None, **params):
+        """
+        Declare stage `name`: fn(*upstream results, **params) -> {output name: value}.
+        `source` identifies external inputs (e.g. a file fingerprint).
+        """
+        result = StageResult(self, name, fn, list(upstream), params, source=source)
+        if result.cached:
+            self.log(f"{name:<15} cached          [{result.key}]")
+        return result
+
+    def prune(self, keep=()):
+        """
+        Remove every stored stage result except those in `keep`.
+        """
+        keep = {r.path for r in keep}
+        for stage in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            for key in os.listdir(os.path.join(self.root, stage)):
+                path = os.path.join(self.root, stage, key)
+                if path not in keep:
+                    shutil.rmtree(path, ignore_errors=True)
+
+
+# ==================== STAGES ====================
+
+def load(path, exclude=()):
+    """
+    Read the accidents with typed columns, skipping `exclude` at parse time.
+    """
+    return {"df": read_accidents(path=path, exclude=exclude)}
+
+
+def clean(loaded, drop_cols, required):
+    df = loaded["df"]
+    df = df.drop(columns=[col for col in drop_cols if col in df.columns], errors='ignore')
+    df = df.dropna(subset=required)
+    df = df.dropna()
+    df = df[df['Severity'].isin([1, 2, 3, 4])]
+    # Categories of dropped rows would otherwise become all-zero dummy columns
+    for col in df.select_dtypes(include='category').columns:
+        df[col] = df[col].cat.remove_unused_categories()
+    return {"df": df.reset_index(drop=True)}
+
+
+def text_featurize(cleaned, max_features, n_features, chunk_rows):
+    """
+    TF-IDF of Description as a float32 CSR matrix over the `max_features` most
+    frequent hashed terms. Chunks are counted in TEXT_WORKERS processes into
+    shards under SHARD_DIR, reusing shards whose text was seen before; idf
+    comes from the summed shard statistics.
+    """
+    store = ShardStore(SHARD_DIR, n_features)
+    keys = store.add(iter_text_chunks(cleaned.file("df"), "Description", chunk_rows), workers=TEXT_WORKERS)
+    tfidf, columns, idf = store.tfidf(keys, max_features)
+    return {"tfidf": tfidf, "columns": columns, "idf": idf, "shards": np.asarray(keys)}
+
+
+def encode(cleaned):
+    """
+    One-hot encode categorical columns and standardize every structured feature.
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    df = cleaned["df"].drop(columns=['Description'])
+    categorical_cols = df.select_dtypes(include=['object', 'category']).columns
+    df = pd.get_dummies(df, columns=categorical_cols)
+    df['Severity'] = df['Severity'].astype(int)
+
+    X_full = df.drop(columns=['Severity'])
+    scaler = StandardScaler()
+    return {
+        "X": scaler.fit_transform(X_full).astype(np.float32),
+        "y": (df['Severity'] - 1).to_numpy(dtype=np.int64),
+        "columns": list(X_full.columns),
+        "scaler": scaler,
+    }
+
+
+def split(encoded, test_size, random_state):
+    """
+    Stratified train/test split, as row numbers into the encoded and TF-IDF matrices.
+    """
+    from sklearn.model_selection import train_test_split
+
+    y = np.asarray(encoded["y"])
+    train_rows, test_rows = train_test_split(
+        np.arange(len(y)), test_size=test_size, stratify=y, random_state=random_state
+    )
+    return {"train_rows": train_rows, "test_rows": test_rows}
+
+
+def balance(encoded, splitted, random_state):
+    """
+    Undersample every severity class of the training set to the smallest one.
+    """
+    from sklearn.utils import resample
+
+    train_rows = np.asarray(splitted["train_rows"])
+    y = np.asarray(encoded["y"])[train_rows]
+    min_class_size = np.bincount(y).min()
+    picked = np.concatenate([
+        resample(np.flatnonzero(y == c), replace=False, n_samples=min_class_size, random_state=random_state)
+        for c in np.unique(y)
+    ])
+    return {"rows": train_rows[picked]}
+
+
+def sparse_batch(X, text, rows, device):
+    """
+    Tensors for a batch of rows: dense structured features plus the TF-IDF rows
+    as flat (indices, offsets, weights), the input of a sum-mode EmbeddingBag.
+    """
+    import torch
+
+    text_rows = text[rows]
+    return (
+        torch.from_numpy(np.ascontiguousarray(X[rows], dtype=np.float32)).to(device),
+        torch.from_numpy(text_rows.indices.astype(np.int64)).to(device),
+        torch.from_numpy(text_rows.indptr[:-1].astype(np.int64)).to(device),
+        torch.from_numpy(text_rows.data.astype(np.float32)).to(device),
+    )
+
+
+def predict(model, X, text, rows, device, batch_size=65536):
+    """
+    Predicted class for `rows`, scored in batches so only one batch is densified at a time.
+    """
+    import torch
+
+    model.eval()
+    predictions = []
+    with torch.no_grad():
+        for start in range(0, len(rows), batch_size):
+            batch = sparse_batch(X, text, rows[start:start + batch_size], device)
+            predictions.append(torch.argmax(model(*batch), dim=1).cpu().numpy())
+    return np.concatenate(predictions) if predictions else np.zeros(0, dtype=np.int64)
+
+
+def train(encoded, featurized, splitted, balanced, model_cls, epochs, batch_size, lr, patience, step_size, gamma,
+          random_state):
+    """
+    Train `model_cls(structured_dim, text_dim)` with class-weighted cross entropy,
+    keeping the state with the best test accuracy (early stopping after
+    `patience` epochs without gain). Batches are sliced from the memory-mapped
+    matrices, so neither the structured nor the TF-IDF features are copied whole.
+    Each epoch's batch order is drawn from a generator seeded with `random_state`.
+    """
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+    from sklearn.metrics import accuracy_score
+
+    X, text, y = encoded["X"], featurized["tfidf"], np.asarray(encoded["y"])
+    rows = np.asarray(balanced["rows"])
+    test_rows = np.asarray(splitted["test_rows"])
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    model = model_cls(X.shape[1], text.shape[1]).to(device)
+    class_weights = torch.tensor(1. / np.bincount(y[rows]), dtype=torch.float32).to(device)
+    criterion = nn.CrossEntropyLoss(weight=class_weights)
+    optimizer = optim.AdamW(model.parameters(), lr=lr)
+    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=step_size, gamma=gamma)
+
+    best_accuracy = 0
+    best_model_state = None
+    early_stop_counter = 0
+    history = []
+    rng = np.random.default_rng(random_state)
+    for epoch in range(epochs):
+        model.train()
+        running_loss = 0.0
+        order = rows[rng.permutation(len(rows))]
+        for start in range(0, len(order), batch_size):
+            batch_rows = np.sort(order[start:start + batch_size])
+            y_batch = torch.from_numpy(y[batch_rows]).to(device)
+            optimizer.zero_grad()
+            loss = criterion(model(*sparse_batch(X, text, batch_rows, device)), y_batch)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        scheduler.step()
+
+        # Validation
+        acc = accuracy_score(y[test_rows], predict(model, X, text, test_rows, device))
+
+        print(f"Epoch {epoch+1}: Loss={running_loss:.4f}, Val Accuracy={acc:.4f}")
+        history.append({"epoch": epoch + 1, "loss": running_loss, "val_accuracy": acc})
+
+        if acc > best_accuracy:
+            best_accuracy = acc
+            best_model_state = {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}
+            early_stop_counter = 0
+        else:
+            early_stop_counter += 1
+            if early_stop_counter >= patience:
+                print("Early stopping.")
+                break
+
+    return {"state_dict": best_model_state, "history": pd.DataFrame(history)}
+
+
+def evaluate(trained, encoded, featurized, splitted, model_cls):
+    """
+    Predictions of the best model on the test set.
+    """
+    import torch
+
+    X, text = encoded["X"], featurized["tfidf"]
+    test_rows = np.asarray(splitted["test_rows"])
+    model = model_cls(X.shape[1], text.shape[1])
+    model.load_state_dict(trained["state_dict"])
+    y_pred = predict(model, X, text, test_rows, torch.device("cpu"))
+    return {"y_true": np.asarray(encoded["y"])[test_rows], "y_pred": y_pred}
+
+
+def severity_pipeline(csv_path, model_cls, pipeline=None, max_features=500, n_features=HASH_FEATURES,
+                      chunk_rows=CHUNK_ROWS, test_size=0.2, random_state=42,
+                      epochs=50, batch_size=256, lr=0.001, patience=7, step_size=10, gamma=0.7):
+    """
+    Declare every stage of the severity network; returns stage name -> result.
+    The model class's source is part of the train and evaluate keys, so editing
+    the network invalidates only those two stages. With csv_path=None only the
+    converted Parquet dataset is read.
+    """
+    pipeline = Pipeline() if pipeline is None else pipeline
+    model_source = code_dependencies(model_cls)
+
+    drop_cols = ['ID', 'Start_Time', 'End_Time', 'Weather_Timestamp', 'City', 'County',
+                 'Street', 'Zipcode', 'Airport_Code', 'Country', 'State']
+
+    source = source_fingerprint(csv_path)
+    loaded = pipeline.stage("load", load, source=source, path=csv_path, exclude=drop_cols)
+    cleaned = pipeline.stage("clean", clean, loaded, drop_cols=drop_cols, required=['Severity', 'Description'])
+    featurized = pipeline.stage(
+        "text_featurize", text_featurize, cleaned,
+        max_features=max_features, n_features=n_features, chunk_rows=chunk_rows,
+    )
+    encoded = pipeline.stage("encode", encode, cleaned)
+    splitted = pipeline.stage("split", split, encoded, test_size=test_size, random_state=random_state)
+    balanced = pipeline.stage("balance", balance, encoded, splitted, random_state=random_state)
+    trained = pipeline.stage(
+        "train", train, encoded, featurized, splitted, balanced, source=model_source, model_cls=model_cls,
+        epochs=epochs, batch_size=batch_size, lr=lr, patience=patience, step_size=step_size, gamma=gamma,
+        random_state=random_state,
+    )
+    evaluated = pipeline.stage(
+        "evaluate", evaluate, trained, encoded, featurized, splitted, source=model_source, model_cls=model_cls
+    )
+    return {
+        "load": loaded, "clean": cleaned, "text_featurize": featurized, "encode": encoded,
+        "split": splitted, "balance": balanced, "train": trained, "evaluate": evaluated,
+    }
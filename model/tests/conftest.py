@@ -0,0 +1,5 @@
+import os
+import sys
+
+# pipeline.py and hashing.py are imported as top-level modules, as model.py does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from hashing import ShardStore, iter_text_chunks
+
+WORDS = ["lane", "blocked", "accident", "ramp", "closed", "exit", "I-95", "right", "left", "shoulder",
+         "the", "on", "at"] + [f"St{i}" for i in range(300)]
+
+
+def descriptions(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(WORDS, size=rng.integers(3, 10))) for _ in range(rows)]
+
+
+def write_column(path, texts):
+    pd.DataFrame({"Description": texts}).to_parquet(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("max_features", [None, 50])
+def test_tfidf_matches_tfidf_vectorizer(tmp_path, max_features):
+    texts = descriptions(3000)
+    store = ShardStore(str(tmp_path / "shards"))
+    keys = store.add(iter_text_chunks(write_column(tmp_path / "a.parquet", texts), chunk_rows=400), workers=2)
+    matrix, columns, idf = store.tfidf(keys, max_features)
+
+    reference = TfidfVectorizer(max_features=max_features, stop_words="english", dtype=np.float32)
+    expected = reference.fit_transform(texts).tocsr()
+    assert matrix.shape == expected.shape
+    assert matrix.nnz == expected.nnz
+    # Hashed columns are a permutation of the vocabulary (no collisions at 2**20 features)
+    np.testing.assert_allclose(np.sort(idf), np.sort(reference.idf_), rtol=1e-6)
+    for row in range(0, len(texts), 97):
+        np.testing.assert_allclose(np.sort(matrix[row].data), np.sort(expected[row].data), rtol=1e-5)
+
+
+def test_inserted_rows_reuse_other_shards(tmp_path):
+    texts = descriptions(20000, seed=1)
+    store = ShardStore(str(tmp_path / "shards"))
+    keys = store.add(iter_text_chunks(write_column(tmp_path / "a.parquet", texts), chunk_rows=1000), workers=1)
+
+    extended = texts[:5000] + [f"new month {i}" for i in range(300)] + texts[5000:]
+    new_keys = store.add(iter_text_chunks(write_column(tmp_path / "b.parquet", extended), chunk_rows=1000), workers=1)
+    assert len(set(new_keys) - set(keys)) <= 3
+    assert store.statistics(new_keys)[0] == len(extended)
+
+
+def test_statistics_are_sums_over_shards(tmp_path):
+    texts = descriptions(2000, seed=2)
+    store = ShardStore(str(tmp_path / "shards"))
+    keys = store.add(iter_text_chunks(write_column(tmp_path / "a.parquet", texts), chunk_rows=300), workers=1)
+    n_docs, df, terms = store.statistics(keys)
+    counts = sp.vstack([store.counts(key) for key in keys]).tocsc()
+    assert n_docs == len(texts)
+    np.testing.assert_array_equal(df, np.diff(counts.indptr))
+    np.testing.assert_allclose(terms, np.asarray(counts.sum(axis=0)).ravel())
@@ -0,0 +1,52 @@
+import inspect
+import os
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from pipeline import Pipeline, code_dependencies, severity_pipeline
+
+
+class TinyNetwork:
+    pass
+
+
+def test_stage_code_includes_helpers():
+    assert {"pipeline.sparse_batch", "pipeline.predict"} <= set(code_dependencies(pipeline.train))
+    assert {"pipeline.sparse_batch", "pipeline.predict"} <= set(code_dependencies(pipeline.evaluate))
+    assert {"hashing.ShardStore", "hashing.featurize_shard"} <= set(code_dependencies(pipeline.text_featurize))
+    assert "backend.ingest.read_accidents" in code_dependencies(pipeline.load)
+    # Library code is not hashed
+    assert all(name.split(".")[0] in ("pipeline", "hashing", "backend") for name in code_dependencies(pipeline.load))
+
+
+def test_editing_a_helper_changes_the_stage_key(tmp_path, monkeypatch):
+    stages = Pipeline(root=str(tmp_path), verbose=False)
+    train_key = stages.stage("train", pipeline.train).key
+    encode_key = stages.stage("encode", pipeline.encode).key
+
+    getsource = inspect.getsource
+    monkeypatch.setattr(pipeline.inspect, "getsource",
+                        lambda obj: getsource(obj) + ("# edited" if obj is pipeline.sparse_batch else ""))
+    assert stages.stage("train", pipeline.train).key != train_key
+    assert stages.stage("encode", pipeline.encode).key == encode_key
+
+
+def test_parquet_only_source_is_not_stat_as_csv(tmp_path, monkeypatch):
+    from backend import ingest
+
+    csv_path = tmp_path / "us_accidents.csv"
+    pd.DataFrame({
+        "ID": ["A-1", "A-2"], "Severity": [2, 3], "State": ["CA", "NY"],
+        "Description": ["Accident on I-5", "Lane blocked"], "Temperature(F)": [50.0, np.nan],
+    }).to_csv(csv_path, index=False)
+    data_dir = str(tmp_path / "parquet")
+    ingest.convert_csv(str(csv_path), data_dir=data_dir)
+    os.remove(csv_path)
+
+    # Declaring the stages fingerprints the source without running anything
+    monkeypatch.setattr(pipeline, "source_fingerprint",
+                        lambda path: ingest.source_fingerprint(path, data_dir=data_dir))
+    stages = severity_pipeline(str(csv_path), TinyNetwork, pipeline=Pipeline(root=str(tmp_path / "cache"), verbose=False))
+    assert not stages["load"].cached